@@ -124,8 +124,11 @@ from pyopencl.cffi_cl import (  # noqa
         wait_for_events,
         NannyEvent,
         UserEvent,
+        EventList,
 
         enqueue_nd_range_kernel,
+        enqueue_batch,
+        CommandGraph,
         enqueue_task,
 
         _enqueue_marker_with_wait_list,
@@ -309,17 +312,37 @@ class Program(object):
     from_int_ptr = staticmethod(from_int_ptr)
 
     def __getattr__(self, attr):
+        # Kernels obtained by attribute lookup are cached per program and per
+        # thread: repeated 'prg.knl(...)' in one thread reuses the same
+        # Kernel (and thus its generated argument setters), while different
+        # threads never share a Kernel's mutable argument state.
+        # Use Kernel(prg, name) to obtain a private, uncached instance.
+
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+
+        from six.moves._thread import get_ident
+        cache_key = (attr, get_ident())
+
+        kernel_cache = self.__dict__.setdefault("_kernel_cache", {})
+        try:
+            return kernel_cache[cache_key]
+        except KeyError:
+            pass
+
         try:
             knl = Kernel(self, attr)
             # Nvidia does not raise errors even for invalid names,
             # but this will give an error if the kernel is invalid.
             knl.num_args
             knl._source = getattr(self, "_source", None)
-            return knl
         except LogicError:
             raise AttributeError("'%s' was not found as a program "
                     "info attribute or as a kernel name" % attr)
 
+        kernel_cache[cache_key] = knl
+        return knl
+
     # {{{ build
 
     if six.PY3:
@@ -413,6 +436,9 @@ class Program(object):
         options_bytes, include_path = self._process_build_options(
                 self._context, options)
 
+        # kernels created from a previous build are no longer valid
+        self.__dict__.pop("_kernel_cache", None)
+
         if cache_dir is None:
             cache_dir = getattr(self._context, 'cache_dir', None)
 
@@ -809,6 +835,10 @@ def enqueue_copy(queue, dest, src, **kwargs):
     .. versionadded:: 2011.1
     """
 
+    if queue._capture_graph is not None:
+        return queue._capture_graph._capture_call(
+                enqueue_copy, (dest, src), kwargs)
+
     if isinstance(dest, MemoryObjectHolder):
         if dest.type == mem_object_type.BUFFER:
             if isinstance(src, MemoryObjectHolder):
@@ -893,6 +923,24 @@ def enqueue_copy(queue, dest, src, **kwargs):
             # assume from-host
             raise TypeError("enqueue_copy cannot perform host-to-host transfers")
 
+
+def enqueue_copy_async(queue, dest, src, loop=None, **kwargs):
+    """Like :func:`enqueue_copy`, but never blocks. Returns an
+    :class:`asyncio.Future` that completes with the transfer's
+    :class:`Event` once the transfer has finished.
+
+    .. versionadded:: 2017.1
+    """
+    if not (isinstance(dest, MemoryObjectHolder)
+            and isinstance(src, MemoryObjectHolder)):
+        # involves host or SVM memory
+        if kwargs.get("is_blocking"):
+            raise ValueError("enqueue_copy_async does not support "
+                    "is_blocking=True")
+        kwargs["is_blocking"] = False
+
+    return enqueue_copy(queue, dest, src, **kwargs).as_future(loop)
+
 # }}}
 
 
@@ -1000,6 +1048,11 @@ def enqueue_barrier(queue, wait_for=None):
 
 
 def enqueue_fill_buffer(queue, mem, pattern, offset, size, wait_for=None):
+    if queue._capture_graph is not None:
+        return queue._capture_graph._capture_call(
+                enqueue_fill_buffer, (mem, pattern, offset, size),
+                {"wait_for": wait_for})
+
     if not (queue._get_cl_version() >= (1, 2) and get_cl_header_version() >= (1, 2)):
         from warnings import warn
         warn("The context for this queue does not declare OpenCL 1.2 support, so "
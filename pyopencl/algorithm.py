@@ -34,7 +34,8 @@ import numpy as np
 import pyopencl as cl
 import pyopencl.array  # noqa
 from pyopencl.scan import ScanTemplate
-from pyopencl.tools import dtype_to_ctype
+from pyopencl._cluda import CLUDA_PREAMBLE
+from pyopencl.tools import dtype_to_ctype, context_dependent_memoize
 from pytools import memoize, memoize_method, Record
 from mako.template import Template
 
@@ -264,6 +265,191 @@ def unique(ary, is_equal_expr="a == b", extra_args=[], preamble="",
 # }}}
 
 
+# {{{ reduce_by_key, run_length_encode
+
+@memoize
+def _make_reduce_by_key_scan_type(device, count_dtype, value_dtype):
+    name = "pyopencl_reduce_by_key_scan_%s_%s_t" % (
+            count_dtype.type.__name__,
+            dtype_to_ctype(value_dtype).replace(" ", "_"))
+
+    dtype = np.dtype([
+        ("run_count", count_dtype),
+        ("run_value", value_dtype),
+        ])
+
+    from pyopencl.tools import get_or_register_dtype, match_dtype_to_c_struct
+    dtype, c_decl = match_dtype_to_c_struct(device, name, dtype)
+
+    return get_or_register_dtype(name, dtype)
+
+
+_reduce_by_key_template = ScanTemplate(
+        arguments="key_t *keys, key_t *out_keys, value_t *out_values, "
+                  "count_t *count",
+        input_fetch_exprs=[
+            ("keys_im1", "keys", -1),
+            ("keys_i", "keys", 0),
+            ],
+        input_expr="""
+            pyopencl_reduce_by_key_make(
+                ((i == 0) || !IS_EQUAL_EXPR(keys_im1, keys_i)) ? 1 : 0,
+                %(value_expr)s)
+            """,
+        is_segment_start_expr="(i == 0) || !IS_EQUAL_EXPR(keys_im1, keys_i)",
+        scan_expr="pyopencl_reduce_by_key_combine(a, b, across_seg_boundary)",
+        neutral="pyopencl_reduce_by_key_make(0, %(neutral)s)",
+        output_statement="""
+            if (i+1 == N || !IS_EQUAL_EXPR(keys[i], keys[i+1]))
+            {
+                out_keys[item.run_count-1] = keys[i];
+                out_values[item.run_count-1] = item.run_value;
+            }
+            if (i+1 == N) *count = item.run_count;
+            """,
+        preamble="""
+            #define IS_EQUAL_EXPR(a, b) %(macro_is_equal_expr)s
+            #define REDUCE_EXPR(a, b) %(macro_reduce_expr)s
+
+            scan_t pyopencl_reduce_by_key_make(count_t run_count, value_t run_value)
+            {
+                scan_t result;
+                result.run_count = run_count;
+                result.run_value = run_value;
+                return result;
+            }
+
+            // The run counter keeps accumulating across segment boundaries,
+            // so that it yields the output index of each run. Only the
+            // reduced value starts over.
+            scan_t pyopencl_reduce_by_key_combine(
+                scan_t a, scan_t b, bool across_seg_boundary)
+            {
+                scan_t result;
+                result.run_count = a.run_count + b.run_count;
+                result.run_value = across_seg_boundary
+                    ? b.run_value
+                    : REDUCE_EXPR(a.run_value, b.run_value);
+                return result;
+            }
+            """,
+        template_processor="printf")
+
+
+def _run_reduce_by_key(keys, values, value_dtype, value_expr, reduce_expr,
+        neutral, is_equal_expr, extra_args, preamble, queue, wait_for):
+    if len(keys) > np.iinfo(np.uint32).max:
+        count_dtype = np.dtype(np.uint64)
+    else:
+        count_dtype = np.dtype(np.uint32)
+
+    if value_dtype is None:
+        value_dtype = count_dtype
+
+    scan_dtype = _make_reduce_by_key_scan_type(
+            keys.context.devices[0], count_dtype, value_dtype)
+
+    extra_args_types, extra_args_values = extract_extra_args_types_values(extra_args)
+
+    if values is not None:
+        from pyopencl.tools import VectorArg
+        extra_args_types = (
+                (VectorArg(values.dtype, "values", with_offset=False),)
+                + extra_args_types)
+        extra_args_values = [values] + extra_args_values
+
+    knl = _reduce_by_key_template.build(
+            keys.context,
+            type_aliases=(
+                ("key_t", keys.dtype),
+                ("value_t", value_dtype),
+                ("count_t", count_dtype),
+                ("scan_t", scan_dtype),
+                ),
+            var_values=(
+                ("value_expr", value_expr),
+                ("neutral", neutral),
+                ("macro_is_equal_expr", is_equal_expr),
+                ("macro_reduce_expr", reduce_expr),
+                ),
+            more_preamble=preamble, more_arguments=extra_args_types)
+
+    out_keys = cl.array.empty_like(keys)
+    out_values = keys._new_like_me(dtype=value_dtype)
+    count = keys._new_with_changes(data=None, offset=0,
+            shape=(), strides=(), dtype=count_dtype)
+
+    # **dict is a Py2.5 workaround
+    evt = knl(keys, out_keys, out_values, count, *extra_args_values,
+            **dict(queue=queue, wait_for=wait_for))
+
+    return out_keys, out_values, count, evt
+
+
+def reduce_by_key(keys, values, reduce_expr="a+b", neutral="0",
+        is_equal_expr="a == b", extra_args=[], preamble="",
+        queue=None, wait_for=None):
+    """Combine the *values* belonging to each run of consecutive equal *keys*
+    using *reduce_expr*, producing one output entry per run.
+
+    This is a group-by aggregation if *keys* is sorted, e.g. by
+    :class:`RadixSort`. Both the run boundaries and the aggregates are
+    found by a single segmented scan.
+
+    :arg reduce_expr: a C expression combining the two values `a` and `b`
+        of the same run, represented as a string. Must be associative.
+    :arg neutral: the neutral element of *reduce_expr*, represented as a
+        string.
+    :arg is_equal_expr: a C expression evaluating to a `bool`,
+        represented as a string.  The keys being compared are
+        available as `a` and `b`. If this expression yields `false`, a new
+        run starts at the second key.
+    :arg extra_args: |scan_extra_args|
+    :arg preamble: |preamble|
+    :arg wait_for: |explain-waitfor|
+    :returns: a tuple *(out_keys, out_values, count, event)* where *out_keys*
+        holds the key of each run, *out_values* the reduced values of
+        each run, *count* is an on-device scalar (fetch to host with
+        `count.get()`) indicating the number of runs, and *event* is a
+        :class:`pyopencl.Event` for dependency management. Only the first
+        *count* entries of the output arrays are meaningful.
+
+    .. versionadded:: 2017.1
+    """
+
+    if keys.shape != values.shape:
+        raise ValueError("keys and values must have the same shape")
+
+    return _run_reduce_by_key(keys, values, values.dtype, "values[i]",
+            reduce_expr, neutral, is_equal_expr, extra_args, preamble,
+            queue, wait_for)
+
+
+def run_length_encode(ary, is_equal_expr="a == b", extra_args=[], preamble="",
+        queue=None, wait_for=None):
+    """Find the runs of consecutive equal elements of *ary* along with their
+    lengths.
+
+    :arg is_equal_expr: see :func:`reduce_by_key`.
+    :arg extra_args: |scan_extra_args|
+    :arg preamble: |preamble|
+    :arg wait_for: |explain-waitfor|
+    :returns: a tuple *(out, lengths, count, event)* where *out* holds the
+        element making up each run, *lengths* the length of each run,
+        *count* is an on-device scalar (fetch to host with `count.get()`)
+        indicating the number of runs, and *event* is a
+        :class:`pyopencl.Event` for dependency management. Only the first
+        *count* entries of the output arrays are meaningful.
+
+    .. versionadded:: 2017.1
+    """
+
+    return _run_reduce_by_key(ary, None, None, "1", "a+b", "0",
+            is_equal_expr, extra_args, preamble, queue, wait_for)
+
+# }}}
+
+
 # {{{ radix_sort
 
 def to_bin(n):
@@ -325,6 +511,55 @@ RADIX_SORT_PREAMBLE_TPL = Template(r"""//CL//
 
 # }}}
 
+# {{{ key transforms
+
+SORT_FLOAT_KEY_TPL = Template(r"""//CL//
+    inline ${key_ctype} ${func_name}(${value_ctype} value)
+    {
+        ${key_ctype} bits = as_${key_ctype}(value);
+
+        // Flip all bits of negative values, only the sign bit of others.
+        return bits ^ ((bits & ${sign_bit}) ? ~(${key_ctype}) 0 : ${sign_bit});
+    }
+""", strict_undefined=True)
+
+
+def _get_sort_key_transform(value_dtype, descending=False):
+    """Return a tuple *(key_dtype, preamble, transform)*. *transform* is a
+    format string which maps a C expression of type *value_dtype* to an
+    unsigned integer of type *key_dtype* whose order agrees with that of
+    the values, or is reversed if *descending*.
+    """
+    value_dtype = np.dtype(value_dtype)
+    nbits = 8*value_dtype.itemsize
+    key_dtype = np.dtype("uint%d" % nbits)
+    key_ctype = dtype_to_ctype(key_dtype)
+    sign_bit = "((%s) 1 << %d)" % (key_ctype, nbits-1)
+
+    preamble = ""
+    if value_dtype.kind == "u":
+        transform = "(%s)"
+    elif value_dtype.kind == "i":
+        transform = "((%s) (%%s) ^ %s)" % (key_ctype, sign_bit)
+    elif value_dtype.kind == "f" and nbits in [32, 64]:
+        func_name = "pyopencl_sort_key_%s" % value_dtype.type.__name__
+        preamble = SORT_FLOAT_KEY_TPL.render(
+                func_name=func_name,
+                key_ctype={32: "uint", 64: "ulong"}[nbits],
+                value_ctype=dtype_to_ctype(value_dtype),
+                sign_bit=sign_bit)
+        transform = func_name + "(%s)"
+    else:
+        raise TypeError("cannot sort by keys of type '%s'" % value_dtype)
+
+    if descending:
+        transform = "((%s) ~%s)" % (key_ctype, transform)
+
+    return key_dtype, preamble, transform
+
+# }}}
+
+
 # {{{ scan helpers
 
 RADIX_SORT_SCAN_PREAMBLE_TPL = Template(r"""//CL//
@@ -370,7 +605,7 @@ RADIX_SORT_SCAN_PREAMBLE_TPL = Template(r"""//CL//
 
 RADIX_SORT_OUTPUT_STMT_TPL = Template(r"""//CL//
     {
-        key_t key = ${key_expr};
+        key_t key = (${key_expr}) - key_min;
         key_t my_bin_nr = BIN_NR(key);
 
         index_t previous_bins_size = 0;
@@ -410,18 +645,27 @@ class RadixSort(object):
     """
     def __init__(self, context, arguments, key_expr, sort_arg_names,
             bits_at_a_time=2, index_dtype=np.int32, key_dtype=np.uint32,
-            scan_kernel=GenericScanKernel, options=[]):
+            scan_kernel=GenericScanKernel, options=[], descending=False):
         """
         :arg arguments: A string of comma-separated C argument declarations.
             If *arguments* is specified, then *input_expr* must also be
             specified. All types used here must be known to PyOpenCL.
             (see :func:`pyopencl.tools.get_or_register_dtype`).
-        :arg key_expr: An integer-valued C expression returning the
+        :arg key_expr: A C expression of type *key_dtype* returning the
             key based on which the sort is performed. The array index
             for which the key is to be computed is available as `i`.
             The expression may refer to any of the *arguments*.
         :arg sort_arg_names: A list of argument names whose corresponding
             array arguments will be sorted according to *key_expr*.
+        :arg key_dtype: The type of *key_expr*. Unsigned and signed
+            integers as well as :class:`numpy.float32` and
+            :class:`numpy.float64` are supported.
+        :arg descending: If *True*, sort by decreasing key.
+
+        .. versionchanged:: 2017.1
+
+            Added support for signed and floating point keys and
+            the *descending* argument.
         """
 
         # {{{ arg processing
@@ -434,6 +678,12 @@ class RadixSort(object):
         self.bits = int(bits_at_a_time)
         self.index_dtype = np.dtype(index_dtype)
         self.key_dtype = np.dtype(key_dtype)
+        self.descending = descending
+
+        # Keys are sorted as unsigned integers of the same width.
+        self.sort_key_dtype, self.key_preamble, key_transform = \
+                _get_sort_key_transform(self.key_dtype, descending)
+        self.sort_key_expr = key_transform % ("(%s)" % key_expr)
 
         self.options = options
 
@@ -449,7 +699,8 @@ class RadixSort(object):
                 list(self.arguments)
                 + [VectorArg(arg.dtype, "sorted_"+arg.name) for arg in self.arguments
                     if arg.name in sort_arg_names]
-                + [ScalarArg(np.int32, "base_bit")])
+                + [ScalarArg(np.int32, "base_bit"),
+                    ScalarArg(self.sort_key_dtype, "key_min")])
 
         def get_count_branch(known_bits):
             if len(known_bits) == self.bits:
@@ -464,8 +715,8 @@ class RadixSort(object):
 
         codegen_args = dict(
                 bits=self.bits,
-                key_ctype=dtype_to_ctype(self.key_dtype),
-                key_expr=key_expr,
+                key_ctype=dtype_to_ctype(self.sort_key_dtype),
+                key_expr=self.sort_key_expr,
                 index_ctype=dtype_to_ctype(self.index_dtype),
                 index_type_max=np.iinfo(self.index_dtype).max,
                 padded_bin=_padded_bin,
@@ -474,14 +725,18 @@ class RadixSort(object):
                 get_count_branch=get_count_branch,
                 )
 
-        preamble = scan_t_cdecl+RADIX_SORT_PREAMBLE_TPL.render(**codegen_args)
+        preamble = (scan_t_cdecl
+                + self.key_preamble
+                + RADIX_SORT_PREAMBLE_TPL.render(**codegen_args))
         scan_preamble = preamble \
                 + RADIX_SORT_SCAN_PREAMBLE_TPL.render(**codegen_args)
 
         self.scan_kernel = scan_kernel(
                 context, scan_dtype,
                 arguments=scan_arguments,
-                input_expr="scan_t_from_value(%s, base_bit, i)" % key_expr,
+                input_expr=(
+                    "scan_t_from_value((%s) - key_min, base_bit, i)"
+                    % self.sort_key_expr),
                 scan_expr="scan_t_add(a, b, across_seg_boundary)",
                 neutral="scan_t_neutral()",
                 output_statement=RADIX_SORT_OUTPUT_STMT_TPL.render(**codegen_args),
@@ -491,15 +746,48 @@ class RadixSort(object):
             if isinstance(arg, VectorArg):
                 self.first_array_arg_idx = i
 
+        self.context = context
+
         # }}}
 
+    @memoize_method
+    def get_key_range_kernel(self):
+        """Return a kernel computing the minimum and maximum key."""
+        key_max = "%d%s" % (
+                np.iinfo(self.sort_key_dtype).max,
+                "ul" if self.sort_key_dtype.itemsize == 8 else "u")
+
+        from pyopencl.tools import VectorArg
+        arguments = [
+                VectorArg(arg.dtype, arg.name, with_offset=True)
+                if isinstance(arg, VectorArg) else arg
+                for arg in self.arguments]
+
+        from pyopencl.reduction import ReductionKernel
+        return ReductionKernel(self.context, outputs=[
+                    (self.sort_key_dtype, key_max,
+                        "min(a, b)", self.sort_key_expr),
+                    (self.sort_key_dtype, "0",
+                        "max(a, b)", self.sort_key_expr),
+                    ],
+                arguments=arguments, options=self.options,
+                preamble=self.key_preamble)
+
     def __call__(self, *args, **kwargs):
         """Run the radix sort. In addition to *args* which must match the
         *arguments* specification on the constructor, the following
         keyword arguments are supported:
 
         :arg key_bits: specify how many bits (starting from least-significant)
-            there are in the key.
+            there are in the key. For signed, floating point or descending
+            keys, this refers to the unsigned integer the key is mapped to,
+            so only the default of all bits or ``"auto"`` should be used
+            unless all keys are nonnegative integers. If ``"auto"``, the
+            smallest and largest key are found on the device first, and the
+            keys are sorted relative to the smallest key with just enough
+            bits to span their range.
+            This waits for the keys to be computed and transfers the range
+            to the host.
         :arg allocator: See the *allocator* argument of :func:`pyopencl.array.empty`.
         :arg queue: A :class:`pyopencl.CommandQueue`, defaulting to the
             one from the first argument array.
@@ -507,6 +795,10 @@ class RadixSort(object):
         :returns: A tuple ``(sorted, event)``. *sorted* consists of sorted
             copies of the arrays named in *sorted_args*, in the order of that
             list. *event* is a :class:`pyopencl.Event` for dependency management.
+
+        .. versionchanged:: 2017.1
+
+            Added ``key_bits="auto"``.
         """
 
         wait_for = kwargs.pop("wait_for", None)
@@ -515,7 +807,7 @@ class RadixSort(object):
 
         key_bits = kwargs.pop("key_bits", None)
         if key_bits is None:
-            key_bits = int(np.iinfo(self.key_dtype).bits)
+            key_bits = 8*self.sort_key_dtype.itemsize
 
         n = len(args[self.first_array_arg_idx])
 
@@ -523,20 +815,40 @@ class RadixSort(object):
         if allocator is None:
             allocator = args[self.first_array_arg_idx].allocator
 
-        queue = kwargs.pop("allocator", None)
+        queue = kwargs.pop("queue", None)
         if queue is None:
             queue = args[self.first_array_arg_idx].queue
 
+        key_min = 0
+        if key_bits == "auto":
+            key_bits = 1
+            if n:
+                key_min_dev, key_max_dev = self.get_key_range_kernel()(
+                        *args, **dict(queue=queue, wait_for=wait_for))
+                key_min = int(key_min_dev.get())
+                key_bits = max(key_bits,
+                        (int(key_max_dev.get()) - key_min).bit_length())
+
+        key_min = self.sort_key_dtype.type(key_min)
+
         args = list(args)
 
+        # Passes alternate between two sets of output arrays. The input
+        # arrays are only read by the first pass.
+        sorted_arg_sets = [None, None]
+        set_idx = 0
+
         base_bit = 0
         while base_bit < key_bits:
-            sorted_args = [
-                    cl.array.empty(queue, n, arg_descr.dtype, allocator=allocator)
-                    for arg_descr in self.arguments
-                    if arg_descr.name in self.sort_arg_names]
+            if sorted_arg_sets[set_idx] is None:
+                sorted_arg_sets[set_idx] = [
+                        cl.array.empty(queue, n, arg_descr.dtype,
+                            allocator=allocator)
+                        for arg_descr in self.arguments
+                        if arg_descr.name in self.sort_arg_names]
+            sorted_args = sorted_arg_sets[set_idx]
 
-            scan_args = args + sorted_args + [base_bit]
+            scan_args = args + sorted_args + [base_bit, key_min]
 
             last_evt = self.scan_kernel(*scan_args,
                     **dict(queue=queue, wait_for=wait_for))
@@ -548,6 +860,7 @@ class RadixSort(object):
                     args[i] = sorted_args[self.sort_arg_names.index(arg_descr.name)]
 
             base_bit += self.bits
+            set_idx = 1 - set_idx
 
         return [arg_val
                 for arg_descr, arg_val in zip(self.arguments, args)
@@ -560,6 +873,844 @@ class RadixSort(object):
 # }}}
 
 
+# {{{ sort, argsort
+
+# Above this size, a bitonic sort does too many passes over the data to
+# compete with a radix sort.
+_MAX_BITONIC_SORT_SIZE = 2**16
+
+
+@context_dependent_memoize
+def _get_radix_sort(context, dtype, index_dtype, descending, argsort):
+    ctype = dtype_to_ctype(dtype)
+    if argsort:
+        return RadixSort(context,
+                "%s *ary, %s *idx" % (ctype, dtype_to_ctype(index_dtype)),
+                key_expr="ary[i]", sort_arg_names=["idx"],
+                index_dtype=index_dtype, key_dtype=dtype,
+                descending=descending)
+    else:
+        return RadixSort(context, "%s *ary" % ctype,
+                key_expr="ary[i]", sort_arg_names=["ary"],
+                index_dtype=index_dtype, key_dtype=dtype,
+                descending=descending)
+
+
+@context_dependent_memoize
+def _get_bitonic_sort(context):
+    from pyopencl.bitonic_sort import BitonicSort
+    return BitonicSort(context)
+
+
+def _use_bitonic_sort(ary, queue, descending):
+    if not 2 <= ary.size <= _MAX_BITONIC_SORT_SIZE:
+        return False
+
+    # Comparisons with NaN would confuse the sorting network, so
+    # floating point data always goes to the radix sort.
+    if descending or ary.dtype.kind not in "iu" or ary.dtype.itemsize < 4:
+        return False
+
+    dev = queue.device
+    return not (dev.platform.name == "Apple" and dev.type & cl.device_type.CPU)
+
+
+def _prepare_sort(ary, queue):
+    if len(ary.shape) != 1:
+        raise ValueError("only one-dimensional arrays can be sorted")
+
+    if queue is None:
+        queue = ary.queue
+
+    if ary.size > np.iinfo(np.int32).max:
+        index_dtype = np.dtype(np.int64)
+    else:
+        index_dtype = np.dtype(np.int32)
+
+    return queue, index_dtype
+
+
+def _run_radix_sort(ary, queue, index_dtype, descending, argsort, wait_for,
+        allocator=None):
+    if not ary.flags.c_contiguous or ary.offset:
+        ary = ary.copy(queue=queue)
+
+    sorter = _get_radix_sort(
+            ary.context, ary.dtype, index_dtype, descending, argsort)
+
+    args = [ary]
+    if argsort:
+        args.append(cl.array.arange(queue, ary.size, dtype=index_dtype,
+            allocator=allocator))
+
+    # Integer keys often occupy a small range, and sorting relative to
+    # the smallest key saves passes.
+    (result,), evt = sorter(*args, **dict(
+        key_bits="auto" if ary.dtype.kind in "iu" else None,
+        queue=queue, wait_for=wait_for, allocator=allocator))
+
+    return result, evt
+
+
+def sort(ary, descending=False, queue=None, wait_for=None, allocator=None):
+    """Return a sorted copy of the one-dimensional array *ary*.
+
+    Depending on the size and type of *ary*, this uses either
+    :class:`pyopencl.bitonic_sort.BitonicSort` or :class:`RadixSort`.
+    Floating point values are ordered as by :func:`numpy.sort`, except
+    that NaNs with the sign bit set sort before all other values.
+
+    :arg descending: If *True*, sort in decreasing order.
+    :arg allocator: See the *allocator* argument of :func:`pyopencl.array.empty`.
+    :arg wait_for: |explain-waitfor|
+    :returns: a tuple *(sorted, event)*, where *event* is a
+        :class:`pyopencl.Event` for dependency management.
+
+    .. versionadded:: 2017.1
+    """
+    queue, index_dtype = _prepare_sort(ary, queue)
+
+    if _use_bitonic_sort(ary, queue, descending):
+        result = cl.array.empty(queue, ary.shape, ary.dtype, allocator=allocator)
+        result.add_event(ary._copy(result, ary, queue=queue, wait_for=wait_for))
+
+        _, evt = _get_bitonic_sort(ary.context)(result, queue=queue)
+        result.add_event(evt)
+        return result, evt
+
+    return _run_radix_sort(
+            ary, queue, index_dtype, descending, False, wait_for, allocator)
+
+
+def argsort(ary, descending=False, queue=None, wait_for=None, allocator=None):
+    """Return the indices that sort the one-dimensional array *ary*,
+    like :func:`numpy.argsort`. The indices are of type :class:`numpy.int32`,
+    or :class:`numpy.int64` for arrays with more than ``2**31-1`` entries.
+
+    Which algorithm is used is determined as in :func:`sort`. The radix
+    sort is stable, i.e. equal values keep their relative order. This is
+    not guaranteed for short integer arrays, which may be sorted by a
+    bitonic sort.
+
+    :arg descending: If *True*, sort in decreasing order.
+    :arg allocator: See the *allocator* argument of :func:`pyopencl.array.empty`.
+    :arg wait_for: |explain-waitfor|
+    :returns: a tuple *(indices, event)*, where *event* is a
+        :class:`pyopencl.Event` for dependency management.
+
+    .. versionadded:: 2017.1
+    """
+    queue, index_dtype = _prepare_sort(ary, queue)
+
+    if _use_bitonic_sort(ary, queue, descending):
+        keys = cl.array.empty(queue, ary.shape, ary.dtype, allocator=allocator)
+        keys.add_event(ary._copy(keys, ary, queue=queue, wait_for=wait_for))
+        idx = cl.array.arange(queue, ary.size, dtype=index_dtype,
+                allocator=allocator)
+
+        _, evt = _get_bitonic_sort(ary.context)(keys, idx, queue=queue,
+                wait_for=idx.events)
+        idx.add_event(evt)
+        return idx, evt
+
+    return _run_radix_sort(
+            ary, queue, index_dtype, descending, True, wait_for, allocator)
+
+# }}}
+
+
+# {{{ top_k
+
+# number of key bits resolved by each counting pass of the radix select
+_RADIX_SELECT_BITS = 4
+
+RADIX_SELECT_PREAMBLE_TPL = Template(r"""//CL//
+    ${key_preamble}
+
+    #define PCL_TOP_K_KEY(value) (${key_transform})
+
+    inline int pcl_radix_select_digit(
+        ${key_ctype} key, ${key_ctype} prefix, ${key_ctype} hi_mask, int shift)
+    {
+        // keys that differ from the prefix found so far are out of the race
+        if ((key & hi_mask) != prefix)
+            return -1;
+
+        return (int) ((key >> shift) & ${2**bits - 1});
+    }
+""", strict_undefined=True)
+
+TOP_K_OUTPUT_STMT_TPL = Template(r"""//CL//
+    if (prev_item != item)
+    {
+        ${index_ctype} row = i / row_length;
+        ${index_ctype} pos = item - 1;
+        if (select_equal)
+            pos += n_less[row];
+
+        // only as many keys equal to the threshold as fit are kept
+        if (pos < k)
+        {
+            out[row*k + pos] = ary[i];
+            out_idx[row*k + pos] = i - row*row_length;
+            out_row[row*k + pos] = row;
+        }
+    }
+""", strict_undefined=True)
+
+
+def _get_top_k_preamble(dtype, largest):
+    key_dtype, key_preamble, key_transform = \
+            _get_sort_key_transform(dtype, descending=largest)
+
+    return key_dtype, RADIX_SELECT_PREAMBLE_TPL.render(
+            key_preamble=key_preamble,
+            key_transform=key_transform % "(value)",
+            key_ctype=dtype_to_ctype(key_dtype),
+            bits=_RADIX_SELECT_BITS)
+
+
+@context_dependent_memoize
+def _get_radix_select_count_kernel(context, dtype, index_dtype, largest):
+    key_dtype, preamble = _get_top_k_preamble(dtype, largest)
+
+    digit_expr = ("pcl_radix_select_digit(PCL_TOP_K_KEY(ary[i]), "
+            "prefix[i / row_length], hi_mask, shift)")
+
+    from pyopencl.reduction import ReductionKernel
+    return ReductionKernel(context,
+            outputs=[
+                (index_dtype, "0", "a+b", "(%s == %d)" % (digit_expr, digit))
+                for digit in range(2**_RADIX_SELECT_BITS)],
+            arguments="%s *ary, %s *prefix, %s hi_mask, int shift, "
+            "%s row_length" % (
+                dtype_to_ctype(dtype), dtype_to_ctype(key_dtype),
+                dtype_to_ctype(key_dtype), dtype_to_ctype(index_dtype)),
+            preamble=preamble)
+
+
+@context_dependent_memoize
+def _get_top_k_select_kernel(context, dtype, index_dtype, largest):
+    key_dtype, preamble = _get_top_k_preamble(dtype, largest)
+
+    ctype = dtype_to_ctype(dtype)
+    index_ctype = dtype_to_ctype(index_dtype)
+
+    from pyopencl.scan import GenericRowScanKernel
+    return GenericRowScanKernel(context, index_dtype,
+            arguments="%s *ary, %s *out, %s *out_idx, %s *out_row, "
+            "%s *threshold, %s *n_less, %s k, int select_equal" % (
+                ctype, ctype, index_ctype, index_ctype,
+                dtype_to_ctype(key_dtype), index_ctype, index_ctype),
+            input_expr="(select_equal "
+            "? PCL_TOP_K_KEY(ary[i]) == threshold[i / row_length] "
+            ": PCL_TOP_K_KEY(ary[i]) < threshold[i / row_length]) ? 1 : 0",
+            scan_expr="across_seg_boundary ? b : (a+b)", neutral="0",
+            output_statement=TOP_K_OUTPUT_STMT_TPL.render(
+                index_ctype=index_ctype),
+            index_dtype=index_dtype, preamble=preamble)
+
+
+@context_dependent_memoize
+def _get_top_k_sorts(context, dtype, index_dtype, largest):
+    arguments = "%s *vals, %s *idx, %s *rows" % (
+            dtype_to_ctype(dtype),
+            dtype_to_ctype(index_dtype), dtype_to_ctype(index_dtype))
+
+    by_value = RadixSort(context, arguments, key_expr="vals[i]",
+            sort_arg_names=["vals", "idx", "rows"],
+            index_dtype=index_dtype, key_dtype=dtype, descending=largest)
+    by_row = RadixSort(context, arguments, key_expr="rows[i]",
+            sort_arg_names=["vals", "idx"],
+            index_dtype=index_dtype, key_dtype=index_dtype)
+
+    return by_value, by_row
+
+
+def top_k(ary, k, largest=True, return_indices=True, queue=None,
+        wait_for=None, allocator=None):
+    """Find the *k* largest (or smallest) entries of the one-dimensional
+    array *ary*, or of each row of the two-dimensional array *ary*.
+
+    Instead of sorting all of *ary*, the value of the *k*-th entry is
+    determined by a radix select, which counts the digits of the keys in a
+    few passes over the data (one per four bits of the type of *ary*).
+    Only the *k* selected entries are then sorted. Rows are processed
+    together, with one work group per row in the counting passes.
+
+    :arg largest: If *False*, find the smallest entries instead.
+    :arg return_indices: Whether to also return the indices (within
+        their row) of the selected entries.
+    :arg allocator: See the *allocator* argument of :func:`pyopencl.array.empty`.
+    :arg wait_for: |explain-waitfor|
+    :returns: a tuple *(values, indices, event)*, or *(values, event)* if
+        *return_indices* is false. *values* and *indices* have shape
+        ``(k,)`` for one-dimensional and ``(nrows, k)`` for two-dimensional
+        *ary*, and are sorted largest (or smallest) first. Equal values
+        appear in the order of their indices. *event* is a
+        :class:`pyopencl.Event` for dependency management.
+
+    .. versionadded:: 2017.1
+    """
+    if len(ary.shape) not in [1, 2]:
+        raise ValueError("top_k requires a one- or two-dimensional array")
+
+    if queue is None:
+        queue = ary.queue
+
+    nrows = 1 if len(ary.shape) == 1 else ary.shape[0]
+    row_length = ary.shape[-1]
+
+    k = int(k)
+    if not 0 <= k <= row_length:
+        raise ValueError("k must be between 0 and the length of a row")
+
+    if ary.size > np.iinfo(np.int32).max:
+        index_dtype = np.dtype(np.int64)
+    else:
+        index_dtype = np.dtype(np.int32)
+
+    from pyopencl.array import empty, to_device
+
+    out_shape = ary.shape[:-1] + (k,)
+    values = empty(queue, out_shape, ary.dtype, allocator=allocator)
+    indices = empty(queue, out_shape, index_dtype, allocator=allocator)
+
+    if not values.size:
+        evt = cl.enqueue_marker(queue, wait_for=wait_for)
+        if return_indices:
+            return values, indices, evt
+        else:
+            return values, evt
+
+    if not ary.flags.c_contiguous or ary.offset:
+        ary_c = empty(queue, ary.shape, ary.dtype, allocator=allocator)
+        wait_for = [ary._copy(ary_c, ary, queue=queue, wait_for=wait_for)]
+        ary = ary_c
+
+    ary = ary.reshape(ary.size)
+
+    # {{{ find the k-th key of each row by radix select
+
+    key_dtype, _ = _get_top_k_preamble(ary.dtype, largest)
+    nbits = 8*key_dtype.itemsize
+    ndigits = 2**_RADIX_SELECT_BITS
+
+    count_knl = _get_radix_select_count_kernel(
+            ary.context, ary.dtype, index_dtype, largest)
+
+    if nrows > 1:
+        from pyopencl.array import arange
+        segment_starts = arange(queue, 0, ary.size + 1, row_length,
+                dtype=index_dtype, allocator=allocator)
+
+    # the number of keys still needed from those matching the prefix
+    remaining = np.empty(nrows, dtype=index_dtype)
+    remaining.fill(k)
+    prefix = np.zeros(nrows, dtype=key_dtype)
+    hi_mask = 0
+
+    counts_dev = empty(queue, (ndigits, nrows), index_dtype,
+            allocator=allocator)
+    if nrows > 1:
+        counts_out = tuple(counts_dev[digit] for digit in range(ndigits))
+    else:
+        counts_out = tuple(counts_dev[digit, 0] for digit in range(ndigits))
+
+    for shift in range(nbits - _RADIX_SELECT_BITS, -1, -_RADIX_SELECT_BITS):
+        prefix_dev = to_device(queue, prefix, allocator=allocator)
+
+        count_args = (ary, prefix_dev, key_dtype.type(hi_mask),
+                np.int32(shift), index_dtype.type(row_length))
+        count_kwargs = dict(queue=queue, wait_for=wait_for,
+                out=counts_out, return_event=True)
+        if nrows > 1:
+            count_kwargs["segment_starts"] = segment_starts
+
+        _, evt = count_knl(*count_args, **count_kwargs)
+        wait_for = [evt]
+
+        counts = counts_dev.get(queue=queue)
+        below = np.cumsum(counts, axis=0)
+
+        # the digit of the k-th key is the first at which enough keys
+        # have been counted
+        digit = (below < remaining).sum(axis=0)
+        remaining -= np.where(digit > 0,
+                below[np.maximum(digit - 1, 0), np.arange(nrows)],
+                0).astype(index_dtype)
+
+        prefix |= np.left_shift(digit.astype(key_dtype), key_dtype.type(shift))
+        hi_mask |= (ndigits - 1) << shift
+
+    # }}}
+
+    # {{{ gather the keys before and at the threshold
+
+    select_knl = _get_top_k_select_kernel(
+            ary.context, ary.dtype, index_dtype, largest)
+
+    threshold_dev = to_device(queue, prefix, allocator=allocator)
+    n_less_dev = to_device(queue, (k - remaining).astype(index_dtype),
+            allocator=allocator)
+
+    flat_values = values.reshape(values.size)
+    flat_indices = indices.reshape(indices.size)
+    rows = empty(queue, values.size, index_dtype, allocator=allocator)
+
+    for select_equal in [0, 1]:
+        evt = select_knl(ary, flat_values, flat_indices, rows,
+                threshold_dev, n_less_dev, index_dtype.type(k),
+                np.int32(select_equal),
+                row_length=row_length, queue=queue, wait_for=wait_for)
+        wait_for = [evt]
+
+    # }}}
+
+    # {{{ order the selected entries
+
+    by_value, by_row = _get_top_k_sorts(
+            ary.context, ary.dtype, index_dtype, largest)
+
+    (flat_values, flat_indices, rows), evt = by_value(
+            flat_values, flat_indices, rows,
+            **dict(queue=queue, wait_for=wait_for, allocator=allocator))
+
+    if nrows > 1:
+        # The radix sort is stable, so a second sort by row keeps each row
+        # sorted by value.
+        (flat_values, flat_indices), evt = by_row(
+                flat_values, flat_indices, rows,
+                **dict(key_bits="auto", queue=queue, wait_for=[evt],
+                    allocator=allocator))
+
+    values = flat_values.reshape(out_shape)
+    indices = flat_indices.reshape(out_shape)
+
+    # }}}
+
+    if return_indices:
+        return values, indices, evt
+    else:
+        return values, evt
+
+# }}}
+
+
+# {{{ histogram, bincount
+
+# upper bound on the total size of the per-work-item histograms used on
+# devices without fast local atomics
+_MAX_PRIVATE_HISTOGRAM_ENTRIES = 2**22
+
+HISTOGRAM_KERNEL_TPL = Template(CLUDA_PREAMBLE + r"""//CL//
+    #if __OPENCL_VERSION__ < 110
+    % if method == "local":
+    #pragma OPENCL EXTENSION cl_khr_local_int32_base_atomics: enable
+    % endif
+    #pragma OPENCL EXTENSION cl_khr_global_int32_base_atomics: enable
+    #endif
+
+    typedef ${hist_ctype} hist_t;
+
+    ${preamble}
+
+    % for space in atomic_spaces:
+    inline void pcl_hist_add_${space}(volatile __${space} hist_t *p, hist_t val)
+    {
+        % if hist_is_float:
+        // There is no atomic floating point addition.
+        union { hist_t f; unsigned int u; } old_val, new_val;
+        do
+        {
+            old_val.f = *p;
+            new_val.f = old_val.f + val;
+        }
+        while (atomic_cmpxchg((volatile __${space} unsigned int *) p,
+                old_val.u, new_val.u) != old_val.u);
+        % else:
+        atomic_add(p, val);
+        % endif
+    }
+    % endfor
+
+    __kernel void histogram(
+        __global hist_t *hist,
+        ${arg_decls},
+        long n, long nbins
+        % if method == "local":
+        , __local hist_t *local_hist
+        % endif
+        )
+    {
+        long n_work_items = GDIM_0*LDIM_0;
+        long gid = GID_0*LDIM_0 + LID_0;
+
+        % if method == "local":
+        for (long b = LID_0; b < nbins; b += LDIM_0)
+            local_hist[b] = 0;
+        barrier(CLK_LOCAL_MEM_FENCE);
+        % elif method == "private":
+        // Each work item owns every n_work_items-th entry.
+        for (long b = 0; b < nbins; ++b)
+            hist[b*n_work_items + gid] = 0;
+        % endif
+
+        for (long i = gid; i < n; i += n_work_items)
+        {
+            long b = ${bin_expr};
+            if (b < 0 || b >= nbins)
+                continue;
+
+            hist_t w = ${weight_expr};
+            % if method == "local":
+            pcl_hist_add_local(local_hist + b, w);
+            % elif method == "global":
+            pcl_hist_add_global(hist + b, w);
+            % else:
+            hist[b*n_work_items + gid] += w;
+            % endif
+        }
+
+        % if method == "local":
+        barrier(CLK_LOCAL_MEM_FENCE);
+        for (long b = LID_0; b < nbins; b += LDIM_0)
+            if (local_hist[b] != 0)
+                pcl_hist_add_global(hist + b, local_hist[b]);
+        % endif
+    }
+""", strict_undefined=True)
+
+
+def _get_histogram_method(dev, hist_dtype, nbins):
+    """Return how a histogram of *nbins* entries of *hist_dtype* is
+    accumulated on *dev*: ``"local"`` for work-group histograms in local
+    memory merged by global atomics, ``"global"`` for atomics on the result,
+    or ``"private"`` for one histogram per work item, summed afterwards.
+    """
+    from pyopencl.characterize import (
+            has_fast_local_int32_atomics, has_global_int32_atomics,
+            usable_local_mem_size)
+
+    # Only 32-bit atomics are assumed.
+    if (hist_dtype.itemsize != 4
+            or not has_fast_local_int32_atomics(dev)
+            or not has_global_int32_atomics(dev)):
+        return "private"
+
+    if nbins*hist_dtype.itemsize <= usable_local_mem_size(dev) // 2:
+        return "local"
+    else:
+        # Contention is low with this many bins.
+        return "global"
+
+
+@context_dependent_memoize
+def _get_histogram_kernel(context, hist_dtype, method, arguments,
+        bin_expr, weight_expr, preamble):
+    from pyopencl.tools import parse_arg_list, get_arg_list_scalar_arg_dtypes
+    from pyopencl.characterize import has_double_support
+
+    arguments = parse_arg_list(arguments)
+
+    src = HISTOGRAM_KERNEL_TPL.render(
+            double_support=all(
+                has_double_support(dev) for dev in context.devices),
+            method=method,
+            hist_ctype=dtype_to_ctype(hist_dtype),
+            hist_is_float=hist_dtype.kind == "f",
+            atomic_spaces={
+                "local": ["local", "global"],
+                "global": ["global"],
+                "private": []}[method],
+            preamble=preamble,
+            arg_decls=", ".join(arg.declarator() for arg in arguments),
+            bin_expr=bin_expr,
+            weight_expr=weight_expr)
+
+    knl = cl.Program(context, src).build().histogram
+    knl.set_scalar_arg_dtypes(
+            [None]
+            + get_arg_list_scalar_arg_dtypes(arguments)
+            + [np.int64, np.int64]
+            + ([None] if method == "local" else []))
+    return knl
+
+
+@context_dependent_memoize
+def _get_histogram_sum_kernel(context, dtype):
+    from pyopencl.reduction import ReductionKernel
+    return ReductionKernel(context, dtype, neutral="0", reduce_expr="a+b",
+            arguments="const %s *in" % dtype_to_ctype(dtype))
+
+
+@context_dependent_memoize
+def _get_value_range_kernel(context, dtype, range_dtype):
+    """Return a kernel finding the minimum and maximum of an array of
+    *dtype*, converted to *range_dtype*.
+    """
+    if range_dtype.kind == "f":
+        min_neutral, max_neutral = "INFINITY", "-INFINITY"
+    else:
+        iinfo = np.iinfo(range_dtype)
+        suffix = ""
+        if range_dtype.kind == "u":
+            suffix += "u"
+        if range_dtype.itemsize == 8:
+            suffix += "l"
+
+        min_neutral = "%d%s" % (iinfo.max, suffix)
+        # the literal for the most negative value would overflow
+        max_neutral = "(%d%s - 1)" % (iinfo.min + 1, suffix)
+
+    map_expr = "(%s) ary[i]" % dtype_to_ctype(range_dtype)
+
+    from pyopencl.reduction import ReductionKernel
+    return ReductionKernel(context, outputs=[
+                (range_dtype, min_neutral, "min(a, b)", map_expr),
+                (range_dtype, max_neutral, "max(a, b)", map_expr),
+                ],
+            arguments="const %s *ary" % dtype_to_ctype(dtype))
+
+
+def _get_value_range(ary, range_dtype, queue, wait_for):
+    min_dev, max_dev = _get_value_range_kernel(
+            ary.context, ary.dtype, np.dtype(range_dtype))(
+                    ary, queue=queue, wait_for=wait_for)
+    return min_dev.get(queue=queue), max_dev.get(queue=queue)
+
+
+def _as_histogram_input(ary, queue):
+    # Entries are visited in any order, but the kernel needs them dense.
+    if not ary.flags.forc or ary.offset:
+        ary = ary.copy(queue=queue)
+    return ary
+
+
+def _run_histogram(queue, hist_dtype, nbins, n, arguments, args,
+        bin_expr, weight_expr, preamble, wait_for, allocator, scalar_args=()):
+    from pyopencl.array import zeros, empty
+
+    if not nbins or not n:
+        hist = zeros(queue, nbins, hist_dtype, allocator=allocator)
+        return hist, cl.enqueue_marker(queue, wait_for=wait_for)
+
+    dev = queue.device
+    method = _get_histogram_method(dev, hist_dtype, nbins)
+    knl = _get_histogram_kernel(queue.context, hist_dtype, method,
+            arguments, bin_expr, weight_expr, preamble)
+
+    wg_size = min(256, dev.max_work_group_size,
+            knl.get_work_group_info(
+                cl.kernel_work_group_info.WORK_GROUP_SIZE, dev))
+    n_work_items = min(
+            4*dev.max_compute_units*wg_size,
+            (n + wg_size - 1) // wg_size * wg_size)
+
+    invocation_args = [arg.data for arg in args] + list(scalar_args)
+
+    if method == "private":
+        n_work_items = max(1, min(n_work_items,
+            _MAX_PRIVATE_HISTOGRAM_ENTRIES // nbins))
+
+        sub_hists = empty(queue, (nbins, n_work_items), hist_dtype,
+                allocator=allocator)
+        evt = knl(queue, (n_work_items,), None,
+                *([sub_hists.data] + invocation_args + [n, nbins]),
+                **dict(wait_for=wait_for))
+
+        hist = empty(queue, nbins, hist_dtype, allocator=allocator)
+        _, evt = _get_histogram_sum_kernel(queue.context, hist_dtype)(
+                sub_hists, axis=1, out=hist, queue=queue, wait_for=[evt],
+                return_event=True)
+
+    else:
+        hist = zeros(queue, nbins, hist_dtype, allocator=allocator)
+
+        extra_args = []
+        if method == "local":
+            extra_args.append(cl.LocalMemory(nbins*hist_dtype.itemsize))
+
+        evt = knl(queue, (n_work_items,), (wg_size,),
+                *([hist.data] + invocation_args + [n, nbins] + extra_args),
+                **dict(wait_for=(wait_for or []) + hist.events))
+
+    hist.add_event(evt)
+    return hist, evt
+
+
+def _get_histogram_weights(weights, n, queue):
+    if weights is None:
+        return np.dtype(np.int32), [], [], "1"
+
+    if weights.size != n:
+        raise ValueError("weights must have as many entries as the data")
+    if weights.dtype not in [np.float32, np.float64]:
+        raise TypeError("weights must be of type float32 or float64")
+
+    weights = _as_histogram_input(weights, queue)
+    return (weights.dtype,
+            ["const %s *weights" % dtype_to_ctype(weights.dtype)],
+            [weights], "weights[i]")
+
+
+def bincount(indices, weights=None, minlength=0, queue=None, wait_for=None,
+        allocator=None):
+    """Count the occurrences of each value in the one-dimensional array of
+    nonnegative integers *indices*, like :func:`numpy.bincount`.
+
+    Each work group accumulates a histogram in local memory, which is then
+    added to the result by atomic operations. On devices without fast
+    local atomics (see
+    :func:`pyopencl.characterize.has_fast_local_int32_atomics`), each work
+    item fills its own histogram in global memory instead, and these
+    are summed by a reduction.
+
+    :arg weights: If given, a :class:`numpy.float32` or :class:`numpy.float64`
+        array of the same length as *indices*, whose entries are summed
+        instead of counting.
+    :arg minlength: The minimum length of the result.
+    :arg allocator: See the *allocator* argument of :func:`pyopencl.array.empty`.
+    :arg wait_for: |explain-waitfor|
+    :returns: a tuple *(counts, event)*. *counts* has length
+        ``max(indices.max()+1, minlength)`` and is of type :class:`numpy.int32`,
+        or of the type of *weights*. *event* is a :class:`pyopencl.Event`
+        for dependency management.
+
+    .. versionadded:: 2017.1
+    """
+    if len(indices.shape) != 1:
+        raise ValueError("indices must be one-dimensional")
+    if indices.dtype.kind not in "iu":
+        raise TypeError("indices must be of an integer type")
+
+    if queue is None:
+        queue = indices.queue
+
+    n = indices.size
+    indices = _as_histogram_input(indices, queue)
+
+    nbins = int(minlength)
+    if n:
+        min_index, max_index = _get_value_range(
+                indices, indices.dtype, queue, wait_for)
+        if min_index < 0:
+            raise ValueError("indices must be nonnegative")
+        nbins = max(nbins, int(max_index) + 1)
+
+    hist_dtype, weight_arguments, weight_args, weight_expr = \
+            _get_histogram_weights(weights, n, queue)
+
+    return _run_histogram(queue, hist_dtype, nbins, n,
+            arguments=", ".join(
+                ["const %s *indices" % dtype_to_ctype(indices.dtype)]
+                + weight_arguments),
+            args=[indices] + weight_args,
+            bin_expr="indices[i]", weight_expr=weight_expr,
+            preamble="", wait_for=wait_for, allocator=allocator)
+
+
+HISTOGRAM_BIN_PREAMBLE_TPL = Template(r"""//CL//
+    inline long pcl_histogram_bin(
+        ${coord_ctype} x, ${coord_ctype} lower, ${coord_ctype} upper,
+        ${coord_ctype} scale, long nbins)
+    {
+        // also skips NaN
+        if (!(x >= lower && x <= upper))
+            return -1;
+
+        // the last bin includes its upper edge
+        long b = (long) ((x - lower)*scale);
+        return (b < nbins) ? b : nbins - 1;
+    }
+""", strict_undefined=True)
+
+
+def histogram(ary, bins=10, range=None, weights=None, queue=None,
+        wait_for=None, allocator=None):
+    """Compute a histogram of the values in *ary* with *bins* equally wide
+    bins, like :func:`numpy.histogram`. Values outside of *range* are
+    ignored. The computation proceeds as in :func:`bincount`.
+
+    :arg bins: The number of bins. Explicit bin edges are not supported.
+    :arg range: A tuple *(lower, upper)* giving the outer edges of the bins.
+        Defaults to the smallest and largest value in *ary*, which are
+        found on the device and transferred to the host.
+    :arg weights: If given, an array of the same size as *ary*, whose
+        entries are summed instead of counting, as in :func:`bincount`.
+    :arg allocator: See the *allocator* argument of :func:`pyopencl.array.empty`.
+    :arg wait_for: |explain-waitfor|
+    :returns: a tuple *(hist, bin_edges, event)*, where *hist* is a
+        :class:`pyopencl.array.Array`, *bin_edges* is a :mod:`numpy` array of
+        length ``bins+1`` and *event* is a :class:`pyopencl.Event`
+        for dependency management.
+
+    .. versionadded:: 2017.1
+    """
+    if not isinstance(bins, (int, np.integer)):
+        raise NotImplementedError("only a number of bins is supported, "
+                "not bin edges")
+    bins = int(bins)
+    if bins < 1:
+        raise ValueError("bins must be positive")
+
+    if queue is None:
+        queue = ary.queue
+
+    n = ary.size
+    ary = _as_histogram_input(ary, queue)
+
+    from pyopencl.characterize import has_double_support
+    if ary.dtype.kind == "f":
+        coord_dtype = ary.dtype
+    elif has_double_support(queue.device):
+        coord_dtype = np.dtype(np.float64)
+    else:
+        coord_dtype = np.dtype(np.float32)
+
+    if range is None:
+        if n:
+            lower, upper = _get_value_range(ary, coord_dtype, queue, wait_for)
+        else:
+            lower, upper = 0, 1
+    else:
+        lower, upper = range
+        if lower > upper:
+            raise ValueError("range must be ascending")
+
+    lower = float(lower)
+    upper = float(upper)
+    if lower == upper:
+        lower -= 0.5
+        upper += 0.5
+
+    bin_edges = np.linspace(lower, upper, bins + 1)
+
+    hist_dtype, weight_arguments, weight_args, weight_expr = \
+            _get_histogram_weights(weights, n, queue)
+
+    coord_ctype = dtype_to_ctype(coord_dtype)
+    hist, evt = _run_histogram(queue, hist_dtype, bins, n,
+            arguments=", ".join(
+                ["const %s *ary" % dtype_to_ctype(ary.dtype)]
+                + weight_arguments
+                + ["%s lower, %s upper, %s scale" % (
+                    coord_ctype, coord_ctype, coord_ctype)]),
+            args=[ary] + weight_args,
+            bin_expr="pcl_histogram_bin((%s) ary[i], lower, upper, scale, "
+            "nbins)" % coord_ctype,
+            weight_expr=weight_expr,
+            preamble=HISTOGRAM_BIN_PREAMBLE_TPL.render(coord_ctype=coord_ctype),
+            wait_for=wait_for, allocator=allocator,
+            scalar_args=[
+                coord_dtype.type(lower), coord_dtype.type(upper),
+                coord_dtype.type(bins / (upper - lower))])
+
+    return hist, bin_edges, evt
+
+# }}}
+
+
 # {{{ generic parallel list builder
 
 # {{{ kernel template
@@ -820,7 +1971,7 @@ class ListOfListsBuilder:
                 arguments="__global %s *ary" % dtype_to_ctype(index_dtype),
                 input_expr="ary[i]",
                 scan_expr="a+b", neutral="0",
-                output_statement="ary[i+1] = item;",
+                output_statement="ary[i] = prev_item;",
                 devices=self.devices)
 
     def do_not_vectorize(self):
@@ -1061,10 +2212,12 @@ class ListOfListsBuilder:
 
             info_record = result[name]
             starts_ary = info_record.starts
+            # counts[-1] is zero, so an exclusive scan over all n_objects+1
+            # entries leaves the total count in starts[-1].
             evt = scan_kernel(starts_ary, wait_for=[count_event],
-                    size=n_objects)
+                    size=n_objects+1)
 
-            starts_ary.setitem(0, 0, queue=queue, wait_for=[evt])
+            starts_ary.add_event(evt)
             scan_events.extend(starts_ary.events)
 
             # retrieve count
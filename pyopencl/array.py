@@ -30,6 +30,10 @@ OTHER DEALINGS IN THE SOFTWARE.
 import six
 from six.moves import range, zip, reduce
 
+import threading
+import weakref
+from contextlib import contextmanager
+
 import numpy as np
 import pyopencl.elementwise as elementwise
 import pyopencl as cl
@@ -41,6 +45,7 @@ from pyopencl.compyte.array import (
         ArrayFlags as _ArrayFlags,
         get_common_dtype as _get_common_dtype_base)
 from pyopencl.characterize import has_double_support
+from pyopencl.tools import context_dependent_memoize, can_index_flat
 
 
 def _get_common_dtype(obj1, obj2, queue):
@@ -189,6 +194,137 @@ def splay(queue, n, kernel_specific_max_wg_size=None):
     return (group_count*work_items_per_group,), (work_items_per_group,)
 
 
+class LaunchConfigCache(object):
+    """Remembers the launch geometry of elementwise kernels by *(kernel,
+    device, n)* and :attr:`Array.flags` by *(shape, strides, itemsize)*, so
+    that repeated operations on arrays of an already-seen shape make no
+    device queries and no :func:`splay` computations.
+
+    Use :func:`get_launch_config_cache` to obtain the instance used by
+    :class:`Array` and :class:`pyopencl.elementwise.ElementwiseKernel`.
+
+    .. attribute:: hits
+    .. attribute:: misses
+
+        Counts of launch geometry lookups that were and were not satisfied
+        from the cache.
+
+    .. attribute:: flags_hits
+    .. attribute:: flags_misses
+
+        The same, for lookups of :attr:`Array.flags`.
+
+    .. automethod:: get_launch_config
+    .. automethod:: get_flags
+    .. automethod:: clear
+
+    .. versionadded:: 2017.1
+    """
+
+    max_entries = 4096
+
+    def __init__(self):
+        self._configs = {}
+        self._flags = {}
+        self._tuner_generation = None
+
+        self.hits = 0
+        self.misses = 0
+        self.flags_hits = 0
+        self.flags_misses = 0
+
+    def get_launch_config(self, queue, kernel, n, max_wg_size=None):
+        """Return a tuple *(global_size, local_size, trial)* for launching
+        *kernel* over *n* items, as :func:`pyopencl.autotune.tuned_splay`
+        does. If *kernel* is *None*, the geometry is computed by
+        :func:`splay` with *max_wg_size*, without tuning.
+        """
+        from pyopencl.autotune import get_launch_tuner, _queue_has_profiling
+        tuner = get_launch_tuner()
+        if tuner.generation != self._tuner_generation:
+            self._configs.clear()
+            self._tuner_generation = tuner.generation
+
+        dev = _get_queue_device(queue)
+        if kernel is None:
+            key = (None, dev, n, max_wg_size)
+        else:
+            key = (kernel, dev, n, _queue_has_profiling(queue))
+
+        try:
+            gs, ls = self._configs[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return gs, ls, None
+
+        self.misses += 1
+
+        if kernel is None:
+            gs, ls = splay(queue, n, max_wg_size)
+            trial = None
+        else:
+            from pyopencl.autotune import tuned_splay
+            gs, ls, trial = tuned_splay(queue, kernel, n,
+                    kernel.get_work_group_info(
+                        cl.kernel_work_group_info.WORK_GROUP_SIZE, dev))
+
+            if trial is not None or tuner.is_tuning(
+                    queue, kernel, "elementwise", n):
+                return gs, ls, trial
+
+        if len(self._configs) >= self.max_entries:
+            self._configs.clear()
+        self._configs[key] = gs, ls
+        return gs, ls, trial
+
+    def get_flags(self, ary):
+        """Return the :attr:`Array.flags` for an array with the shape, strides
+        and item size of *ary*.
+        """
+        key = (ary.shape, ary.strides, ary.dtype.itemsize)
+        try:
+            result = self._flags[key]
+        except KeyError:
+            pass
+        else:
+            self.flags_hits += 1
+            return result
+
+        self.flags_misses += 1
+        if len(self._flags) >= self.max_entries:
+            self._flags.clear()
+        result = self._flags[key] = _ArrayFlags(ary)
+        return result
+
+    def clear(self):
+        """Empty the cache. Does not reset the counters."""
+        self._configs.clear()
+        self._flags.clear()
+
+
+_launch_config_cache = LaunchConfigCache()
+
+
+def get_launch_config_cache():
+    """Return the process-wide :class:`LaunchConfigCache`.
+
+    .. versionadded:: 2017.1
+    """
+    return _launch_config_cache
+
+
+def _get_queue_device(queue):
+    try:
+        return queue._launch_config_device
+    except AttributeError:
+        pass
+
+    dev = queue._launch_config_device = queue.device
+    return dev
+
+
 def elwise_kernel_runner(kernel_getter):
     """Take a kernel getter of the same signature as the kernel
     and return a function that invokes that kernel.
@@ -199,37 +335,38 @@ def elwise_kernel_runner(kernel_getter):
     def kernel_runner(*args, **kwargs):
         repr_ary = args[0]
         queue = kwargs.pop("queue", None) or repr_ary.queue
+
+        if _lazy_state.pending:
+            # repr_ary is about to be overwritten
+            _evaluate_lazy_readers(repr_ary)
         wait_for = kwargs.pop("wait_for", None)
 
         # wait_for must be a copy, because we modify it in-place below
-        if wait_for is None:
-            wait_for = []
-        else:
-            wait_for = list(wait_for)
+        wait_for = cl.EventList(wait_for)
 
         knl = kernel_getter(*args, **kwargs)
 
-        gs, ls = repr_ary.get_sizes(queue,
-                knl.get_work_group_info(
-                    cl.kernel_work_group_info.WORK_GROUP_SIZE,
-                    queue.device))
-
         assert isinstance(repr_ary, Array)
 
-        actual_args = []
+        knl, actual_args, vectors = elementwise.get_elwise_invocation_args(
+                knl, args)
         for arg in args:
             if isinstance(arg, Array):
-                if not arg.flags.forc:
-                    raise RuntimeError("only contiguous arrays may "
-                            "be used as arguments to this operation")
-                actual_args.append(arg.base_data)
-                actual_args.append(arg.offset)
                 wait_for.extend(arg.events)
-            else:
-                actual_args.append(arg)
         actual_args.append(repr_ary.size)
 
-        return knl(queue, gs, ls, *actual_args, **dict(wait_for=wait_for))
+        if not can_index_flat(vectors):
+            knl, extra_args = elementwise.get_strided_elwise_kernel_and_args(
+                    knl, vectors)
+            actual_args.extend(extra_args)
+
+        gs, ls, trial = _launch_config_cache.get_launch_config(
+                queue, knl, repr_ary.size)
+
+        evt = knl(queue, gs, ls, *actual_args, **dict(wait_for=wait_for))
+        if trial is not None:
+            trial.record(evt)
+        return evt
 
     try:
         from functools import update_wrapper
@@ -260,6 +397,58 @@ def _make_strides(itemsize, shape, order):
 # }}}
 
 
+# {{{ broadcasting
+
+def _broadcast_shapes(*shapes):
+    """Return the shape that arrays of *shapes* broadcast to, following
+    :mod:`numpy`'s rules.
+    """
+    ndim = max(len(shape) for shape in shapes)
+    result = [1] * ndim
+    for shape in shapes:
+        for iaxis, dim in enumerate(shape, ndim - len(shape)):
+            if result[iaxis] == 1:
+                result[iaxis] = dim
+            elif dim != 1 and dim != result[iaxis]:
+                raise ValueError("operands could not be broadcast together "
+                        "with shapes %s" % " ".join(str(s) for s in shapes))
+
+    return tuple(result)
+
+
+def _broadcast_to(ary, shape):
+    """Return a view of *ary* with *shape*, using zero strides along
+    broadcast axes so that no data is copied.
+    """
+    if ary.shape == shape:
+        return ary
+
+    if _broadcast_shapes(ary.shape, shape) != shape:
+        raise ValueError("array of shape %s cannot be broadcast to "
+                "shape %s" % (ary.shape, shape))
+
+    nnew = len(shape) - ary.ndim
+    strides = [0] * nnew
+    for dim, ary_dim, stride in zip(shape[nnew:], ary.shape, ary.strides):
+        strides.append(stride if ary_dim == dim else 0)
+
+    return ary._new_with_changes(ary.base_data, ary.offset,
+            shape=shape, strides=tuple(strides))
+
+
+def _broadcast_binary(a, b):
+    """Return views of the :class:`Array` instances *a* and *b* that have
+    been broadcast to a common shape.
+    """
+    if a.shape == b.shape:
+        return a, b
+
+    shape = _broadcast_shapes(a.shape, b.shape)
+    return _broadcast_to(a, shape), _broadcast_to(b, shape)
+
+# }}}
+
+
 # {{{ array class
 
 class ArrayHasOffsetError(ValueError):
@@ -376,6 +565,7 @@ class Array(object):
     .. attribute :: T
     .. automethod :: set
     .. automethod :: get
+    .. automethod :: get_async
     .. automethod :: copy
 
     .. automethod :: __str__
@@ -422,6 +612,10 @@ class Array(object):
 
         Only works for device scalars. (i.e. "arrays" with ``shape == ()``.)
 
+    .. automethod :: __float__
+    .. automethod :: __int__
+    .. automethod :: __complex__
+
     .. automethod :: any
     .. automethod :: all
 
@@ -442,10 +636,14 @@ class Array(object):
 
     .. attribute:: events
 
-        A list of :class:`pyopencl.Event` instances that the current content of
+        A :class:`pyopencl.EventList` of the events that the current content of
         this array depends on. User code may read, but should never modify this
         list directly. To update this list, instead use the following methods.
 
+        .. versionchanged:: 2017.1
+
+            This used to be a :class:`list`.
+
     .. automethod:: add_event
     .. automethod:: finish
     """
@@ -536,9 +734,12 @@ class Array(object):
         self.dtype = dtype
         self.strides = strides
         if events is None:
-            self.events = []
-        else:
+            self.events = cl.EventList()
+        elif isinstance(events, cl.EventList):
+            # views share their base's list
             self.events = events
+        else:
+            self.events = cl.EventList(events)
 
         self.size = s
         alloc_nbytes = self.nbytes = self.dtype.itemsize * self.size
@@ -578,7 +779,7 @@ class Array(object):
     @property
     @memoize_method
     def flags(self):
-        return _ArrayFlags(self)
+        return _launch_config_cache.get_flags(self)
 
     def _new_with_changes(self, data, offset, shape=None, dtype=None,
             strides=None, queue=_copy_queue, allocator=None):
@@ -628,12 +829,12 @@ class Array(object):
         return self._new_with_changes(self.base_data, self.offset,
                 queue=queue)
 
-    #@memoize_method FIXME: reenable
     def get_sizes(self, queue, kernel_specific_max_wg_size=None):
         if not self.flags.forc:
             raise NotImplementedError("cannot operate on non-contiguous array")
-        return splay(queue, self.size,
-                kernel_specific_max_wg_size=kernel_specific_max_wg_size)
+        gs, ls, _ = _launch_config_cache.get_launch_config(
+                queue, None, self.size, kernel_specific_max_wg_size)
+        return gs, ls
 
     def set(self, ary, queue=None, async=False):
         """Transfer the contents the :class:`numpy.ndarray` object *ary*
@@ -646,6 +847,9 @@ class Array(object):
         assert ary.size == self.size
         assert ary.dtype == self.dtype
 
+        if _lazy_state.pending:
+            _evaluate_lazy_readers(self)
+
         if not ary.flags.forc:
             raise RuntimeError("cannot set from non-contiguous array")
 
@@ -663,16 +867,7 @@ class Array(object):
                     device_offset=self.offset,
                     is_blocking=not async)
 
-    def get(self, queue=None, ary=None, async=False):
-        """Transfer the contents of *self* into *ary* or a newly allocated
-        :mod:`numpy.ndarray`. If *ary* is given, it must have the same
-        shape and dtype.
-
-        .. versionchanged:: 2015.2
-
-            *ary* with different shape was deprecated.
-        """
-
+    def _get_host_ary(self, ary):
         if ary is None:
             ary = np.empty(self.shape, self.dtype)
 
@@ -687,10 +882,24 @@ class Array(object):
                 from warnings import warn
                 warn("get() between arrays of different shape is deprecated "
                         "and will be removed in PyCUDA 2017.x",
-                        DeprecationWarning, stacklevel=2)
+                        DeprecationWarning, stacklevel=3)
 
         assert self.flags.forc, "Array in get() must be contiguous"
 
+        return ary
+
+    def get(self, queue=None, ary=None, async=False):
+        """Transfer the contents of *self* into *ary* or a newly allocated
+        :mod:`numpy.ndarray`. If *ary* is given, it must have the same
+        shape and dtype.
+
+        .. versionchanged:: 2015.2
+
+            *ary* with different shape was deprecated.
+        """
+
+        ary = self._get_host_ary(ary)
+
         if self.size:
             cl.enqueue_copy(queue or self.queue, ary, self.base_data,
                     device_offset=self.offset,
@@ -698,13 +907,35 @@ class Array(object):
 
         return ary
 
+    def get_async(self, queue=None, ary=None, loop=None):
+        """Like :meth:`get`, but return an :class:`asyncio.Future` that
+        completes with the :mod:`numpy.ndarray` once the transfer has
+        finished, without blocking the calling thread.
+
+        .. versionadded:: 2017.1
+        """
+
+        ary = self._get_host_ary(ary)
+        queue = queue or self.queue
+
+        if self.size:
+            evt = cl.enqueue_copy(queue, ary, self.base_data,
+                    device_offset=self.offset,
+                    wait_for=self.events, is_blocking=False)
+        else:
+            evt = cl.enqueue_marker(queue, wait_for=self.events)
+
+        return evt._as_future(loop, ary)
+
     def copy(self, queue=None):
         """.. versionadded:: 2013.1"""
 
         queue = queue or self.queue
         result = self._new_like_me()
 
-        if self.nbytes:
+        if not self.flags.forc:
+            result.add_event(self._copy(result, self, queue=queue))
+        elif self.nbytes:
             cl.enqueue_copy(queue, result.base_data, self.base_data,
                     src_offset=self.offset, byte_count=self.nbytes)
 
@@ -847,12 +1078,21 @@ class Array(object):
         return elementwise.get_copy_kernel(
                 dest.context, dest.dtype, src.dtype)
 
-    def _new_like_me(self, dtype=None, queue=None):
+    def _new_like_me(self, dtype=None, queue=None, out=None):
         strides = None
         if dtype is None:
             dtype = self.dtype
 
-        if dtype == self.dtype:
+        if out is not None:
+            if out.shape != self.shape:
+                raise ValueError("shape of 'out' (%s) does not match "
+                        "shape of result (%s)" % (out.shape, self.shape))
+            if out.dtype != dtype:
+                raise TypeError("dtype of 'out' (%s) does not match "
+                        "dtype of result (%s)" % (out.dtype, dtype))
+            return out
+
+        if dtype == self.dtype and self.flags.forc:
             strides = self.strides
 
         queue = queue or self.queue
@@ -867,81 +1107,115 @@ class Array(object):
 
     # {{{ operators
 
-    def mul_add(self, selffac, other, otherfac, queue=None):
+    # All operators take optional *out* and *queue* arguments. Use the
+    # functions :func:`add`, :func:`multiply` etc. to access those.
+
+    def mul_add(self, selffac, other, otherfac, queue=None, out=None):
         """Return `selffac * self + otherfac*other`.
+
+        .. versionchanged:: 2017.1
+
+            Added *out*.
         """
+        self, other = _broadcast_binary(self, other)
         result = self._new_like_me(
-                _get_common_dtype(self, other, queue or self.queue))
+                _get_common_dtype(self, other, queue or self.queue), out=out)
         result.add_event(
-                self._axpbyz(result, selffac, self, otherfac, other))
+                self._axpbyz(result, selffac, self, otherfac, other,
+                    queue=queue))
         return result
 
-    def __add__(self, other):
+    def __add__(self, other, out=None, queue=None):
         """Add an array with an array or an array with a scalar."""
 
+        if _lazy_state.depth and out is None:
+            result = _lazy_binary("+", self, other)
+            if result is not None:
+                return result
+
         if isinstance(other, Array):
             # add another vector
+            self, other = _broadcast_binary(self, other)
             result = self._new_like_me(
-                    _get_common_dtype(self, other, self.queue))
+                    _get_common_dtype(self, other, queue or self.queue),
+                    out=out)
 
             result.add_event(
                     self._axpbyz(result,
                         self.dtype.type(1), self,
-                        other.dtype.type(1), other))
+                        other.dtype.type(1), other, queue=queue))
 
             return result
         else:
             # add a scalar
-            if other == 0:
-                return self.copy()
+            if other == 0 and out is None:
+                return self.copy(queue=queue)
             else:
-                common_dtype = _get_common_dtype(self, other, self.queue)
-                result = self._new_like_me(common_dtype)
+                common_dtype = _get_common_dtype(self, other, queue or self.queue)
+                result = self._new_like_me(common_dtype, out=out)
                 result.add_event(
                         self._axpbz(result, self.dtype.type(1),
-                            self, common_dtype.type(other)))
+                            self, common_dtype.type(other), queue=queue))
                 return result
 
     __radd__ = __add__
 
-    def __sub__(self, other):
+    def __sub__(self, other, out=None, queue=None):
         """Substract an array from an array or a scalar from an array."""
 
+        if _lazy_state.depth and out is None:
+            result = _lazy_binary("-", self, other)
+            if result is not None:
+                return result
+
         if isinstance(other, Array):
+            self, other = _broadcast_binary(self, other)
             result = self._new_like_me(
-                    _get_common_dtype(self, other, self.queue))
+                    _get_common_dtype(self, other, queue or self.queue),
+                    out=out)
             result.add_event(
                     self._axpbyz(result,
                         self.dtype.type(1), self,
-                        other.dtype.type(-1), other))
+                        other.dtype.type(-1), other, queue=queue))
 
             return result
         else:
             # subtract a scalar
-            if other == 0:
-                return self.copy()
+            if other == 0 and out is None:
+                return self.copy(queue=queue)
             else:
                 result = self._new_like_me(
-                        _get_common_dtype(self, other, self.queue))
+                        _get_common_dtype(self, other, queue or self.queue),
+                        out=out)
                 result.add_event(
-                        self._axpbz(result, self.dtype.type(1), self, -other))
+                        self._axpbz(result, self.dtype.type(1), self, -other,
+                            queue=queue))
                 return result
 
-    def __rsub__(self, other):
+    def __rsub__(self, other, out=None, queue=None):
         """Substracts an array by a scalar or an array::
 
            x = n - self
         """
-        common_dtype = _get_common_dtype(self, other, self.queue)
+        if _lazy_state.depth and out is None:
+            result = _lazy_binary("-", self, other, reverse=True)
+            if result is not None:
+                return result
+
+        common_dtype = _get_common_dtype(self, other, queue or self.queue)
         # other must be a scalar
-        result = self._new_like_me(common_dtype)
+        result = self._new_like_me(common_dtype, out=out)
         result.add_event(
                 self._axpbz(result, self.dtype.type(-1), self,
-                    common_dtype.type(other)))
+                    common_dtype.type(other), queue=queue))
         return result
 
     def __iadd__(self, other):
+        if _lazy_state.depth and _lazy_inplace("+", self, other):
+            return self
+
         if isinstance(other, Array):
+            other = _broadcast_to(other, self.shape)
             self.add_event(
                     self._axpbyz(self,
                         self.dtype.type(1), self,
@@ -953,7 +1227,11 @@ class Array(object):
             return self
 
     def __isub__(self, other):
+        if _lazy_state.depth and _lazy_inplace("-", self, other):
+            return self
+
         if isinstance(other, Array):
+            other = _broadcast_to(other, self.shape)
             self.add_event(
                     self._axpbyz(self, self.dtype.type(1), self,
                         other.dtype.type(-1), other))
@@ -962,36 +1240,59 @@ class Array(object):
             self._axpbz(self, self.dtype.type(1), self, -other)
             return self
 
-    def __neg__(self):
-        result = self._new_like_me()
-        result.add_event(self._axpbz(result, -1, self, 0))
+    def __neg__(self, out=None, queue=None):
+        if _lazy_state.depth and out is None:
+            result = _lazy_negate(self)
+            if result is not None:
+                return result
+
+        result = self._new_like_me(out=out)
+        result.add_event(self._axpbz(result, -1, self, 0, queue=queue))
         return result
 
-    def __mul__(self, other):
+    def __mul__(self, other, out=None, queue=None):
+        if _lazy_state.depth and out is None:
+            result = _lazy_binary("*", self, other)
+            if result is not None:
+                return result
+
         if isinstance(other, Array):
+            self, other = _broadcast_binary(self, other)
             result = self._new_like_me(
-                    _get_common_dtype(self, other, self.queue))
+                    _get_common_dtype(self, other, queue or self.queue),
+                    out=out)
             result.add_event(
-                    self._elwise_multiply(result, self, other))
+                    self._elwise_multiply(result, self, other, queue=queue))
             return result
         else:
-            common_dtype = _get_common_dtype(self, other, self.queue)
-            result = self._new_like_me(common_dtype)
+            common_dtype = _get_common_dtype(self, other, queue or self.queue)
+            result = self._new_like_me(common_dtype, out=out)
             result.add_event(
                     self._axpbz(result,
-                        common_dtype.type(other), self, self.dtype.type(0)))
+                        common_dtype.type(other), self, self.dtype.type(0),
+                        queue=queue))
             return result
 
-    def __rmul__(self, scalar):
-        common_dtype = _get_common_dtype(self, scalar, self.queue)
-        result = self._new_like_me(common_dtype)
+    def __rmul__(self, scalar, out=None, queue=None):
+        if _lazy_state.depth and out is None:
+            result = _lazy_binary("*", self, scalar, reverse=True)
+            if result is not None:
+                return result
+
+        common_dtype = _get_common_dtype(self, scalar, queue or self.queue)
+        result = self._new_like_me(common_dtype, out=out)
         result.add_event(
                 self._axpbz(result,
-                    common_dtype.type(scalar), self, self.dtype.type(0)))
+                    common_dtype.type(scalar), self, self.dtype.type(0),
+                    queue=queue))
         return result
 
     def __imul__(self, other):
+        if _lazy_state.depth and _lazy_inplace("*", self, other):
+            return self
+
         if isinstance(other, Array):
+            other = _broadcast_to(other, self.shape)
             self.add_event(
                     self._elwise_multiply(self, self, other))
         else:
@@ -1001,42 +1302,57 @@ class Array(object):
 
         return self
 
-    def __div__(self, other):
+    def __div__(self, other, out=None, queue=None):
         """Divides an array by an array or a scalar, i.e. ``self / other``.
         """
+        if _lazy_state.depth and out is None:
+            result = _lazy_binary("/", self, other)
+            if result is not None:
+                return result
+
         if isinstance(other, Array):
+            self, other = _broadcast_binary(self, other)
             result = self._new_like_me(
-                    _get_common_dtype(self, other, self.queue))
-            result.add_event(self._div(result, self, other))
+                    _get_common_dtype(self, other, queue or self.queue),
+                    out=out)
+            result.add_event(self._div(result, self, other, queue=queue))
         else:
-            if other == 1:
-                return self.copy()
+            if other == 1 and out is None:
+                return self.copy(queue=queue)
             else:
                 # create a new array for the result
-                common_dtype = _get_common_dtype(self, other, self.queue)
-                result = self._new_like_me(common_dtype)
+                common_dtype = _get_common_dtype(self, other, queue or self.queue)
+                result = self._new_like_me(common_dtype, out=out)
                 result.add_event(
                         self._axpbz(result,
-                            common_dtype.type(1/other), self, self.dtype.type(0)))
+                            common_dtype.type(1/other), self, self.dtype.type(0),
+                            queue=queue))
 
         return result
 
     __truediv__ = __div__
 
-    def __rdiv__(self, other):
+    def __rdiv__(self, other, out=None, queue=None):
         """Divides an array by a scalar or an array, i.e. ``other / self``.
         """
+        if _lazy_state.depth and out is None:
+            result = _lazy_binary("/", self, other, reverse=True)
+            if result is not None:
+                return result
 
         if isinstance(other, Array):
+            self, other = _broadcast_binary(self, other)
             result = self._new_like_me(
-                    _get_common_dtype(self, other, self.queue))
-            result.add_event(other._div(result, self))
+                    _get_common_dtype(self, other, queue or self.queue),
+                    out=out)
+            result.add_event(self._div(result, other, self, queue=queue))
         else:
             # create a new array for the result
-            common_dtype = _get_common_dtype(self, other, self.queue)
-            result = self._new_like_me(common_dtype)
+            common_dtype = _get_common_dtype(self, other, queue or self.queue)
+            result = self._new_like_me(common_dtype, out=out)
             result.add_event(
-                    self._rdiv_scalar(result, self, common_dtype.type(other)))
+                    self._rdiv_scalar(result, self, common_dtype.type(other),
+                        queue=queue))
 
         return result
 
@@ -1045,6 +1361,9 @@ class Array(object):
     def _zero_fill(self, queue=None, wait_for=None):
         queue = queue or self.queue
 
+        if _lazy_state.pending:
+            _evaluate_lazy_readers(self)
+
         if (
                 queue._get_cl_version() >= (1, 2)
                 and cl.get_cl_header_version() >= (1, 2)):
@@ -1074,60 +1393,85 @@ class Array(object):
         else:
             return TypeError("scalar has no len()")
 
-    def __abs__(self):
+    def __abs__(self, out=None, queue=None):
         """Return a `Array` of the absolute values of the elements
         of *self*.
         """
 
-        result = self._new_like_me(self.dtype.type(0).real.dtype)
-        result.add_event(self._abs(result, self))
+        result = self._new_like_me(self.dtype.type(0).real.dtype, out=out)
+        result.add_event(self._abs(result, self, queue=queue))
         return result
 
     def __pow__(self, other):
         """Exponentiation by a scalar or elementwise by another
         :class:`Array`.
         """
+        return self._pow(other)
 
+    def _pow(self, other, out=None, queue=None):
         if isinstance(other, Array):
-            assert self.shape == other.shape
-
+            self, other = _broadcast_binary(self, other)
             result = self._new_like_me(
-                    _get_common_dtype(self, other, self.queue))
+                    _get_common_dtype(self, other, queue or self.queue),
+                    out=out)
             result.add_event(
-                    self._pow_array(result, self, other))
+                    self._pow_array(result, self, other, queue=queue))
         else:
             result = self._new_like_me(
-                    _get_common_dtype(self, other, self.queue))
-            result.add_event(self._pow_scalar(result, self, other))
+                    _get_common_dtype(self, other, queue or self.queue),
+                    out=out)
+            result.add_event(
+                    self._pow_scalar(result, self, other, queue=queue))
 
         return result
 
     def __rpow__(self, other):
+        return self._rpow(other)
+
+    def _rpow(self, other, out=None, queue=None):
         # other must be a scalar
-        common_dtype = _get_common_dtype(self, other, self.queue)
-        result = self._new_like_me(common_dtype)
+        common_dtype = _get_common_dtype(self, other, queue or self.queue)
+        result = self._new_like_me(common_dtype, out=out)
         result.add_event(
-                self._rpow_scalar(result, common_dtype.type(other), self))
+                self._rpow_scalar(result, common_dtype.type(other), self,
+                    queue=queue))
         return result
 
     # }}}
 
-    def reverse(self, queue=None):
+    def reverse(self, queue=None, out=None):
         """Return this array in reversed order. The array is treated
         as one-dimensional.
+
+        .. versionchanged:: 2017.1
+
+            Added *out*.
         """
 
-        result = self._new_like_me()
+        if out is not None and out.base_data is self.base_data:
+            # Each work item reads another one's entry, so reversing in
+            # place would race.
+            tmp = self.reverse(queue=queue)
+            result = self._new_like_me(out=out)
+            result.add_event(self._copy(result, tmp, queue=queue))
+            return result
+
+        result = self._new_like_me(out=out)
         result.add_event(
-                self._reverse(result, self))
+                self._reverse(result, self, queue=queue))
         return result
 
-    def astype(self, dtype, queue=None):
-        """Return a copy of *self*, cast to *dtype*."""
-        if dtype == self.dtype:
+    def astype(self, dtype, queue=None, out=None):
+        """Return a copy of *self*, cast to *dtype*.
+
+        .. versionchanged:: 2017.1
+
+            Added *out*.
+        """
+        if dtype == self.dtype and out is None:
             return self.copy()
 
-        result = self._new_like_me(dtype=dtype)
+        result = self._new_like_me(dtype=np.dtype(dtype), out=out)
         result.add_event(self._copy(result, self, queue=queue))
         return result
 
@@ -1140,6 +1484,32 @@ class Array(object):
             raise ValueError("The truth value of an array with "
                     "more than one element is ambiguous. Use a.any() or a.all()")
 
+    __bool__ = __nonzero__
+
+    def _get_scalar(self):
+        if self.size != 1:
+            raise TypeError("only arrays with a single entry can be "
+                    "converted to Python scalars")
+        return self.get().reshape(())[()]
+
+    def __float__(self):
+        """
+        .. versionadded:: 2017.1
+        """
+        return float(self._get_scalar())
+
+    def __int__(self):
+        """
+        .. versionadded:: 2017.1
+        """
+        return int(self._get_scalar())
+
+    def __complex__(self):
+        """
+        .. versionadded:: 2017.1
+        """
+        return complex(self._get_scalar())
+
     def any(self, queue=None, wait_for=None):
         from pyopencl.reduction import get_any_kernel
         krnl = get_any_kernel(self.context, self.dtype)
@@ -1164,76 +1534,37 @@ class Array(object):
         return elementwise.get_array_comparison_kernel(
                 out.context, op, a.dtype, b.dtype)
 
-    def __eq__(self, other):
+    def _comparison(self, other, op, out=None, queue=None):
         if isinstance(other, Array):
-            result = self._new_like_me(np.int8)
+            self, other = _broadcast_binary(self, other)
+            result = self._new_like_me(np.int8, out=out)
             result.add_event(
-                    self._array_comparison(result, self, other, op="=="))
-            return result
+                    self._array_comparison(result, self, other, op=op,
+                        queue=queue))
         else:
-            result = self._new_like_me(np.int8)
+            result = self._new_like_me(np.int8, out=out)
             result.add_event(
-                    self._scalar_comparison(result, self, other, op="=="))
-            return result
+                    self._scalar_comparison(result, self, other, op=op,
+                        queue=queue))
+        return result
 
-    def __ne__(self, other):
-        if isinstance(other, Array):
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._array_comparison(result, self, other, op="!="))
-            return result
-        else:
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._scalar_comparison(result, self, other, op="!="))
-            return result
+    def __eq__(self, other, out=None, queue=None):
+        return self._comparison(other, "==", out=out, queue=queue)
 
-    def __le__(self, other):
-        if isinstance(other, Array):
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._array_comparison(result, self, other, op="<="))
-            return result
-        else:
-            result = self._new_like_me(np.int8)
-            self._scalar_comparison(result, self, other, op="<=")
-            return result
+    def __ne__(self, other, out=None, queue=None):
+        return self._comparison(other, "!=", out=out, queue=queue)
 
-    def __ge__(self, other):
-        if isinstance(other, Array):
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._array_comparison(result, self, other, op=">="))
-            return result
-        else:
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._scalar_comparison(result, self, other, op=">="))
-            return result
+    def __le__(self, other, out=None, queue=None):
+        return self._comparison(other, "<=", out=out, queue=queue)
 
-    def __lt__(self, other):
-        if isinstance(other, Array):
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._array_comparison(result, self, other, op="<"))
-            return result
-        else:
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._scalar_comparison(result, self, other, op="<"))
-            return result
+    def __ge__(self, other, out=None, queue=None):
+        return self._comparison(other, ">=", out=out, queue=queue)
 
-    def __gt__(self, other):
-        if isinstance(other, Array):
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._array_comparison(result, self, other, op=">"))
-            return result
-        else:
-            result = self._new_like_me(np.int8)
-            result.add_event(
-                    self._scalar_comparison(result, self, other, op=">"))
-            return result
+    def __lt__(self, other, out=None, queue=None):
+        return self._comparison(other, "<", out=out, queue=queue)
+
+    def __gt__(self, other, out=None, queue=None):
+        return self._comparison(other, ">", out=out, queue=queue)
 
     # }}}
 
@@ -1259,12 +1590,19 @@ class Array(object):
             return zeros_like(self)
     imag = property(imag, doc=".. versionadded:: 2012.1")
 
-    def conj(self):
-        """.. versionadded:: 2012.1"""
+    def conj(self, out=None):
+        """.. versionadded:: 2012.1
+
+        .. versionchanged:: 2017.1
+
+            Added *out*.
+        """
         if self.dtype.kind == "c":
-            result = self._new_like_me()
+            result = self._new_like_me(out=out)
             result.add_event(self._conj(result, self))
             return result
+        elif out is not None:
+            return self.astype(self.dtype, out=out)
         else:
             return self
 
@@ -1281,6 +1619,10 @@ class Array(object):
 
         self.events.append(evt)
 
+        if len(self.events) > 3*n_wait:
+            # Only wait if dropping completed events did not help.
+            self.events.prune()
+
         if len(self.events) > 3*n_wait:
             wait_events = self.events[:n_wait]
             cl.wait_for_events(wait_events)
@@ -1686,9 +2028,6 @@ class Array(object):
             if subarray.shape != value.shape:
                 raise ValueError("cannot assign between arrays of "
                         "differing shapes")
-            if subarray.strides != value.strides:
-                raise ValueError("cannot assign between arrays of "
-                        "differing strides")
 
             self.add_event(
                     self._copy(subarray, value, queue=queue, wait_for=wait_for))
@@ -1737,6 +2076,310 @@ def as_strided(ary, shape=None, strides=None):
 # }}}
 
 
+# {{{ lazy evaluation
+
+class _LazyState(threading.local):
+    def __init__(self):
+        self.depth = 0
+
+        # id -> _LazyArray not yet evaluated
+        self.pending = weakref.WeakValueDictionary()
+
+
+_lazy_state = _LazyState()
+
+# Expressions larger than this are cut at their operands, to bound the number
+# of distinct kernels generated by loops such as 'x = x + 1'.
+_MAX_LAZY_EXPR_SIZE = 32
+
+_LAZY_SCALAR_TYPES = six.integer_types + (float, np.integer, np.floating)
+
+
+class _LazyData(object):
+    pass
+
+
+class _LazyArray(Array):
+    """An :class:`Array` whose contents are given by an elementwise
+    expression, evaluated when its data or events are first needed.
+
+    Expressions are nested tuples: ``("leaf", ary)``, ``("scalar", value)``,
+    ``("neg", dtype, operand)`` and ``(op, dtype, left, right)``, where
+    *op* is one of ``+-*/`` and *dtype* is the type of the (sub)result.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._expr = kwargs.pop("expr", None)
+        self._expr_size = kwargs.pop("expr_size", 0)
+        self._leaves = kwargs.pop("leaves", ())
+
+        if self._expr is not None:
+            kwargs["data"] = _LazyData
+
+        Array.__init__(self, *args, **kwargs)
+
+        if self._expr is not None:
+            _lazy_state.pending[id(self)] = self
+
+    @property
+    def base_data(self):
+        if self._expr is not None:
+            self._evaluate()
+        return self._base_data
+
+    @base_data.setter
+    def base_data(self, value):
+        self._base_data = value
+
+    @property
+    def events(self):
+        if self._expr is not None:
+            self._evaluate()
+        return self._events
+
+    @events.setter
+    def events(self, value):
+        self._events = value
+
+    def _evaluate(self):
+        expr = self._expr
+        self._expr = None
+        self._leaves = ()
+        _lazy_state.pending.pop(id(self), None)
+
+        alloc_nbytes = self.nbytes or 1
+        if self.allocator is None:
+            self._base_data = cl.Buffer(
+                    self.context, cl.mem_flags.READ_WRITE, alloc_nbytes)
+        else:
+            self._base_data = self.allocator(alloc_nbytes)
+
+        _run_lazy_expr(self, expr)
+
+
+def _lazy_operand(x):
+    """Return *(expr, size, leaves)* for an operand of a lazy operation."""
+
+    if isinstance(x, _LazyArray) and x._expr is not None:
+        if x._expr_size < _MAX_LAZY_EXPR_SIZE:
+            return x._expr, x._expr_size, x._leaves
+        x._evaluate()
+
+    return ("leaf", x), 1, (x,)
+
+
+def _lazy_binary(op, a, b, reverse=False):
+    """Return a :class:`_LazyArray` for ``a op b`` (or ``b op a`` if
+    *reverse*), or *None* if this operation cannot be deferred.
+    """
+
+    if a.queue is None or not a.flags.forc or a.dtype.kind not in "iuf":
+        return None
+
+    if isinstance(b, Array):
+        if (b.shape != a.shape
+                or b.strides != a.strides
+                or not b.flags.forc
+                or b.dtype.kind not in "iuf"):
+            return None
+    elif not isinstance(b, _LAZY_SCALAR_TYPES):
+        return None
+
+    dtype = _get_common_dtype(a, b, a.queue)
+    if dtype.kind not in "iuf" or (op == "/" and dtype.kind != "f"):
+        return None
+
+    a_expr, a_size, a_leaves = _lazy_operand(a)
+    if isinstance(b, Array):
+        b_expr, b_size, b_leaves = _lazy_operand(b)
+    else:
+        b_expr, b_size, b_leaves = ("scalar", dtype.type(b)), 1, ()
+
+    if reverse:
+        a_expr, b_expr = b_expr, a_expr
+
+    return _make_lazy_array(a, dtype, (op, dtype, a_expr, b_expr),
+            1 + a_size + b_size, a_leaves + b_leaves)
+
+
+def _lazy_negate(a):
+    if a.queue is None or not a.flags.forc or a.dtype.kind not in "if":
+        return None
+
+    a_expr, a_size, a_leaves = _lazy_operand(a)
+    return _make_lazy_array(a, a.dtype, ("neg", a.dtype, a_expr),
+            1 + a_size, a_leaves)
+
+
+def _make_lazy_array(like, dtype, expr, expr_size, leaves):
+    strides = None
+    if dtype == like.dtype:
+        strides = like.strides
+
+    return _LazyArray(like.queue, like.shape, dtype,
+            allocator=like.allocator, strides=strides,
+            expr=expr, expr_size=expr_size, leaves=leaves)
+
+
+def _lazy_inplace(op, ary, other):
+    """Compute ``ary op= other`` in a single kernel if *other* is an
+    unevaluated lazy array. Return *True* if this was done.
+    """
+
+    if not (isinstance(other, _LazyArray) and other._expr is not None):
+        return False
+
+    result = _lazy_binary(op, ary, other)
+    if result is None:
+        return False
+
+    expr = result._expr
+    _lazy_state.pending.pop(id(result), None)
+    result._expr = None
+
+    _evaluate_lazy_readers(ary)
+    _run_lazy_expr(ary, expr)
+    return True
+
+
+def _evaluate_lazy_readers(ary):
+    """Evaluate all pending lazy arrays that read the memory of *ary*, so
+    that it may be overwritten.
+    """
+    data = ary.base_data
+    for lazy_ary in list(_lazy_state.pending.values()):
+        if any(leaf.base_data is data for leaf in lazy_ary._leaves):
+            lazy_ary._evaluate()
+
+
+@context_dependent_memoize
+def _get_lazy_expr_kernel(context, out_dtype, key):
+    from pyopencl.tools import dtype_to_ctype
+
+    leaf_dtypes = {}
+    scalar_dtypes = {}
+
+    def cast(dtype, code):
+        return "((%s) (%s))" % (dtype_to_ctype(dtype), code)
+
+    def generate(node):
+        kind = node[0]
+        if kind == "leaf":
+            leaf_dtypes[node[1]] = node[2]
+            return "in%d[i]" % node[1]
+        elif kind == "scalar":
+            scalar_dtypes[node[1]] = node[2]
+            return "s%d" % node[1]
+        elif kind == "neg":
+            return cast(node[1], "-%s" % cast(node[1], generate(node[2])))
+        else:
+            op, dtype, left, right = node
+            return cast(dtype, "%s %s %s" % (
+                cast(dtype, generate(left)), op, cast(dtype, generate(right))))
+
+    operation = "out[i] = %s" % generate(key)
+
+    arguments = ["%s *out" % dtype_to_ctype(out_dtype)]
+    arguments.extend(
+            "%s *in%d" % (dtype_to_ctype(leaf_dtypes[i]), i)
+            for i in range(len(leaf_dtypes)))
+    arguments.extend(
+            "%s s%d" % (dtype_to_ctype(scalar_dtypes[i]), i)
+            for i in range(len(scalar_dtypes)))
+
+    return elementwise.ElementwiseKernel(context, ", ".join(arguments),
+            operation, name="lazy_expr")
+
+
+def _run_lazy_expr(out, expr):
+    leaves = []
+    leaf_numbers = {}
+    scalars = []
+
+    def make_key(node):
+        kind = node[0]
+        if kind == "leaf":
+            ary = node[1]
+            number = leaf_numbers.get(id(ary))
+            if number is None:
+                number = leaf_numbers[id(ary)] = len(leaves)
+                leaves.append(ary)
+            return ("leaf", number, ary.dtype)
+        elif kind == "scalar":
+            scalars.append(node[1])
+            return ("scalar", len(scalars)-1, node[1].dtype)
+        elif kind == "neg":
+            return ("neg", node[1], make_key(node[2]))
+        else:
+            op, dtype, left, right = node
+            return (op, dtype, make_key(left), make_key(right))
+
+    knl = _get_lazy_expr_kernel(out.context, out.dtype, make_key(expr))
+
+    wait_for = cl.EventList(out.events)
+    for ary in leaves:
+        wait_for.extend(ary.events)
+
+    out.add_event(
+            knl(*([out] + leaves + scalars),
+                **dict(queue=out.queue, wait_for=wait_for)))
+
+
+@contextmanager
+def lazy_evaluation():
+    """A context manager within which arithmetic on :class:`Array` instances
+    is deferred and fused. Inside the block, ``+``, ``-``, ``*``, ``/`` and
+    unary ``-`` on real-valued, contiguous arrays of matching shape and
+    layout (and scalars) return arrays whose values are not yet computed.
+    Instead, these record the expression they stem from.
+
+    The expression is turned into a single
+    :class:`pyopencl.elementwise.ElementwiseKernel` (cached by expression
+    structure and types) and run when the data of the result is needed,
+    for instance by :meth:`Array.get` or by passing it to a kernel, when
+    :func:`evaluate` is called, or when the outermost block is left. So::
+
+        with cl_array.lazy_evaluation():
+            x = a * b + c * d - e
+
+    runs one kernel and allocates no temporaries, instead of four kernels and
+    three temporaries. In-place operators such as ``x += y*z`` are fused
+    similarly.
+
+    Pending results are evaluated before :class:`Array` operations
+    overwrite one of their inputs. Writes made by other means (e.g.
+    :func:`pyopencl.enqueue_copy` to an input's buffer) are not tracked,
+    so use :func:`evaluate` before those.
+
+    Operations that cannot be deferred (e.g. on complex or non-contiguous
+    arrays) run immediately, as outside the block.
+
+    .. versionadded:: 2017.1
+    """
+
+    _lazy_state.depth += 1
+    try:
+        yield
+    finally:
+        _lazy_state.depth -= 1
+        if not _lazy_state.depth:
+            evaluate(*_lazy_state.pending.values())
+
+
+def evaluate(*arrays):
+    """Compute the values of those of *arrays* that were produced by
+    deferred arithmetic in :func:`lazy_evaluation`. Other arrays are
+    ignored.
+
+    .. versionadded:: 2017.1
+    """
+    for ary in arrays:
+        if isinstance(ary, _LazyArray) and ary._expr is not None:
+            ary._evaluate()
+
+# }}}
+
+
 # {{{ creation helpers
 
 class _same_as_transfer(object):
@@ -2285,25 +2928,140 @@ def if_positive(criterion, then_, else_, out=None, queue=None):
     if not (then_.dtype == else_.dtype):
         raise ValueError("dtypes do not match")
 
-    if out is None:
-        out = empty_like(then_)
-    _if_positive(out, criterion, then_, else_, queue=queue)
+    out = then_._new_like_me(queue=queue, out=out)
+    out.add_event(
+            _if_positive(out, criterion, then_, else_, queue=queue))
+    return out
+
+
+@elwise_kernel_runner
+def _minmaximum(result, a, b, minmax=None):
+    return elementwise.get_minmaximum_kernel(result.context, minmax, a.dtype)
+
+
+def _minmaximum_with_out(minmax, a, b, out, queue):
+    if a.dtype != b.dtype:
+        raise ValueError("dtypes do not match")
+
+    a, b = _broadcast_binary(a, b)
+    out = a._new_like_me(queue=queue, out=out)
+    out.add_event(_minmaximum(out, a, b, minmax=minmax, queue=queue))
     return out
 
 
 def maximum(a, b, out=None, queue=None):
     """Return the elementwise maximum of *a* and *b*."""
-
-    # silly, but functional
-    return if_positive(a.mul_add(1, b, -1, queue=queue), a, b,
-            queue=queue, out=out)
+    return _minmaximum_with_out("max", a, b, out, queue)
 
 
 def minimum(a, b, out=None, queue=None):
     """Return the elementwise minimum of *a* and *b*."""
-    # silly, but functional
-    return if_positive(a.mul_add(1, b, -1, queue=queue), b, a,
-            queue=queue, out=out)
+    return _minmaximum_with_out("min", a, b, out, queue)
+
+# }}}
+
+
+# {{{ arithmetic with output arrays
+
+def add(a, b, out=None, queue=None):
+    """Return ``a + b``, storing the result in *out* if given. One of *a*
+    and *b* may be a scalar.
+
+    .. versionadded:: 2017.1
+    """
+    if isinstance(a, Array):
+        return a.__add__(b, out=out, queue=queue)
+    else:
+        return b.__radd__(a, out=out, queue=queue)
+
+
+def subtract(a, b, out=None, queue=None):
+    """Return ``a - b``, storing the result in *out* if given. One of *a*
+    and *b* may be a scalar.
+
+    .. versionadded:: 2017.1
+    """
+    if isinstance(a, Array):
+        return a.__sub__(b, out=out, queue=queue)
+    else:
+        return b.__rsub__(a, out=out, queue=queue)
+
+
+def multiply(a, b, out=None, queue=None):
+    """Return ``a * b``, storing the result in *out* if given. One of *a*
+    and *b* may be a scalar.
+
+    .. versionadded:: 2017.1
+    """
+    if isinstance(a, Array):
+        return a.__mul__(b, out=out, queue=queue)
+    else:
+        return b.__rmul__(a, out=out, queue=queue)
+
+
+def divide(a, b, out=None, queue=None):
+    """Return ``a / b``, storing the result in *out* if given. One of *a*
+    and *b* may be a scalar.
+
+    .. versionadded:: 2017.1
+    """
+    if isinstance(a, Array):
+        return a.__div__(b, out=out, queue=queue)
+    else:
+        return b.__rdiv__(a, out=out, queue=queue)
+
+
+def power(a, b, out=None, queue=None):
+    """Return ``a ** b``, storing the result in *out* if given. One of *a*
+    and *b* may be a scalar.
+
+    .. versionadded:: 2017.1
+    """
+    if isinstance(a, Array):
+        return a._pow(b, out=out, queue=queue)
+    else:
+        return b._rpow(a, out=out, queue=queue)
+
+
+def negative(a, out=None, queue=None):
+    """Return ``-a``, storing the result in *out* if given.
+
+    .. versionadded:: 2017.1
+    """
+    return a.__neg__(out=out, queue=queue)
+
+
+def absolute(a, out=None, queue=None):
+    """Return ``abs(a)``, storing the result in *out* if given.
+
+    .. versionadded:: 2017.1
+    """
+    return a.__abs__(out=out, queue=queue)
+
+
+def _make_comparison_func(op, reverse_op, name):
+    def f(a, b, out=None, queue=None):
+        if isinstance(a, Array):
+            return a._comparison(b, op, out=out, queue=queue)
+        else:
+            return b._comparison(a, reverse_op, out=out, queue=queue)
+
+    f.__name__ = name
+    f.__doc__ = """Return ``a %s b`` as an array of :class:`numpy.int8`,
+        storing the result in *out* if given. One of *a* and *b* may be
+        a scalar.
+
+        .. versionadded:: 2017.1
+        """ % op
+    return f
+
+
+equal = _make_comparison_func("==", "==", "equal")
+not_equal = _make_comparison_func("!=", "!=", "not_equal")
+less = _make_comparison_func("<", ">", "less")
+less_equal = _make_comparison_func("<=", ">=", "less_equal")
+greater = _make_comparison_func(">", "<", "greater")
+greater_equal = _make_comparison_func(">=", "<=", "greater_equal")
 
 # }}}
 
@@ -2314,33 +3072,59 @@ _builtin_min = min
 _builtin_max = max
 
 
-def sum(a, dtype=None, queue=None, slice=None):
+def sum(a, dtype=None, queue=None, slice=None, axis=None):
     """
+    :arg axis: an integer or a tuple of integers. If given, sum only along
+        these axes and return an array of the remaining axes.
+
     .. versionadded:: 2011.1
+
+    .. versionchanged:: 2017.1
+
+        Added *axis*.
     """
     from pyopencl.reduction import get_sum_kernel
     krnl = get_sum_kernel(a.context, dtype, a.dtype)
-    return krnl(a, queue=queue, slice=slice)
+    return krnl(a, queue=queue, slice=slice, axis=axis)
 
 
-def dot(a, b, dtype=None, queue=None, slice=None):
+def dot(a, b, dtype=None, queue=None, slice=None, axis=None):
     """
+    :arg axis: an integer or a tuple of integers. If given, sum the
+        products of *a* and *b* only along these axes and return an array
+        of the remaining axes. *a* and *b* are broadcast against each other,
+        so that e.g. ``dot(m, v, axis=1)`` is a matrix-vector product.
+
     .. versionadded:: 2011.1
+
+    .. versionchanged:: 2017.1
+
+        Added *axis*.
     """
+    if axis is not None:
+        a, b = _broadcast_binary(a, b)
+
     from pyopencl.reduction import get_dot_kernel
     krnl = get_dot_kernel(a.context, dtype, a.dtype, b.dtype)
-    return krnl(a, b, queue=queue, slice=slice)
+    return krnl(a, b, queue=queue, slice=slice, axis=axis)
 
 
-def vdot(a, b, dtype=None, queue=None, slice=None):
-    """Like :func:`numpy.vdot`.
+def vdot(a, b, dtype=None, queue=None, slice=None, axis=None):
+    """Like :func:`numpy.vdot`. *axis* is as in :func:`dot`.
 
     .. versionadded:: 2013.1
+
+    .. versionchanged:: 2017.1
+
+        Added *axis*.
     """
+    if axis is not None:
+        a, b = _broadcast_binary(a, b)
+
     from pyopencl.reduction import get_dot_kernel
     krnl = get_dot_kernel(a.context, dtype, a.dtype, b.dtype,
             conjugate_first=True)
-    return krnl(a, b, queue=queue, slice=slice)
+    return krnl(a, b, queue=queue, slice=slice, axis=axis)
 
 
 def subset_dot(subset, a, b, dtype=None, queue=None, slice=None):
@@ -2354,21 +3138,37 @@ def subset_dot(subset, a, b, dtype=None, queue=None, slice=None):
 
 
 def _make_minmax_kernel(what):
-    def f(a, queue=None):
+    def f(a, queue=None, axis=None):
         from pyopencl.reduction import get_minmax_kernel
         krnl = get_minmax_kernel(a.context, what, a.dtype)
-        return krnl(a,  queue=queue)
+        return krnl(a,  queue=queue, axis=axis)
 
     return f
 
 min = _make_minmax_kernel("min")
 min.__doc__ = """
+    :arg axis: an integer or a tuple of integers. If given, find the
+        minimum only along these axes and return an array of the remaining
+        axes.
+
     .. versionadded:: 2011.1
+
+    .. versionchanged:: 2017.1
+
+        Added *axis*.
     """
 
 max = _make_minmax_kernel("max")
 max.__doc__ = """
+    :arg axis: an integer or a tuple of integers. If given, find the
+        maximum only along these axes and return an array of the remaining
+        axes.
+
     .. versionadded:: 2011.1
+
+    .. versionchanged:: 2017.1
+
+        Added *axis*.
     """
 
 
@@ -2391,21 +3191,76 @@ subset_max.__doc__ = """.. versionadded:: 2011.1"""
 # {{{ scans
 
 def cumsum(a, output_dtype=None, queue=None,
-        wait_for=None, return_event=False):
+        wait_for=None, return_event=False, axis=None):
     # undocumented for now
 
     """
+    :arg axis: if given, compute the cumulative sums along this axis only,
+        as :func:`numpy.cumsum` does. All rows along *axis* are scanned in
+        one go. If *None*, the cumulative sum of the flattened array is
+        returned.
+
     .. versionadded:: 2013.1
+
+    .. versionchanged:: 2017.1
+
+        Added *axis*.
     """
 
     if output_dtype is None:
         output_dtype = a.dtype
 
-    result = a._new_like_me(output_dtype)
+    queue = queue or a.queue
+    wait_for = list(wait_for or [])
+
+    def c_contiguous(ary):
+        if ary.flags.c_contiguous:
+            return ary
+
+        result = empty(queue, ary.shape, ary.dtype, allocator=ary.allocator)
+        result.add_event(result._copy(result, ary, queue=queue))
+        wait_for.extend(result.events)
+        return result
+
+    if axis is None:
+        a = c_contiguous(a)
+        if len(a.shape) != 1:
+            a = a.reshape(a.size)
+
+        result = a._new_like_me(output_dtype, queue=queue)
+
+        from pyopencl.scan import get_cumsum_kernel
+        krnl = get_cumsum_kernel(a.context, a.dtype, output_dtype)
+        evt = krnl(a, result, queue=queue, wait_for=wait_for)
+
+    else:
+        ndim = len(a.shape)
+        if not -ndim <= axis < ndim:
+            raise ValueError("axis %d is out of bounds for array of "
+                    "dimension %d" % (axis, ndim))
+        axis = axis % ndim
+
+        # make the scanned axis the last, contiguous one
+        perm = [iaxis for iaxis in range(ndim) if iaxis != axis] + [axis]
+        a_rows = c_contiguous(a.transpose(perm))
+
+        result = empty(queue, a.shape, output_dtype, allocator=a.allocator)
+        if perm == list(range(ndim)):
+            result_rows = result
+        else:
+            result_rows = empty(queue, a_rows.shape, output_dtype,
+                    allocator=a.allocator)
+
+        from pyopencl.scan import get_row_cumsum_kernel
+        krnl = get_row_cumsum_kernel(a.context, a.dtype, output_dtype)
+        evt = krnl(a_rows, result_rows, queue=queue, wait_for=wait_for,
+                row_length=a.shape[axis])
+
+        if result_rows is not result:
+            evt = result._copy(result.transpose(perm), result_rows,
+                    queue=queue, wait_for=[evt])
 
-    from pyopencl.scan import get_cumsum_kernel
-    krnl = get_cumsum_kernel(a.context, a.dtype, output_dtype)
-    evt = krnl(a, result, queue=queue, wait_for=wait_for)
+    result.add_event(evt)
 
     if return_event:
         return evt, result
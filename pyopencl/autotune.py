@@ -0,0 +1,435 @@
+"""Online autotuning of kernel launch geometry."""
+
+from __future__ import division, absolute_import
+
+__copyright__ = "Copyright (C) 2017 Andreas Kloeckner"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import sys
+
+import pyopencl as cl
+
+
+__doc__ = """
+Launch geometry autotuning
+--------------------------
+
+Kernels generated by :class:`pyopencl.elementwise.ElementwiseKernel`,
+the :class:`pyopencl.array.Array` arithmetic and
+:class:`pyopencl.reduction.ReductionKernel` loop over their input, so that any
+launch geometry gives the same result. Which geometry is fastest depends
+heavily on the device.
+
+Launches of these kernels on a queue with
+:attr:`pyopencl.command_queue_properties.PROFILING_ENABLE` set are used to tune
+the geometry *online*: the first few launches of a kernel for a given device
+and problem size (bucketed by powers of two) each use a different candidate
+geometry, and are timed using their profiling events. No additional launches
+are made, and nothing waits for the timing results. Once all candidates are
+timed, the fastest one is used from then on, and is stored in the on-disk
+cache directory, so that later runs (even those whose queues do not have
+profiling enabled) launch with tuned geometry right away.
+
+Set the environment variable :envvar:`PYOPENCL_NO_AUTOTUNE` to disable
+autotuning and use the heuristic of :func:`pyopencl.array.splay`.
+
+.. autoclass:: LaunchTuner
+.. autofunction:: get_launch_tuner
+
+.. versionadded:: 2017.1
+"""
+
+
+# {{{ candidate geometries
+
+def _powers_of_two(lower, upper):
+    result = []
+    p = 1
+    while p <= upper:
+        if p >= lower:
+            result.append(p)
+        p *= 2
+    return result
+
+
+def elementwise_candidates(dev, n, max_wg_size):
+    """Return a list of candidate ``(global_size, local_size)`` tuples for
+    an elementwise kernel over *n* items.
+    """
+    max_wg_size = min(max_wg_size, dev.max_work_group_size)
+    compute_units = dev.max_compute_units
+
+    result = set()
+    for wg_size in _powers_of_two(min(32, max_wg_size), min(1024, max_wg_size)):
+        groups_needed = max(1, (n + wg_size - 1) // wg_size)
+        for groups_per_cu in [1, 4, 16, 64]:
+            group_count = min(compute_units*groups_per_cu, groups_needed)
+            result.add(((group_count*wg_size,), (wg_size,)))
+
+    return sorted(result)
+
+
+def reduction_group_count_candidates(dev, n, group_size, max_group_count):
+    """Return a list of candidate group counts for the first stage of
+    a reduction over *n* items.
+    """
+    compute_units = dev.max_compute_units
+    groups_needed = max(1, (n + group_size - 1) // group_size)
+
+    result = set([max_group_count])
+    for groups_per_cu in [1, 2, 4, 8, 16, 32]:
+        result.add(min(compute_units*groups_per_cu, groups_needed,
+            max_group_count))
+
+    return sorted(result)
+
+# }}}
+
+
+# {{{ keys
+
+def _get_device_key(queue):
+    try:
+        return queue._autotune_device_key
+    except AttributeError:
+        pass
+
+    dev = queue.device
+    key = (dev.platform.name, dev.platform.version, dev.name,
+            dev.driver_version)
+    queue._autotune_device_key = key
+    return key
+
+
+def _get_kernel_key(kernel):
+    try:
+        return kernel._autotune_key
+    except AttributeError:
+        pass
+
+    source = getattr(kernel, "_source", None)
+    if source is None:
+        # no stable identity across runs--do not tune
+        key = None
+    else:
+        from pyopencl.cache import new_hash, update_checksum
+        checksum = new_hash()
+        update_checksum(checksum, source)
+        key = (kernel.function_name, checksum.hexdigest())
+
+    kernel._autotune_key = key
+    return key
+
+
+def _queue_has_profiling(queue):
+    try:
+        return queue._autotune_has_profiling
+    except AttributeError:
+        pass
+
+    result = bool(queue.properties
+            & cl.command_queue_properties.PROFILING_ENABLE)
+    queue._autotune_has_profiling = result
+    return result
+
+
+def _size_bucket(n):
+    from pyopencl.tools import bitlog2
+    return bitlog2(max(n, 1))
+
+# }}}
+
+
+# {{{ tuning state
+
+class _Trial(object):
+    __slots__ = ["state", "candidate"]
+
+    def __init__(self, state, candidate):
+        self.state = state
+        self.candidate = candidate
+
+    def record(self, evt):
+        """Register *evt* as the event of the launch made with this trial's
+        candidate geometry.
+        """
+        self.state.pending.append((self.candidate, evt))
+
+
+class _TuningState(object):
+    def __init__(self, candidates, trials_per_candidate):
+        self.candidates = candidates
+        self.timings = dict((cand, []) for cand in candidates)
+        self.pending = []
+        self.launch_count = 0
+        self.total_launches = trials_per_candidate*len(candidates)
+        self.trials_per_candidate = trials_per_candidate
+
+    def next_candidate(self):
+        if self.launch_count >= self.total_launches:
+            return None
+
+        cand = self.candidates[self.launch_count % len(self.candidates)]
+        self.launch_count += 1
+        return cand
+
+    def collect(self):
+        """Harvest timings of completed launches without waiting."""
+
+        complete = cl.command_execution_status.COMPLETE
+
+        still_pending = []
+        for cand, evt in self.pending:
+            status = evt.command_execution_status
+            if status == complete:
+                self.timings[cand].append(evt.profile.end - evt.profile.start)
+            elif status < 0:
+                # launch failed, retry this candidate
+                self.launch_count -= 1
+            else:
+                still_pending.append((cand, evt))
+
+        self.pending = still_pending
+
+    def is_done(self):
+        return all(
+                len(timings) >= self.trials_per_candidate
+                for timings in self.timings.values())
+
+    def best(self):
+        return min(self.candidates, key=lambda cand: min(self.timings[cand]))
+
+# }}}
+
+
+# {{{ tuner
+
+class LaunchTuner(object):
+    """Chooses launch geometries for kernels that can run with any geometry,
+    timing candidates on profiling-enabled queues and remembering winners
+    in memory and in the on-disk cache.
+
+    .. attribute:: generation
+
+        Incremented whenever a new winning geometry is found or results are
+        cleared, so that callers caching the result of :meth:`choose` know
+        when to invalidate.
+
+    .. automethod:: choose
+    .. automethod:: is_tuning
+    .. automethod:: clear
+    """
+
+    def __init__(self, cache_dir=None, trials_per_candidate=2):
+        self.cache_dir = cache_dir
+        self.trials_per_candidate = trials_per_candidate
+
+        # device key -> {(kind, kernel key, size bucket): geometry}
+        self._winners = {}
+
+        # (device key, kind, kernel key, size bucket) -> _TuningState
+        self._states = {}
+
+        self.generation = 0
+
+    # {{{ persistence
+
+    def _get_cache_file(self, device_key):
+        from os.path import join
+
+        cache_dir = self.cache_dir
+        if cache_dir is None:
+            import appdirs
+            cache_dir = join(appdirs.user_cache_dir("pyopencl", "pyopencl"),
+                    "pyopencl-autotune-v1-py%s" % (
+                        ".".join(str(i) for i in sys.version_info),))
+
+        from pyopencl.cache import new_hash, update_checksum
+        checksum = new_hash()
+        for part in device_key:
+            update_checksum(checksum, part)
+
+        return cache_dir, join(cache_dir, checksum.hexdigest() + ".pkl")
+
+    def _get_device_winners(self, device_key):
+        try:
+            return self._winners[device_key]
+        except KeyError:
+            pass
+
+        winners = {}
+
+        _, cache_file = self._get_cache_file(device_key)
+        try:
+            from six.moves.cPickle import load
+            with open(cache_file, "rb") as inf:
+                stored_key, stored_winners = load(inf)
+            if stored_key == device_key:
+                winners.update(stored_winners)
+        except Exception:
+            # missing or unreadable--start over
+            pass
+
+        self._winners[device_key] = winners
+        return winners
+
+    def _store(self, device_key):
+        cache_dir, cache_file = self._get_cache_file(device_key)
+
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:
+            from errno import EEXIST
+            if e.errno != EEXIST:
+                raise
+
+        from six.moves.cPickle import dump
+        tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+        try:
+            with open(tmp_file, "wb") as outf:
+                dump((device_key, self._winners[device_key]), outf)
+
+            if sys.platform == "win32" and os.path.exists(cache_file):
+                os.unlink(cache_file)
+            os.rename(tmp_file, cache_file)
+        except (IOError, OSError):
+            from warnings import warn
+            warn("could not store autotuning results in '%s'" % cache_file)
+
+    # }}}
+
+    def choose(self, queue, kernel, kind, n, default, get_candidates):
+        """Return a tuple *(geometry, trial)*. *geometry* is what the caller
+        should launch *kernel* with. If *trial* is not *None*, the caller
+        must pass the event of the launch to ``trial.record(evt)``.
+
+        :arg kind: a string identifying what kind of geometry is being chosen
+            (e.g. ``"elementwise"``), as the same kernel may be launched in
+            different ways.
+        :arg default: the geometry to use when no tuning result is available.
+        :arg get_candidates: a callable returning a list of hashable
+            candidate geometries.
+        """
+
+        if _DISABLED:
+            return default, None
+
+        kernel_key = _get_kernel_key(kernel)
+        if kernel_key is None:
+            return default, None
+
+        device_key = _get_device_key(queue)
+        winners = self._get_device_winners(device_key)
+
+        key = (kind, kernel_key, _size_bucket(n))
+        try:
+            return winners[key], None
+        except KeyError:
+            pass
+
+        if not _queue_has_profiling(queue):
+            return default, None
+
+        state_key = (device_key,) + key
+        state = self._states.get(state_key)
+        if state is None:
+            candidates = list(get_candidates())
+            if default not in candidates:
+                candidates.append(default)
+            state = self._states[state_key] = _TuningState(
+                    candidates, self.trials_per_candidate)
+
+        state.collect()
+        if state.is_done():
+            winner = state.best()
+            winners[key] = winner
+            del self._states[state_key]
+            self.generation += 1
+            self._store(device_key)
+            return winner, None
+
+        cand = state.next_candidate()
+        if cand is None:
+            # all candidates launched, waiting for timings
+            return default, None
+
+        return cand, _Trial(state, cand)
+
+    def is_tuning(self, queue, kernel, kind, n):
+        """Return *True* if geometries returned by :meth:`choose` for these
+        arguments may still change without :attr:`generation` changing.
+        """
+        if not self._states:
+            return False
+
+        kernel_key = _get_kernel_key(kernel)
+        if kernel_key is None:
+            return False
+
+        return ((_get_device_key(queue), kind, kernel_key, _size_bucket(n))
+                in self._states)
+
+    def clear(self):
+        """Forget all tuning results held in memory."""
+        self._winners.clear()
+        self._states.clear()
+        self.generation += 1
+
+# }}}
+
+
+_DISABLED = bool(os.environ.get("PYOPENCL_NO_AUTOTUNE"))
+
+_launch_tuner = None
+
+
+def get_launch_tuner():
+    """Return the process-wide :class:`LaunchTuner`."""
+
+    global _launch_tuner
+    if _launch_tuner is None:
+        _launch_tuner = LaunchTuner()
+
+    return _launch_tuner
+
+
+def tuned_splay(queue, kernel, n, kernel_specific_max_wg_size=None):
+    """Like :func:`pyopencl.array.splay`, but consult the launch tuner.
+
+    :returns: a tuple *(global_size, local_size, trial)*, see
+        :meth:`LaunchTuner.choose`.
+    """
+    from pyopencl.array import splay
+    default = splay(queue, n, kernel_specific_max_wg_size)
+
+    if kernel_specific_max_wg_size is None:
+        kernel_specific_max_wg_size = queue.device.max_work_group_size
+
+    (gs, ls), trial = get_launch_tuner().choose(
+            queue, kernel, "elementwise", n, default,
+            lambda: elementwise_candidates(
+                queue.device, n, kernel_specific_max_wg_size))
+
+    return gs, ls, trial
+
+# vim: foldmethod=marker
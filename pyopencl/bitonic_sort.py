@@ -35,6 +35,7 @@ LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
 OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
+import numpy as np
 import pyopencl as cl
 from pyopencl.tools import dtype_to_ctype
 from operator import mul
@@ -45,19 +46,44 @@ from mako.template import Template
 import pyopencl.bitonic_sort_templates as _tmpl
 
 
-def _is_power_of_2(n):
-    from pyopencl.tools import bitlog2
-    return n == 0 or 2**bitlog2(n) == n
+def _round_up_to_power_of_2(n):
+    result = 1
+    while result < n:
+        result <<= 1
+    return result
+
+
+def _get_sentinel(dtype):
+    """Return a C literal of *dtype* which no other value exceeds (NaNs
+    aside).
+    """
+    if dtype.kind == "f":
+        return "INFINITY"
+
+    suffix = ""
+    if dtype.kind == "u":
+        suffix += "u"
+    if dtype.itemsize == 8:
+        suffix += "l"
+    return "%d%s" % (np.iinfo(dtype).max, suffix)
 
 
 class BitonicSort(object):
     """Sort an array (or one axis of one) using a sorting network.
 
-    Will only work if the axis of the array to be sorted has a length
-    that is a power of 2.
+    If the length of the axis is not a power of 2, it is virtually padded
+    to the next one with keys that are never stored. If the padded axis
+    fits into a work group, all sequences along it are sorted in a single
+    launch in local memory, several at a time. This makes sorting many
+    short rows cheap.
 
     .. versionadded:: 2015.2
 
+    .. versionchanged:: 2017.1
+
+        Added support for lengths that are not powers of 2, and the
+        single-launch sort of short sequences.
+
     .. seealso:: :class:`pyopencl.algorithm.RadixSort`
 
     .. automethod:: __call__
@@ -71,6 +97,8 @@ class BitonicSort(object):
             'C4': _tmpl.ParallelBitonic_C4,
             'BL': _tmpl.ParallelBitonic_Local,
             'BLO': _tmpl.ParallelBitonic_Local_Optim,
+            'BLP': _tmpl.ParallelBitonic_Local_Padded,
+            'F2': _tmpl.ParallelBitonic_F2,
             'PML': _tmpl.ParallelMerge_Local
             }
 
@@ -101,9 +129,6 @@ class BitonicSort(object):
         if arr.shape[axis] == 0:
             return arr, last_evt
 
-        if not _is_power_of_2(arr.shape[axis]):
-            raise ValueError("sorted array axis length must be a power of 2")
-
         if idx is None:
             argsort = 0
         else:
@@ -136,7 +161,7 @@ class BitonicSort(object):
                 last_evt = knl(
                         queue, (nt,), wg, arr.data,
                         cl.LocalMemory(
-                            _tmpl.LOCAL_MEM_FACTOR*wg[0]*4*arr.dtype.itemsize),
+                            _tmpl.LOCAL_MEM_FACTOR*wg[0]*arr.dtype.itemsize),
                         wait_for=[last_evt])
             for knl, nt, wg, _ in run_queue[1:]:
                 last_evt = knl(queue, (nt,), wg, arr.data, wait_for=[last_evt])
@@ -150,7 +175,9 @@ class BitonicSort(object):
         defs = defstpl.render(
                 NS="\\", argsort=argsort, inc=params[0], dir=params[1],
                 dtype=params[2], idxtype=params[3],
-                dsize=params[4], nsize=params[5])
+                dsize=params[4], nsize=params[5],
+                psize=params[6], nseq=params[7], sentinel=params[8],
+                padded=params[6] != params[4])
 
         kid = Template(self.kernels_srcs[letter]).render(argsort=argsort)
 
@@ -181,9 +208,22 @@ class BitonicSort(object):
 
         dev = self.context.devices[0]
 
+        # sequences are virtually padded to ps
+        ps = _round_up_to_power_of_2(ds)
+        nseq = size // ds
+        sentinel = _get_sentinel(key_dtype)
+
+        def get_params(inc, direction):
+            return (inc, direction, key_ctype, idx_ctype, ds, ns,
+                    ps, nseq, sentinel)
+
         # {{{ find workgroup size
 
-        wg = min(ds, dev.max_work_group_size)
+        # Short sequences are sorted several at a time by one work group.
+        max_wg = 1
+        while 2*max_wg <= dev.max_work_group_size:
+            max_wg *= 2
+        wg = min(_round_up_to_power_of_2(nseq*ps), max_wg)
 
         available_lmem = dev.local_mem_size
         while True:
@@ -204,16 +244,10 @@ class BitonicSort(object):
 
         # }}}
 
-        length = wg >> 1
-        prg = self.get_program(
-                'BLO', argsort, (1, 1, key_ctype, idx_ctype, ds, ns))
-        run_queue.append((prg.run, size, (wg,), True))
-
-        while length < ds:
+        def append_half_cleaners(length, direction, nthreads_total):
             inc = length
             while inc > 0:
                 ninc = 0
-                direction = length << 1
                 if allowb16 and inc >= 8 and ninc == 0:
                     letter = 'B16'
                     ninc = 4
@@ -227,13 +261,40 @@ class BitonicSort(object):
                     letter = 'B2'
                     ninc = 1
 
-                nthreads = size >> ninc
+                nthreads = nthreads_total >> ninc
 
                 prg = self.get_program(letter, argsort,
-                        (inc, direction, key_ctype, idx_ctype,  ds, ns))
+                        get_params(inc, direction))
                 run_queue.append((prg.run, nthreads, None, False,))
                 inc >>= ninc
 
-            length <<= 1
+        if ps <= wg:
+            # The whole sort happens in local memory. Round the launch up to
+            # full work groups, the excess is treated as padding.
+            prg = self.get_program('BLP', argsort, get_params(1, 0))
+            run_queue.append((prg.run, (nseq*ps + wg - 1)//wg*wg, (wg,), True))
+
+        elif ps != ds:
+            # Merge the blocks sorted in local memory with ascending
+            # comparators only, starting each merge with a mirrored
+            # comparison, so that padding never receives a key.
+            prg = self.get_program('BLP', argsort, get_params(1, 0))
+            run_queue.append((prg.run, nseq*ps, (wg,), True))
+
+            length = wg
+            while length < ps:
+                prg = self.get_program('F2', argsort, get_params(length, 0))
+                run_queue.append((prg.run, (nseq*ps) >> 1, None, False,))
+                append_half_cleaners(length >> 1, 0, nseq*ps)
+                length <<= 1
+
+        else:
+            length = wg >> 1
+            prg = self.get_program('BLO', argsort, get_params(1, 1))
+            run_queue.append((prg.run, size, (wg,), True))
+
+            while length < ds:
+                append_half_cleaners(length, length << 1, size)
+                length <<= 1
 
         return run_queue
@@ -66,13 +66,26 @@ typedef ${idxtype} idx_t;
 #define einc ${inc>>3} //Eighth of inc
 #define dir  ${dir}
 
+% if padded:
+// Positions at or past dsize are virtual padding holding SENTINEL, which no
+// key exceeds. All comparators are ascending and only swap keys that are
+// strictly out of order, so these positions never receive a key and are
+// never stored.
+#define IN_ROW(pos) ((pos) < dsize)
+#define NEEDS_SWAP(ka,kb) ((kb) < (ka))
+% else:
+#define IN_ROW(pos) true
+#define NEEDS_SWAP(ka,kb) (reverse ^ ((ka) < (kb)))
+% endif
+#define SENTINEL ${sentinel}
+
 % if argsort:
-#define ORDER(a,b,ay,by) { bool swap = reverse ^ (getKey(a)<getKey(b));${NS}
+#define ORDER(a,b,ay,by) { bool swap = NEEDS_SWAP(getKey(a),getKey(b));${NS}
                          data_t auxa = a; data_t auxb = b;${NS}
                          idx_t auya = ay; idx_t auyb = by;${NS}
                          a = (swap)?auxb:auxa; b = (swap)?auxa:auxb;${NS}
                          ay = (swap)?auyb:auya; by = (swap)?auya:auyb;}
-#define ORDERV(x,y,a,b) { bool swap = reverse ^ (getKey(x[a])<getKey(x[b]));${NS}
+#define ORDERV(x,y,a,b) { bool swap = NEEDS_SWAP(getKey(x[a]),getKey(x[b]));${NS}
                         data_t auxa = x[a]; data_t auxb = x[b];${NS}
                         idx_t auya = y[a]; idx_t auyb = y[b];${NS}
                         x[a] = (swap)?auxb:auxa; x[b] = (swap)?auxa:auxb;${NS}
@@ -82,8 +95,8 @@ typedef ${idxtype} idx_t;
 #define B8V(x,y,a)  { for (int i8=0;i8<4;i8++) { ORDERV(x,y,a+i8,a+i8+4) } B4V(x,y,a) B4V(x,y,a+4) }
 #define B16V(x,y,a) { for (int i16=0;i16<8;i16++) { ORDERV(x,y,a+i16,a+i16+8) } B8V(x,y,a) B8V(x,y,a+8) }
 % else:
-#define ORDER(a,b) { bool swap = reverse ^ (getKey(a)<getKey(b)); data_t auxa = a; data_t auxb = b; a = (swap)?auxb:auxa; b = (swap)?auxa:auxb; }
-#define ORDERV(x,a,b) { bool swap = reverse ^ (getKey(x[a])<getKey(x[b]));${NS}
+#define ORDER(a,b) { bool swap = NEEDS_SWAP(getKey(a),getKey(b)); data_t auxa = a; data_t auxb = b; a = (swap)?auxb:auxa; b = (swap)?auxa:auxb; }
+#define ORDERV(x,a,b) { bool swap = NEEDS_SWAP(getKey(x[a]),getKey(x[b]));${NS}
       data_t auxa = x[a]; data_t auxb = x[b];${NS}
       x[a] = (swap)?auxb:auxa; x[b] = (swap)?auxa:auxb; }
 #define B2V(x,a) { ORDERV(x,a,a+1) }
@@ -93,6 +106,8 @@ typedef ${idxtype} idx_t;
 % endif
 #define nsize ${nsize}   //Total next dimensions sizes sum. (Block size)
 #define dsize ${dsize}   //Dimension size
+#define psize ${psize}   //Dimension size, padded to a power of 2
+#define nseq ${nseq}   //Number of sequences to sort
 """
 
 # }}}
@@ -110,12 +125,13 @@ __kernel void run(__global data_t * data\\
 )
 % endif
 {
-  int t  = get_global_id(0) % (dsize>>1); // thread index
-  int gt = get_global_id(0) / (dsize>>1);
+  int t  = get_global_id(0) % (psize>>1); // thread index
+  int gt = get_global_id(0) / (psize>>1);
   int low = t & (inc - 1); // low order bits (below INC)
   int i = (t<<1) - low; // insert 0 at position INC
   int gi = i/dsize; // block index
   bool reverse = ((dir & i) == 0);// ^ (gi%2); // asc/desc order
+  if (!IN_ROW(i+inc)) return; // sibling is virtual padding
 
   int offset = (gt/nsize)*nsize*dsize+(gt%nsize);
   data  += i*nsize + offset; // translate to first value
@@ -153,6 +169,51 @@ __kernel void run(__global data_t * data\\
 # }}}
 
 
+# {{{ F2
+
+ParallelBitonic_F2 = """//CL//
+// N/2 threads
+// First step of merging pairs of ascending sequences of length INC:
+// compare each position of the first one to its mirror image in the second.
+//ParallelBitonic_F2
+__kernel void run(__global data_t * data\\
+% if argsort:
+, __global idx_t * index)
+% else:
+)
+% endif
+{
+  int t  = get_global_id(0) % (psize>>1); // thread index
+  int gt = get_global_id(0) / (psize>>1);
+  int low = t & (inc - 1); // low order bits (below INC)
+  int i = (t<<1) - low; // insert 0 at position INC
+  int j = i + ((inc - low)<<1) - 1; // mirror image of I
+  if (!IN_ROW(j)) return; // sibling is virtual padding
+
+  int offset = (gt/nsize)*nsize*dsize+(gt%nsize);
+  data  += offset;
+% if argsort:
+  index += offset;
+% endif
+
+  data_t x0 = data[i*nsize];
+  data_t x1 = data[j*nsize];
+  if (getKey(x1) < getKey(x0))
+  {
+    data[i*nsize] = x1;
+    data[j*nsize] = x0;
+% if argsort:
+    idx_t i0 = index[i*nsize];
+    index[i*nsize] = index[j*nsize];
+    index[j*nsize] = i0;
+% endif
+  }
+}
+"""
+
+# }}}
+
+
 # {{{ B4
 
 ParallelBitonic_B4 = """//CL//
@@ -165,11 +226,12 @@ __kernel void run(__global data_t * data\\
 )
 % endif
 {
-  int t  = get_global_id(0) % (dsize>>2); // thread index
-  int gt = get_global_id(0) / (dsize>>2);
+  int t  = get_global_id(0) % (psize>>2); // thread index
+  int gt = get_global_id(0) / (psize>>2);
   int low = t & (hinc - 1); // low order bits (below INC)
   int i = ((t - low) << 2) + low; // insert 00 at position INC
   bool reverse = ((dir & i) == 0); // asc/desc order
+  if (!IN_ROW(i)) return; // all virtual padding
   int offset = (gt/nsize)*nsize*dsize+(gt%nsize);
   data  += i*nsize + offset; // translate to first value
 % if argsort:
@@ -178,15 +240,15 @@ __kernel void run(__global data_t * data\\
 
   // Load data
   data_t x0 = data[     0];
-  data_t x1 = data[  hinc*nsize];
-  data_t x2 = data[2*hinc*nsize];
-  data_t x3 = data[3*hinc*nsize];
+  data_t x1 = IN_ROW(i+  hinc) ? data[  hinc*nsize] : SENTINEL;
+  data_t x2 = IN_ROW(i+2*hinc) ? data[2*hinc*nsize] : SENTINEL;
+  data_t x3 = IN_ROW(i+3*hinc) ? data[3*hinc*nsize] : SENTINEL;
 % if argsort:
   // Load index
   idx_t i0 = index[     0];
-  idx_t i1 = index[  hinc*nsize];
-  idx_t i2 = index[2*hinc*nsize];
-  idx_t i3 = index[3*hinc*nsize];
+  idx_t i1 = IN_ROW(i+  hinc) ? index[  hinc*nsize] : 0;
+  idx_t i2 = IN_ROW(i+2*hinc) ? index[2*hinc*nsize] : 0;
+  idx_t i3 = IN_ROW(i+3*hinc) ? index[3*hinc*nsize] : 0;
 % endif
 
   // Sort
@@ -204,15 +266,15 @@ __kernel void run(__global data_t * data\\
 
   // Store data
   data[     0] = x0;
-  data[  hinc*nsize] = x1;
-  data[2*hinc*nsize] = x2;
-  data[3*hinc*nsize] = x3;
+  if (IN_ROW(i+  hinc)) data[  hinc*nsize] = x1;
+  if (IN_ROW(i+2*hinc)) data[2*hinc*nsize] = x2;
+  if (IN_ROW(i+3*hinc)) data[3*hinc*nsize] = x3;
 % if argsort:
   // Store index
   index[     0] = i0;
-  index[  hinc*nsize] = i1;
-  index[2*hinc*nsize] = i2;
-  index[3*hinc*nsize] = i3;
+  if (IN_ROW(i+  hinc)) index[  hinc*nsize] = i1;
+  if (IN_ROW(i+2*hinc)) index[2*hinc*nsize] = i2;
+  if (IN_ROW(i+3*hinc)) index[3*hinc*nsize] = i3;
 % endif
 }
 """
@@ -232,11 +294,12 @@ __kernel void run(__global data_t * data\\
 )
 % endif
 {
-  int t  = get_global_id(0) % (dsize>>3); // thread index
-  int gt = get_global_id(0) / (dsize>>3);
+  int t  = get_global_id(0) % (psize>>3); // thread index
+  int gt = get_global_id(0) / (psize>>3);
   int low = t & (qinc - 1); // low order bits (below INC)
   int i = ((t - low) << 3) + low; // insert 000 at position INC
   bool reverse = ((dir & i) == 0); // asc/desc order
+  if (!IN_ROW(i)) return; // all virtual padding
   int offset = (gt/nsize)*nsize*dsize+(gt%nsize);
 
   data  += i*nsize + offset; // translate to first value
@@ -249,9 +312,9 @@ __kernel void run(__global data_t * data\\
 % if argsort:
   idx_t y[8];
 % endif
-  for (int k=0;k<8;k++) x[k] = data[k*qinc*nsize];
+  for (int k=0;k<8;k++) x[k] = IN_ROW(i+k*qinc) ? data[k*qinc*nsize] : SENTINEL;
 % if argsort:
-  for (int k=0;k<8;k++) y[k] = index[k*qinc*nsize];
+  for (int k=0;k<8;k++) y[k] = IN_ROW(i+k*qinc) ? index[k*qinc*nsize] : 0;
 % endif
 
   // Sort
@@ -262,9 +325,9 @@ __kernel void run(__global data_t * data\\
 % endif
 
   // Store
-  for (int k=0;k<8;k++) data[k*qinc*nsize] = x[k];
+  for (int k=0;k<8;k++) if (IN_ROW(i+k*qinc)) data[k*qinc*nsize] = x[k];
 % if argsort:
-  for (int k=0;k<8;k++) index[k*qinc*nsize] = y[k];
+  for (int k=0;k<8;k++) if (IN_ROW(i+k*qinc)) index[k*qinc*nsize] = y[k];
 % endif
 }
 """
@@ -284,11 +347,12 @@ __kernel void run(__global data_t * data\\
 )
 % endif
 {
-  int t  = get_global_id(0) % (dsize>>4); // thread index
-  int gt = get_global_id(0) / (dsize>>4);
+  int t  = get_global_id(0) % (psize>>4); // thread index
+  int gt = get_global_id(0) / (psize>>4);
   int low = t & (einc - 1); // low order bits (below INC)
   int i = ((t - low) << 4) + low; // insert 0000 at position INC
   bool reverse = ((dir & i) == 0); // asc/desc order
+  if (!IN_ROW(i)) return; // all virtual padding
   int offset = (gt/nsize)*nsize*dsize+(gt%nsize);
 
   data  += i*nsize + offset; // translate to first value
@@ -301,9 +365,9 @@ __kernel void run(__global data_t * data\\
 % if argsort:
   idx_t y[16];
 % endif
-  for (int k=0;k<16;k++) x[k] = data[k*einc*nsize];
+  for (int k=0;k<16;k++) x[k] = IN_ROW(i+k*einc) ? data[k*einc*nsize] : SENTINEL;
 % if argsort:
-  for (int k=0;k<16;k++) y[k] = index[k*einc*nsize];
+  for (int k=0;k<16;k++) y[k] = IN_ROW(i+k*einc) ? index[k*einc*nsize] : 0;
 % endif
 
   // Sort
@@ -314,9 +378,9 @@ __kernel void run(__global data_t * data\\
 % endif
 
   // Store
-  for (int k=0;k<16;k++) data[k*einc*nsize] = x[k];
+  for (int k=0;k<16;k++) if (IN_ROW(i+k*einc)) data[k*einc*nsize] = x[k];
 % if argsort:
-  for (int k=0;k<16;k++) index[k*einc*nsize] = y[k];
+  for (int k=0;k<16;k++) if (IN_ROW(i+k*einc)) index[k*einc*nsize] = y[k];
 % endif
 }
 """
@@ -591,4 +655,79 @@ __kernel void run\\
 
 # }}}
 
+
+# {{{ local, padded
+
+ParallelBitonic_Local_Padded = """//CL//
+// One thread per position of the sequences padded to PSIZE. Sort each block
+// of WG positions (several whole sequences or a part of one) in local memory,
+// in ascending order, with the comparators of ParallelBitonic_F2 and of
+// ascending B2.
+__kernel void run\\
+% if argsort:
+(__global data_t * data, __global idx_t * index,
+    __local data_t * aux, __local idx_t * auy)
+% else:
+(__global data_t * data, __local data_t * aux)
+% endif
+{
+  int t  = get_global_id(0) % psize; // position in sequence
+  int gt = get_global_id(0) / psize; // sequence
+  int offset = (gt/nsize)*nsize*dsize+(gt%nsize);
+  bool valid = (t < dsize) && (gt < nseq); // not padding
+
+  int i = get_local_id(0); // index in workgroup
+  int wg = get_local_size(0); // workgroup size, power of 2
+
+  data += offset;
+  data_t iData = (valid) ? data[t*nsize] : SENTINEL;
+  aux[i] = iData;
+% if argsort:
+  index += offset;
+  idx_t iidx = (valid) ? index[t*nsize] : 0;
+  auy[i] = iidx;
+% endif
+  barrier(CLK_LOCAL_MEM_FENCE); // make sure AUX is entirely up to date
+
+  // Loop on sorted sequence length
+  for (int length=1;length<wg && length<psize;length<<=1)
+  {
+    // Loop on comparison distance, starting with the mirror image
+    for (int pinc=length;pinc>0;pinc>>=1)
+    {
+      int j = (pinc == length) ? (i ^ (2*length-1)) : (i ^ pinc); // sibling
+      data_t jData = aux[j];
+% if argsort:
+      idx_t jidx = auy[j];
+% endif
+      data_t iKey = getKey(iData);
+      data_t jKey = getKey(jData);
+      // the lower position gets the smaller key, equal keys stay
+      bool swap = (j < i) ? (iKey < jKey) : (jKey < iKey);
+      iData = (swap)?jData:iData; // update iData
+% if argsort:
+      iidx = (swap)?jidx:iidx; // update iidx
+% endif
+      barrier(CLK_LOCAL_MEM_FENCE);
+      aux[i] = iData;
+% if argsort:
+      auy[i] = iidx;
+% endif
+      barrier(CLK_LOCAL_MEM_FENCE);
+    }
+  }
+
+  // Write output
+  if (valid)
+  {
+    data[t*nsize] = iData;
+% if argsort:
+    index[t*nsize] = iidx;
+% endif
+  }
+}
+"""
+
+# }}}
+
 # vim: filetype=pyopencl:fdm=marker
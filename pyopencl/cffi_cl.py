@@ -33,6 +33,7 @@ import warnings
 from warnings import warn
 import numpy as np
 import sys
+from contextlib import contextmanager
 
 from pytools import memoize_method
 
@@ -205,6 +206,8 @@ def _generic_info_to_python(info):
 def _clobj_list(objs):
     if objs is None:
         return _ffi.NULL, 0
+    if isinstance(objs, EventList):
+        return objs._ptrs, objs._size
     return [ev.ptr for ev in objs], len(objs)
 
 
@@ -778,6 +781,8 @@ class Context(_Common):
 class CommandQueue(_Common):
     _id = 'command_queue'
 
+    _capture_graph = None
+
     def __init__(self, context, device=None, properties=None):
         if properties is None:
             properties = 0
@@ -796,6 +801,14 @@ class CommandQueue(_Common):
     def flush(self):
         _handle_error(_lib.command_queue__flush(self.ptr))
 
+    def finish_async(self, loop=None):
+        """Return an :class:`asyncio.Future` that completes once all
+        commands enqueued so far have completed, without blocking the
+        calling thread like :meth:`finish` does.
+        """
+        from pyopencl import enqueue_marker
+        return enqueue_marker(self).as_future(loop)
+
     def __enter__(self):
         return self
 
@@ -805,6 +818,35 @@ class CommandQueue(_Common):
     def _get_cl_version(self):
         return self.context._get_cl_version()
 
+    # {{{ command graph capture
+
+    def begin_capture(self):
+        if self._capture_graph is not None:
+            raise LogicError("queue is already recording a command graph",
+                    status_code.INVALID_OPERATION, "begin_capture")
+
+        self._capture_graph = CommandGraph(self)
+        return self._capture_graph
+
+    def end_capture(self):
+        graph = self._capture_graph
+        if graph is None:
+            raise LogicError("queue is not recording a command graph",
+                    status_code.INVALID_OPERATION, "end_capture")
+
+        self._capture_graph = None
+        return graph
+
+    @contextmanager
+    def capture(self):
+        graph = self.begin_capture()
+        try:
+            yield graph
+        finally:
+            self.end_capture()
+
+    # }}}
+
 
 # }}}
 
@@ -1646,6 +1688,19 @@ del _size_t_char
 # }}}
 
 
+# {{{ generated argument setter cache
+
+# The generated _set_args/_enqueue functions only depend on the argument
+# signature (and the struct arg count work-around in effect), not on the
+# kernel they are attached to, so they are shared among all kernels in the
+# process.  Maps a signature key to a tuple
+# (enqueue, set_args, number of CL-level arguments).
+
+_generated_arg_setter_cache = {}
+
+# }}}
+
+
 class Kernel(_Common):
     _id = 'kernel'
 
@@ -1665,11 +1720,30 @@ class Kernel(_Common):
 
         self._generate_naive_call()
         self._wg_info_cache = {}
+        self._last_set_args = None
         return self
 
     # {{{ code generation for __call__, set_args
 
-    def _set_set_args_body(self, body, num_passed_args):
+    def _set_arg_setters_from_cache(self, cache_key):
+        try:
+            enqueue, set_args, num_cl_args = \
+                    _generated_arg_setter_cache[cache_key]
+        except KeyError:
+            return False
+
+        if num_cl_args != self.num_args:
+            raise TypeError(
+                "length of argument list (%d) and "
+                "CL-generated number of arguments (%d) do not agree"
+                % (num_cl_args, self.num_args))
+
+        self._enqueue = enqueue
+        self._set_args = set_args
+        return True
+
+    def _set_set_args_body(self, body, num_passed_args, cache_key=None,
+            num_cl_args=None):
         from pytools.py_codegen import (
                 PythonFunctionGenerator,
                 PythonCodeGenerator,
@@ -1726,7 +1800,7 @@ class Kernel(_Common):
 
         # {{{ generate _enqueue
 
-        gen = PythonFunctionGenerator("enqueue_knl_%s" % self.function_name,
+        gen = PythonFunctionGenerator("enqueue_knl",
                 ["self", "queue", "global_size", "local_size"]
                 + arg_names
                 + ["global_offset=None", "g_times_l=None", "wait_for=None"])
@@ -1754,6 +1828,10 @@ class Kernel(_Common):
 
         # }}}
 
+        if cache_key is not None:
+            _generated_arg_setter_cache[cache_key] = (
+                    self._enqueue, self._set_args, num_cl_args)
+
     def _generate_buffer_arg_setter(self, gen, arg_idx, buf_var):
         from pytools.py_codegen import Indentation
 
@@ -1800,6 +1878,10 @@ class Kernel(_Common):
     def _generate_naive_call(self):
         num_args = self.num_args
 
+        cache_key = ("naive", num_args)
+        if self._set_arg_setters_from_cache(cache_key):
+            return
+
         from pytools.py_codegen import PythonCodeGenerator
         gen = PythonCodeGenerator()
 
@@ -1813,7 +1895,8 @@ class Kernel(_Common):
             self._generate_generic_arg_handler(gen, i, "arg%d" % i)
             gen("")
 
-        self._set_set_args_body(gen, num_args)
+        self._set_set_args_body(gen, num_args,
+                cache_key=cache_key, num_cl_args=num_args)
 
     def set_scalar_arg_dtypes(self, scalar_arg_dtypes):
         self._scalar_arg_dtypes = scalar_arg_dtypes
@@ -1844,6 +1927,16 @@ class Kernel(_Common):
 
         # }}}
 
+        cache_key = (
+                "scalar_arg_dtypes",
+                tuple(
+                    None if arg_dtype is None else np.dtype(arg_dtype)
+                    for arg_dtype in scalar_arg_dtypes),
+                work_around_arg_count_bug,
+                warn_about_arg_count_bug)
+        if self._set_arg_setters_from_cache(cache_key):
+            return
+
         cl_arg_idx = 0
 
         from pytools.py_codegen import PythonCodeGenerator
@@ -1950,18 +2043,32 @@ class Kernel(_Common):
                 "CL-generated number of arguments (%d) do not agree"
                 % (cl_arg_idx, self.num_args))
 
-        self._set_set_args_body(gen, len(scalar_arg_dtypes))
+        self._set_set_args_body(gen, len(scalar_arg_dtypes),
+                cache_key=cache_key, num_cl_args=cl_arg_idx)
 
     # }}}
 
     def set_args(self, *args, **kwargs):
         # Need to duplicate the 'self' argument for dynamically generated  method
-        return self._set_args(self, *args, **kwargs)
+        result = self._set_args(self, *args, **kwargs)
+
+        # remembered so that a later enqueue_nd_range_kernel can be recorded
+        # into a CommandGraph
+        self._last_set_args = args
+        return result
 
     def __call__(self, queue, global_size, local_size, *args, **kwargs):
-        # __call__ can't be overridden directly, so we need this
-        # trampoline hack.
-        return self._enqueue(self, queue, global_size, local_size, *args, **kwargs)
+        if queue._capture_graph is not None:
+            result = queue._capture_graph._capture_kernel_call(
+                    self, global_size, local_size, args, kwargs)
+        else:
+            # __call__ can't be overridden directly, so we need this
+            # trampoline hack.
+            result = self._enqueue(
+                    self, queue, global_size, local_size, *args, **kwargs)
+
+        self._last_set_args = args
+        return result
 
     def capture_call(self, filename, queue, global_size, local_size,
             *args, **kwargs):
@@ -1988,6 +2095,10 @@ class Kernel(_Common):
                                "clSetKernelArg")
 
     def set_arg(self, arg_index, arg):
+        # *arg_index* counts OpenCL-level arguments, which need not
+        # correspond to those passed to set_args.
+        self._last_set_args = None
+
         # If you change this, also change the kernel call generation logic.
         if arg is None:
             _handle_error(_lib.kernel__set_arg_null(self.ptr, arg_index))
@@ -2047,6 +2158,60 @@ class Event(_Common):
         _handle_error(_lib.event__set_callback(self.ptr, _type,
                                                _ffi.new_handle(_func)))
 
+    # {{{ asyncio integration
+
+    def _as_future(self, loop, result):
+        import asyncio
+        if loop is None:
+            loop = asyncio.get_event_loop()
+
+        future = loop.create_future()
+
+        def resolve(status):
+            if future.done():
+                # e.g. cancelled
+                return
+            if status < 0:
+                future.set_exception(RuntimeError(
+                    "event completed with error status %d" % status,
+                    status, "Event.as_future"))
+            else:
+                future.set_result(result)
+
+        def on_complete(status):
+            # called from an OpenCL-owned thread
+            loop.call_soon_threadsafe(resolve, status)
+
+        if get_cl_header_version() < (1, 1) \
+                or self.context._get_cl_version() < (1, 1):
+            # no event callbacks, fall back to blocking in a worker thread
+            def wait():
+                self.wait()
+                return result
+
+            return loop.run_in_executor(None, wait)
+
+        self.set_callback(command_execution_status.COMPLETE, on_complete)
+
+        # make sure the command actually gets submitted
+        queue = self.command_queue
+        if queue is not None:
+            queue.flush()
+
+        return future
+
+    def as_future(self, loop=None):
+        """Return an :class:`asyncio.Future` that completes with this
+        event (as its result) once the event's command has completed.
+        No thread is blocked while waiting.
+        """
+        return self._as_future(loop, self)
+
+    def __await__(self):
+        return self.as_future().__await__()
+
+    # }}}
+
 
 class ProfilingInfoGetter:
     def __init__(self, event):
@@ -2101,12 +2266,158 @@ class UserEvent(Event):
 # }}}
 
 
-# {{{ enqueue_nd_range_kernel
+# {{{ EventList
 
-def enqueue_nd_range_kernel(queue, kernel, global_work_size, local_work_size,
-                            global_work_offset=None, wait_for=None,
-                            g_times_l=False):
+class EventList(object):
+    """A list of :class:`Event` instances kept as an array of handles
+    that can be passed to OpenCL without conversion. May be used anywhere
+    a *wait_for* list is accepted.
+    """
+
+    def __init__(self, events=None):
+        self._ptrs = _ffi.NULL
+        self._size = 0
+        self._capacity = 0
+
+        if events is not None:
+            self.extend(events)
+
+    def __del__(self):
+        if self._size:
+            _lib.event_list__release(self._ptrs, self._size)
+
+    def _reserve(self, size):
+        if size <= self._capacity:
+            return
+
+        capacity = max(size, 2*self._capacity, 8)
+        ptrs = _ffi.new('clobj_t[]', capacity)
+        if self._size:
+            _ffi.memmove(ptrs, self._ptrs, self._size*_ffi.sizeof('clobj_t'))
+        self._ptrs = ptrs
+        self._capacity = capacity
+
+    def _extend_from_ptrs(self, ptrs, count):
+        self._reserve(self._size + count)
+        _handle_error(_lib.event_list__copy(
+            self._ptrs + self._size, ptrs, count))
+        self._size += count
+
+    def append(self, evt):
+        self._reserve(self._size + 1)
+        _handle_error(_lib.event_list__copy(
+            self._ptrs + self._size, [evt.ptr], 1))
+        self._size += 1
+
+    def extend(self, events):
+        if isinstance(events, EventList):
+            if events._size:
+                self._extend_from_ptrs(events._ptrs, events._size)
+        else:
+            events = [evt.ptr for evt in events]
+            if events:
+                self._extend_from_ptrs(events, len(events))
+
+    def dedup(self):
+        """Remove repeated occurrences of the same event."""
+        self._size = _lib.event_list__dedup(self._ptrs, self._size)
+
+    def prune(self):
+        """Remove events whose command has completed successfully."""
+        if not self._size:
+            return
+
+        size = _ffi.new('uint32_t*', self._size)
+        status = _lib.event_list__prune(self._ptrs, size)
+        self._size = size[0]
+        _handle_error(status)
+
+    def clear(self):
+        if self._size:
+            _lib.event_list__release(self._ptrs, self._size)
+            self._size = 0
+
+    def copy(self):
+        return EventList(self)
 
+    def _get_event(self, i):
+        return Event.from_int_ptr(_lib.clobj__int_ptr(self._ptrs[i]))
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._get_event(i)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self._size)
+            if step != 1:
+                return EventList(list(self)[idx])
+
+            result = EventList()
+            if stop > start:
+                result._extend_from_ptrs(self._ptrs + start, stop - start)
+            return result
+
+        if idx < 0:
+            idx += self._size
+        if not 0 <= idx < self._size:
+            raise IndexError("EventList index out of range")
+        return self._get_event(idx)
+
+    def __delitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self._size)
+            if step != 1:
+                raise ValueError("EventList only supports deletion "
+                        "of contiguous slices")
+        else:
+            if idx < 0:
+                idx += self._size
+            if not 0 <= idx < self._size:
+                raise IndexError("EventList index out of range")
+            start, stop = idx, idx + 1
+
+        if stop <= start:
+            return
+
+        _lib.event_list__release(self._ptrs + start, stop - start)
+        sizeof_ptr = _ffi.sizeof('clobj_t')
+        _ffi.memmove(self._ptrs + start, self._ptrs + stop,
+                (self._size - stop)*sizeof_ptr)
+        self._size -= stop - start
+
+    def __add__(self, other):
+        result = EventList(self)
+        result.extend(other)
+        return result
+
+    def __radd__(self, other):
+        result = EventList(other)
+        result.extend(self)
+        return result
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __repr__(self):
+        return "EventList(%r)" % list(self)
+
+# }}}
+
+
+# {{{ enqueue_nd_range_kernel
+
+def _normalize_work_sizes(global_work_size, local_work_size,
+        global_work_offset, g_times_l):
     work_dim = len(global_work_size)
 
     if local_work_size is not None:
@@ -2128,13 +2439,29 @@ def enqueue_nd_range_kernel(queue, kernel, global_work_size, local_work_size,
                     global_work_size[i] * local_work_size[i]
                     for i in range(work_dim))
 
-    c_global_work_offset = _ffi.NULL
     if global_work_offset is not None:
         if work_dim != len(global_work_offset):
             raise RuntimeError("global work size and offset have differing "
                                "dimensions", status_code.INVALID_VALUE,
                                "enqueue_nd_range_kernel")
 
+    return work_dim, global_work_size, local_work_size, global_work_offset
+
+
+def enqueue_nd_range_kernel(queue, kernel, global_work_size, local_work_size,
+                            global_work_offset=None, wait_for=None,
+                            g_times_l=False):
+    if queue._capture_graph is not None:
+        return queue._capture_graph._capture_nd_range_kernel(
+                kernel, global_work_size, local_work_size,
+                global_work_offset, wait_for, g_times_l)
+
+    work_dim, global_work_size, local_work_size, global_work_offset = \
+            _normalize_work_sizes(global_work_size, local_work_size,
+                    global_work_offset, g_times_l)
+
+    c_global_work_offset = _ffi.NULL
+    if global_work_offset is not None:
         c_global_work_offset = global_work_offset
 
     if local_work_size is None:
@@ -2150,6 +2477,520 @@ def enqueue_nd_range_kernel(queue, kernel, global_work_size, local_work_size,
 # }}}
 
 
+# {{{ enqueue_batch
+
+def _fill_batch_arg(c_arg, arg, arg_dtype, keep_alive):
+    # If you change this, also change Kernel.set_arg and the kernel call
+    # generation logic.
+
+    if arg is None:
+        c_arg.type = _lib.KERNEL_ARG_NULL
+        return
+
+    if arg_dtype is not None and arg_dtype.char != "V":
+        arg = np.array(arg, dtype=arg_dtype).tostring()
+    elif isinstance(arg, _CLKernelArg):
+        if isinstance(arg, MemoryObjectHolder):
+            c_arg.type = _lib.KERNEL_ARG_MEM
+            c_arg.obj = arg.ptr
+        elif isinstance(arg, SVM):
+            c_buf, _, _ = _c_buffer_from_obj(arg.mem)
+            c_arg.type = _lib.KERNEL_ARG_SVM_POINTER
+            c_arg.buffer = c_buf
+        elif isinstance(arg, Sampler):
+            c_arg.type = _lib.KERNEL_ARG_SAMPLER
+            c_arg.obj = arg.ptr
+        elif isinstance(arg, LocalMemory):
+            c_arg.type = _lib.KERNEL_ARG_BUF
+            c_arg.buffer = _ffi.NULL
+            c_arg.size = arg.size
+        else:
+            raise RuntimeError("unexpected _CLKernelArg subclass"
+                               "dimensions", status_code.INVALID_VALUE,
+                               "clSetKernelArg")
+        return
+    elif _CPY2 and isinstance(arg, np.generic):
+        # https://github.com/numpy/numpy/issues/5381
+        arg = np.getbuffer(arg)
+
+    c_buf, size, ref = _c_buffer_from_obj(arg)
+    keep_alive.append(arg)
+    keep_alive.append(ref)
+    c_arg.type = _lib.KERNEL_ARG_BUF
+    c_arg.buffer = c_buf
+    c_arg.size = size
+
+
+def _fill_batch_launch(c_launch, launch_idx, kernel, global_size, local_size,
+        global_offset, args, keep_alive):
+    """Fill the ``kernel_batch_launch`` *c_launch*. If *args* is *None*, the
+    arguments currently set on *kernel* are used.
+
+    :returns: a list with one list of objects to keep alive per argument.
+    """
+
+    work_dim, global_size, local_size, global_offset = \
+            _normalize_work_sizes(global_size, local_size, global_offset,
+                    g_times_l=False)
+
+    c_launch.kernel = kernel.ptr
+    c_launch.work_dim = work_dim
+
+    c_global_size = _ffi.new('size_t[]', global_size)
+    keep_alive.append(c_global_size)
+    c_launch.global_work_size = c_global_size
+
+    if local_size is not None:
+        c_local_size = _ffi.new('size_t[]', local_size)
+        keep_alive.append(c_local_size)
+        c_launch.local_work_size = c_local_size
+    if global_offset is not None:
+        c_global_offset = _ffi.new('size_t[]', global_offset)
+        keep_alive.append(c_global_offset)
+        c_launch.global_work_offset = c_global_offset
+
+    if args is None:
+        c_launch.num_args = 0
+        return []
+
+    args = list(args)
+    scalar_arg_dtypes = getattr(kernel, "_scalar_arg_dtypes", None)
+    if scalar_arg_dtypes is None:
+        arg_dtypes = [None] * len(args)
+    else:
+        arg_dtypes = [
+                None if dtype is None else np.dtype(dtype)
+                for dtype in scalar_arg_dtypes]
+
+    if len(args) != len(arg_dtypes) or len(args) != kernel.num_args:
+        raise LogicError(
+                "launch #%d (1-based): kernel '%s' expects %d arguments, "
+                "%d given (note that batched launches do not support the "
+                "struct argument work-around)"
+                % (launch_idx+1, kernel.function_name,
+                    kernel.num_args, len(args)),
+                status_code.INVALID_KERNEL_ARGS, "enqueue_batch")
+
+    c_args = _ffi.new('kernel_batch_arg[]', len(args))
+    keep_alive.append(c_args)
+
+    arg_keep_alive = []
+    for arg_idx, (arg, arg_dtype) in enumerate(zip(args, arg_dtypes)):
+        arg_keep_alive.append([])
+        _fill_batch_arg_checked(c_args[arg_idx], launch_idx, arg_idx,
+                arg, arg_dtype, arg_keep_alive[-1])
+
+    c_launch.args = c_args
+    c_launch.num_args = len(args)
+
+    return arg_keep_alive
+
+
+def _fill_batch_arg_checked(c_arg, launch_idx, arg_idx, arg, arg_dtype,
+        keep_alive):
+    try:
+        _fill_batch_arg(c_arg, arg, arg_dtype, keep_alive)
+    except (TypeError, LogicError) as e:
+        raise LogicError(
+                "when processing argument #%d (1-based) of launch "
+                "#%d: %s" % (arg_idx+1, launch_idx+1, str(e)),
+                status_code.INVALID_VALUE, "enqueue_batch")
+
+
+def enqueue_batch(queue, launches, wait_for=None, return_all_events=False):
+    """Enqueue a sequence of kernel launches on *queue* using a single call
+    into the C wrapper. Each entry of *launches* is a tuple
+    ``(kernel, global_size, local_size, args)`` or
+    ``(kernel, global_size, local_size, args, global_offset)``, where
+    *args* is the sequence of arguments that would otherwise be passed to
+    :meth:`Kernel.__call__`.
+
+    Each launch waits for *wait_for*. If *return_all_events* is *False*,
+    only the :class:`Event` of the last launch is returned. Otherwise,
+    a list with one :class:`Event` per launch is returned.
+    """
+
+    launches = list(launches)
+    if not launches:
+        if return_all_events:
+            return []
+        return _enqueue_marker_with_wait_list(queue, wait_for)
+
+    num_launches = len(launches)
+    c_launches = _ffi.new('kernel_batch_launch[]', num_launches)
+
+    keep_alive = []
+
+    for launch_idx, launch in enumerate(launches):
+        if len(launch) == 4:
+            kernel, global_size, local_size, args = launch
+            global_offset = None
+        else:
+            kernel, global_size, local_size, args, global_offset = launch
+
+        keep_alive.append(_fill_batch_launch(
+            c_launches[launch_idx], launch_idx, kernel,
+            global_size, local_size, global_offset, args, keep_alive))
+
+    result = _enqueue_batch_launches(queue, c_launches, num_launches,
+            wait_for, return_all_events)
+
+    # The launches have left their arguments set on the kernels, see
+    # Kernel.set_args.
+    for launch in launches:
+        if launch[3] is not None:
+            launch[0]._last_set_args = tuple(launch[3])
+
+    return result
+
+
+def _enqueue_batch_launches(queue, c_launches, num_launches, wait_for,
+        return_all_events):
+    ptr_events = _ffi.new('clobj_t[]', num_launches)
+    c_wait_for, num_wait_for = _clobj_list(wait_for)
+    _handle_error(_lib.enqueue_nd_range_kernel_batch(
+        ptr_events, queue.ptr, c_launches, num_launches,
+        c_wait_for, num_wait_for, bool(return_all_events)))
+
+    if return_all_events:
+        return [Event._create(ptr_events[i]) for i in range(num_launches)]
+    else:
+        return Event._create(ptr_events[num_launches-1])
+
+# }}}
+
+
+# {{{ command graphs
+
+class _GraphNode(object):
+    def __init__(self, event, wait_for, event_to_node):
+        self.event = event
+        self.deps = []
+        self.external_wait_for = []
+        for evt in wait_for or []:
+            try:
+                self.deps.append(event_to_node[evt.int_ptr])
+            except KeyError:
+                self.external_wait_for.append(evt)
+
+    def substitute(self, old, new):
+        return False
+
+
+class _KernelGraphNode(_GraphNode):
+    def __init__(self, event, wait_for, event_to_node,
+            kernel, global_size, local_size, global_offset, args):
+        _GraphNode.__init__(self, event, wait_for, event_to_node)
+        self.kernel = kernel
+        self.global_size = global_size
+        self.local_size = local_size
+        self.global_offset = global_offset
+        self.args = args
+
+    def substitute(self, old, new):
+        changed = []
+        for i, arg in enumerate(self.args):
+            if arg is old:
+                self.args[i] = new
+                changed.append(i)
+        return changed
+
+
+class _CallGraphNode(_GraphNode):
+    """Replays ``func(queue, *args, wait_for=..., **kwargs)``."""
+
+    def __init__(self, event, wait_for, event_to_node, func, args, kwargs):
+        _GraphNode.__init__(self, event, wait_for, event_to_node)
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def substitute(self, old, new):
+        changed = False
+        for i, arg in enumerate(self.args):
+            if arg is old:
+                self.args[i] = new
+                changed = True
+        return changed
+
+
+class _BatchGraphStep(object):
+    def __init__(self, nodes, node_indices, wait_for_nodes, wait_for):
+        self.node_indices = node_indices
+        self.wait_for_nodes = wait_for_nodes
+        self.wait_for = wait_for
+
+        self.num_launches = len(nodes)
+        self.c_launches = _ffi.new('kernel_batch_launch[]', self.num_launches)
+        self.keep_alive = []
+        self.arg_keep_alive = []
+        for launch_idx, node in enumerate(nodes):
+            self.arg_keep_alive.append(_fill_batch_launch(
+                self.c_launches[launch_idx], launch_idx, node.kernel,
+                node.global_size, node.local_size, node.global_offset,
+                node.args, self.keep_alive))
+
+    def set_arg(self, launch_idx, arg_idx, kernel, arg):
+        scalar_arg_dtypes = getattr(kernel, "_scalar_arg_dtypes", None)
+        arg_dtype = None
+        if scalar_arg_dtypes is not None \
+                and scalar_arg_dtypes[arg_idx] is not None:
+            arg_dtype = np.dtype(scalar_arg_dtypes[arg_idx])
+
+        keep_alive = []
+        _fill_batch_arg_checked(
+                self.c_launches[launch_idx].args[arg_idx],
+                launch_idx, arg_idx, arg, arg_dtype, keep_alive)
+        self.arg_keep_alive[launch_idx][arg_idx] = keep_alive
+
+
+class CommandGraph(object):
+    """A recorded sequence of enqueued commands that may be replayed with
+    little Python overhead. Obtain one from :meth:`CommandQueue.capture`.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._nodes = []
+        self._event_to_node = {}
+        self._steps = None
+        self._node_to_step = None
+
+    def __len__(self):
+        return len(self._nodes)
+
+    # {{{ capture
+
+    def _run_detached(self, func, *args, **kwargs):
+        # Commands issued while recording are also executed, on the queue
+        # with capturing temporarily switched off.
+        queue = self.queue
+        queue._capture_graph = None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            queue._capture_graph = self
+
+    def _add_node(self, node):
+        self._event_to_node[node.event.int_ptr] = len(self._nodes)
+        self._nodes.append(node)
+        self._steps = None
+        return node.event
+
+    def _capture_kernel_call(self, kernel, global_size, local_size, args,
+            kwargs):
+        evt = self._run_detached(kernel._enqueue, kernel, self.queue,
+                global_size, local_size, *args, **kwargs)
+
+        _, global_size, local_size, global_offset = _normalize_work_sizes(
+                global_size, local_size, kwargs.get("global_offset"),
+                kwargs.get("g_times_l", False))
+
+        return self._add_node(_KernelGraphNode(
+            evt, kwargs.get("wait_for"), self._event_to_node,
+            kernel, global_size, local_size, global_offset, list(args)))
+
+    def _capture_nd_range_kernel(self, kernel, global_size, local_size,
+            global_offset, wait_for, g_times_l):
+        # Replays must not depend on the arguments set on the kernel at
+        # replay time, which may well be those of a later launch.
+        args = getattr(kernel, "_last_set_args", None)
+        if args is None:
+            raise LogicError("cannot record a launch of a kernel whose "
+                    "arguments were not set through Kernel.set_args or "
+                    "Kernel.__call__",
+                    status_code.INVALID_OPERATION, "enqueue_nd_range_kernel")
+
+        evt = self._run_detached(enqueue_nd_range_kernel, self.queue, kernel,
+                global_size, local_size, global_offset, wait_for, g_times_l)
+
+        _, global_size, local_size, global_offset = _normalize_work_sizes(
+                global_size, local_size, global_offset, g_times_l)
+
+        return self._add_node(_KernelGraphNode(
+            evt, wait_for, self._event_to_node,
+            kernel, global_size, local_size, global_offset, list(args)))
+
+    def _capture_call(self, func, args, kwargs):
+        kwargs = kwargs.copy()
+        wait_for = kwargs.pop("wait_for", None)
+        evt = self._run_detached(func, self.queue, *args,
+                wait_for=wait_for, **kwargs)
+        return self._add_node(_CallGraphNode(
+            evt, wait_for, self._event_to_node, func, list(args), kwargs))
+
+    # }}}
+
+    # {{{ replay
+
+    def _build_steps(self):
+        in_order = not (self.queue.properties
+                & command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE)
+
+        steps = []
+        node_to_step = {}
+
+        # on an in-order queue, consecutive kernel launches are merged into
+        # a single batched call and dependencies among commands in the graph
+        # are implied by queue order
+
+        pending = []
+
+        def flush_pending():
+            if not pending:
+                return
+            indices = list(pending)
+            step = _BatchGraphStep(
+                    [self._nodes[i] for i in indices], indices,
+                    [], self._nodes[indices[0]].external_wait_for)
+            for launch_idx, node_idx in enumerate(indices):
+                node_to_step[node_idx] = (step, launch_idx)
+            steps.append(step)
+            del pending[:]
+
+        for node_idx, node in enumerate(self._nodes):
+            if isinstance(node, _KernelGraphNode):
+                if in_order:
+                    if node.external_wait_for:
+                        flush_pending()
+                    pending.append(node_idx)
+                    continue
+
+                step = _BatchGraphStep([node], [node_idx],
+                        node.deps, node.external_wait_for)
+                node_to_step[node_idx] = (step, 0)
+                steps.append(step)
+            else:
+                flush_pending()
+                steps.append(node_idx)
+
+        flush_pending()
+
+        self._steps = steps
+        self._node_to_step = node_to_step
+        self._in_order = in_order
+
+    def replay(self, wait_for=None):
+        """Enqueue all recorded commands again, on the queue they were
+        recorded on. Commands that did not depend on anything when recorded
+        wait for *wait_for*.
+
+        :returns: an :class:`Event` that completes once all replayed
+            commands have completed.
+        """
+        if self.queue._capture_graph is self:
+            raise LogicError("cannot replay a graph that is being recorded",
+                    status_code.INVALID_OPERATION, "CommandGraph.replay")
+
+        if not self._nodes:
+            return _enqueue_marker_with_wait_list(self.queue, wait_for)
+
+        if self._steps is None:
+            self._build_steps()
+
+        queue = self.queue
+        in_order = self._in_order
+        events = {}
+        evt = None
+
+        for step_nr, step in enumerate(self._steps):
+            if in_order:
+                step_wait_for = None
+                if step_nr == 0 and wait_for:
+                    step_wait_for = list(wait_for)
+            else:
+                if isinstance(step, _BatchGraphStep):
+                    deps = step.wait_for_nodes
+                else:
+                    deps = self._nodes[step].deps
+
+                if deps:
+                    step_wait_for = [events[i] for i in deps]
+                else:
+                    step_wait_for = list(wait_for or [])
+
+            if isinstance(step, _BatchGraphStep):
+                if step.wait_for:
+                    step_wait_for = (step_wait_for or []) + step.wait_for
+
+                evt = _enqueue_batch_launches(queue,
+                        step.c_launches, step.num_launches, step_wait_for,
+                        return_all_events=False)
+                events[step.node_indices[-1]] = evt
+
+                for node_idx in step.node_indices:
+                    node = self._nodes[node_idx]
+                    node.kernel._last_set_args = tuple(node.args)
+            else:
+                node = self._nodes[step]
+                if node.external_wait_for:
+                    step_wait_for = ((step_wait_for or [])
+                            + node.external_wait_for)
+
+                evt = node.func(queue, *node.args,
+                        wait_for=step_wait_for, **node.kwargs)
+                events[step] = evt
+
+        if in_order:
+            return evt
+        else:
+            return _enqueue_marker_with_wait_list(
+                    queue, list(six.itervalues(events)))
+
+    # }}}
+
+    # {{{ rebinding
+
+    def _get_node_index(self, node):
+        if isinstance(node, Event):
+            try:
+                return self._event_to_node[node.int_ptr]
+            except KeyError:
+                raise LogicError("event was not recorded in this graph",
+                        status_code.INVALID_VALUE,
+                        "CommandGraph.set_kernel_arg")
+        return node
+
+    def set_kernel_arg(self, node, arg_index, value):
+        """Change argument number *arg_index* (0-based) of a recorded kernel
+        launch for subsequent replays. *node* is either the :class:`Event`
+        returned by the launch while recording, or the index of the launch
+        among the recorded commands.
+        """
+
+        node_idx = self._get_node_index(node)
+        node = self._nodes[node_idx]
+        if not isinstance(node, _KernelGraphNode):
+            raise LogicError("recorded command #%d is not a kernel launch"
+                    % node_idx,
+                    status_code.INVALID_VALUE, "CommandGraph.set_kernel_arg")
+
+        node.args[arg_index] = value
+        if self._steps is not None:
+            step, launch_idx = self._node_to_step[node_idx]
+            step.set_arg(launch_idx, arg_index, node.kernel, value)
+
+    def rebind(self, old, new):
+        """Replace every use of *old* (e.g. a :class:`Buffer` or host array)
+        as a kernel argument or as an operand of a recorded copy or fill
+        by *new* in subsequent replays. Objects are compared by identity.
+        """
+
+        for node_idx, node in enumerate(self._nodes):
+            changed = node.substitute(old, new)
+            if not changed or self._steps is None:
+                continue
+
+            if isinstance(node, _KernelGraphNode):
+                step, launch_idx = self._node_to_step[node_idx]
+                for arg_idx in changed:
+                    step.set_arg(launch_idx, arg_idx, node.kernel, new)
+
+    # }}}
+
+# }}}
+
+
 # {{{ enqueue_task
 
 def enqueue_task(queue, kernel, wait_for=None):
@@ -51,6 +51,43 @@ def has_amd_double_support(dev):
     return False
 
 
+@memoize
+def has_global_int32_atomics(dev):
+    """Return *True* if *dev* supports atomic operations on 32-bit integers
+    in global memory, such as ``atomic_inc``. These are part of OpenCL 1.1
+    and available as an extension before that.
+
+    .. versionadded:: 2017.1
+    """
+    if dev.platform._get_cl_version() >= (1, 1):
+        return True
+
+    for ext in dev.extensions.split(" "):
+        if ext == "cl_khr_global_int32_base_atomics":
+            return True
+    return False
+
+
+@memoize
+def has_fast_local_int32_atomics(dev):
+    """Return *True* if *dev* supports atomic operations on 32-bit integers
+    in local memory, and if its local memory is dedicated on-chip memory
+    rather than emulated in global memory, where such atomics are slow.
+
+    .. versionadded:: 2017.1
+    """
+    if dev.local_mem_type != cl.device_local_mem_type.LOCAL:
+        return False
+
+    if dev.platform._get_cl_version() >= (1, 1):
+        return True
+
+    for ext in dev.extensions.split(" "):
+        if ext == "cl_khr_local_int32_base_atomics":
+            return True
+    return False
+
+
 def reasonable_work_group_size_multiple(dev, ctx=None):
     try:
         return dev.warp_size_nv
@@ -39,9 +39,9 @@ def _make_unary_array_func(name):
         return elementwise.get_unary_func_kernel(
                 result.context, fname, arg.dtype)
 
-    def f(array, queue=None):
-        result = array._new_like_me(queue=queue)
-        knl_runner(result, array, queue=queue)
+    def f(array, queue=None, out=None):
+        result = array._new_like_me(queue=queue, out=out)
+        result.add_event(knl_runner(result, array, queue=queue))
         return result
 
     return f
@@ -71,13 +71,13 @@ def _atan2pi(result, arg1, arg2):
 atan = _make_unary_array_func("atan")
 
 
-def atan2(y, x, queue=None):
+def atan2(y, x, queue=None, out=None):
     """
     .. versionadded:: 2013.1
     """
     queue = queue or y.queue
-    result = y._new_like_me(_get_common_dtype(y, x, queue))
-    _atan2(result, y, x, queue=queue)
+    result = y._new_like_me(_get_common_dtype(y, x, queue), out=out)
+    result.add_event(_atan2(result, y, x, queue=queue))
     return result
 
 
@@ -85,13 +85,13 @@ atanh = _make_unary_array_func("atanh")
 atanpi = _make_unary_array_func("atanpi")
 
 
-def atan2pi(y, x, queue=None):
+def atan2pi(y, x, queue=None, out=None):
     """
     .. versionadded:: 2013.1
     """
     queue = queue or y.queue
-    result = y._new_like_me(_get_common_dtype(y, x, queue))
-    _atan2pi(result, y, x, queue=queue)
+    result = y._new_like_me(_get_common_dtype(y, x, queue), out=out)
+    result.add_event(_atan2pi(result, y, x, queue=queue))
     return result
 
 
@@ -124,12 +124,12 @@ def _fmod(result, arg, mod):
                                        arg.dtype, mod.dtype)
 
 
-def fmod(arg, mod, queue=None):
+def fmod(arg, mod, queue=None, out=None):
     """Return the floating point remainder of the division `arg/mod`,
     for each element in `arg` and `mod`."""
     queue = (queue or arg.queue) or mod.queue
-    result = arg._new_like_me(_get_common_dtype(arg, mod, queue))
-    _fmod(result, arg, mod, queue=queue)
+    result = arg._new_like_me(_get_common_dtype(arg, mod, queue), out=out)
+    result.add_event(_fmod(result, arg, mod, queue=queue))
     return result
 
 # TODO: fract
@@ -141,13 +141,27 @@ def _frexp(sig, expt, arg):
                                         expt.dtype, arg.dtype)
 
 
-def frexp(arg, queue=None):
+def _split_out(out, count):
+    if out is None:
+        return count*(None,)
+    if len(out) != count:
+        raise ValueError("'out' must be a tuple of %d arrays" % count)
+    return tuple(out)
+
+
+def frexp(arg, queue=None, out=None):
     """Return a tuple `(significands, exponents)` such that
     `arg == significand * 2**exponent`.
+
+    *out*, if given, is a tuple `(significands, exponents)` of arrays to
+    store the results in.
     """
-    sig = arg._new_like_me(queue=queue)
-    expt = arg._new_like_me(queue=queue, dtype=np.int32)
-    _frexp(sig, expt, arg, queue=queue)
+    sig_out, expt_out = _split_out(out, 2)
+    sig = arg._new_like_me(queue=queue, out=sig_out)
+    expt = arg._new_like_me(queue=queue, dtype=np.int32, out=expt_out)
+    evt = _frexp(sig, expt, arg, queue=queue)
+    sig.add_event(evt)
+    expt.add_event(evt)
     return sig, expt
 
 # TODO: hypot
@@ -162,13 +176,13 @@ def _ldexp(result, sig, exp):
                                         sig.dtype, exp.dtype)
 
 
-def ldexp(significand, exponent, queue=None):
+def ldexp(significand, exponent, queue=None, out=None):
     """Return a new array of floating point values composed from the
     entries of `significand` and `exponent`, paired together as
     `result = significand * 2**exponent`.
     """
-    result = significand._new_like_me(queue=queue)
-    _ldexp(result, significand, exponent)
+    result = significand._new_like_me(queue=queue, out=out)
+    result.add_event(_ldexp(result, significand, exponent, queue=queue))
     return result
 
 lgamma = _make_unary_array_func("lgamma")
@@ -191,13 +205,19 @@ def _modf(intpart, fracpart, arg):
                                        fracpart.dtype, arg.dtype)
 
 
-def modf(arg, queue=None):
+def modf(arg, queue=None, out=None):
     """Return a tuple `(fracpart, intpart)` of arrays containing the
     integer and fractional parts of `arg`.
+
+    *out*, if given, is a tuple `(fracpart, intpart)` of arrays to store
+    the results in.
     """
-    intpart = arg._new_like_me(queue=queue)
-    fracpart = arg._new_like_me(queue=queue)
-    _modf(intpart, fracpart, arg, queue=queue)
+    fracpart_out, intpart_out = _split_out(out, 2)
+    intpart = arg._new_like_me(queue=queue, out=intpart_out)
+    fracpart = arg._new_like_me(queue=queue, out=fracpart_out)
+    evt = _modf(intpart, fracpart, arg, queue=queue)
+    intpart.add_event(evt)
+    fracpart.add_event(evt)
     return fracpart, intpart
 
 nan = _make_unary_array_func("nan")
@@ -249,20 +269,23 @@ def _hankel_01(h0, h1, x):
             h0.context, h0.dtype, x.dtype)
 
 
-def bessel_jn(n, x, queue=None):
-    result = x._new_like_me(queue=queue)
-    _bessel_jn(result, n, x, queue=queue)
+def bessel_jn(n, x, queue=None, out=None):
+    result = x._new_like_me(queue=queue, out=out)
+    result.add_event(_bessel_jn(result, n, x, queue=queue))
     return result
 
 
-def bessel_yn(n, x, queue=None):
-    result = x._new_like_me(queue=queue)
-    _bessel_yn(result, n, x, queue=queue)
+def bessel_yn(n, x, queue=None, out=None):
+    result = x._new_like_me(queue=queue, out=out)
+    result.add_event(_bessel_yn(result, n, x, queue=queue))
     return result
 
 
-def hankel_01(x, queue=None):
-    h0 = x._new_like_me(queue=queue)
-    h1 = x._new_like_me(queue=queue)
-    _hankel_01(h0, h1, x, queue=queue)
+def hankel_01(x, queue=None, out=None):
+    h0_out, h1_out = _split_out(out, 2)
+    h0 = x._new_like_me(queue=queue, out=h0_out)
+    h1 = x._new_like_me(queue=queue, out=h1_out)
+    evt = _hankel_01(h0, h1, x, queue=queue)
+    h0.add_event(evt)
+    h1.add_event(evt)
     return h0, h1
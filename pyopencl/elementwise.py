@@ -33,7 +33,6 @@ OTHER DEALINGS IN THE SOFTWARE.
 
 from pyopencl.tools import context_dependent_memoize
 import numpy as np
-import pyopencl as cl
 from pytools import memoize_method
 from pyopencl.tools import (dtype_to_ctype, VectorArg, ScalarArg,
         KernelTemplateBase, dtype_to_c_struct)
@@ -113,12 +112,32 @@ def get_elwise_program(context, arguments, operation,
 
 def get_elwise_kernel_and_types(context, arguments, operation,
         name="elwise_kernel", options=[], preamble="", use_range=False,
-        **kwargs):
+        stride_pattern=None, **kwargs):
+
+    elwise_info = (context, arguments, operation, name, options, preamble,
+            use_range, kwargs.copy())
 
     from pyopencl.tools import parse_arg_list, get_arg_offset_adjuster_code
     parsed_args = parse_arg_list(arguments, with_offset=True)
 
     auto_preamble = kwargs.pop("auto_preamble", True)
+    device_scalars = kwargs.pop("device_scalars", ())
+
+    user_arg_descrs = parsed_args[:]
+
+    device_scalar_prep = []
+    for arg_name, dtype in device_scalars:
+        iarg, = [iarg for iarg, arg in enumerate(parsed_args)
+                if arg.name == arg_name]
+        arg_dtype = parsed_args[iarg].dtype
+        if dtype != arg_dtype and "c" in (dtype.kind, arg_dtype.kind):
+            raise TypeError("device scalar passed for argument '%s' must "
+                    "have dtype %s" % (arg_name, arg_dtype))
+
+        parsed_args[iarg] = VectorArg(dtype,
+                "pyopencl_devscalar_%s" % arg_name, with_offset=True)
+        device_scalar_prep.append("%s %s = *pyopencl_devscalar_%s;"
+                % (dtype_to_ctype(arg_dtype), arg_name, arg_name))
 
     pragmas = []
     includes = []
@@ -153,8 +172,18 @@ def get_elwise_kernel_and_types(context, arguments, operation,
     else:
         parsed_args.append(ScalarArg(np.intp, "n"))
 
+    if stride_pattern is not None:
+        from pyopencl.tools import (
+                get_strided_access_args, get_strided_access_code)
+        parsed_args.extend(get_strided_access_args(stride_pattern))
+        strided_preamble, operation = get_strided_access_code(
+                stride_pattern, operation)
+        preamble = preamble + "\n" + strided_preamble
+
     loop_prep = kwargs.pop("loop_prep", "")
-    loop_prep = get_arg_offset_adjuster_code(parsed_args) + loop_prep
+    loop_prep = (get_arg_offset_adjuster_code(parsed_args)
+            + "\n".join(device_scalar_prep) + "\n"
+            + loop_prep)
     prg = get_elwise_program(
         context, parsed_args, operation,
         name=name, options=options, preamble=preamble,
@@ -165,9 +194,104 @@ def get_elwise_kernel_and_types(context, arguments, operation,
     kernel = getattr(prg, name)
     kernel.set_scalar_arg_dtypes(get_arg_list_scalar_arg_dtypes(parsed_args))
 
+    kernel._elwise_arg_descrs = user_arg_descrs
+    if stride_pattern is None:
+        kernel._elwise_info = elwise_info
+        kernel._elwise_strided_variants = {}
+        kernel._elwise_device_scalar_variants = {}
+
     return kernel, parsed_args
 
 
+def get_elwise_invocation_args(kernel, args):
+    """Return a tuple *(kernel, invocation_args, vectors)* for running
+    *kernel* (as obtained from :func:`get_elwise_kernel_and_types`) on
+    *args*. Single-entry :class:`pyopencl.array.Array` instances passed for
+    scalar arguments are read on the device, without transferring their
+    value to the host, by a variant of *kernel* that is returned in its
+    place. *vectors* are the arrays passed for vector arguments.
+    """
+    from pyopencl.array import Array
+
+    arg_descrs = getattr(kernel, "_elwise_arg_descrs", None)
+    if arg_descrs is None:
+        arg_descrs = [None] * len(args)
+
+    invocation_args = []
+    vectors = []
+    device_scalars = []
+    for arg, arg_descr in zip(args, arg_descrs):
+        if isinstance(arg, Array):
+            if isinstance(arg_descr, ScalarArg):
+                if arg.size != 1:
+                    raise ValueError("array passed for scalar argument '%s' "
+                            "must have exactly one entry" % arg_descr.name)
+                device_scalars.append((arg_descr.name, arg.dtype))
+            else:
+                vectors.append(arg)
+
+            invocation_args.append(arg.base_data)
+            if (arg_descr is None or isinstance(arg_descr, ScalarArg)
+                    or arg_descr.with_offset):
+                invocation_args.append(arg.offset)
+        else:
+            invocation_args.append(arg)
+
+    if device_scalars:
+        device_scalars = tuple(device_scalars)
+        try:
+            kernel = kernel._elwise_device_scalar_variants[device_scalars]
+        except KeyError:
+            context, arguments, operation, name, options, preamble, \
+                    use_range, kwargs = kernel._elwise_info
+
+            variant, _ = get_elwise_kernel_and_types(
+                    context, arguments, operation, name=name,
+                    options=options, preamble=preamble, use_range=use_range,
+                    device_scalars=device_scalars, **kwargs)
+            kernel._elwise_device_scalar_variants[device_scalars] = variant
+            kernel = variant
+
+    return kernel, invocation_args, vectors
+
+
+def get_strided_elwise_kernel_and_args(kernel, arrays):
+    """Return a tuple *(strided_kernel, extra_args)* for running the
+    elementwise operation of *kernel* (as obtained from
+    :func:`get_elwise_kernel_and_types`) on *arrays*, some of which are not
+    contiguous. *arrays* are the arrays passed for the vector arguments of
+    *kernel*, in order. *extra_args* must be passed after all other
+    arguments of *strided_kernel*.
+    """
+    try:
+        info = kernel._elwise_info
+    except AttributeError:
+        raise NotImplementedError("kernel '%s' cannot operate on "
+                "non-contiguous arrays" % kernel.function_name)
+
+    context, arguments, operation, name, options, preamble, use_range, kwargs \
+            = info
+
+    from pyopencl.tools import parse_arg_list, get_strided_access_info
+    vec_arg_names = [arg.name
+            for arg in parse_arg_list(arguments, with_offset=True)
+            if isinstance(arg, VectorArg)]
+
+    stride_pattern, extra_args = get_strided_access_info(
+            vec_arg_names[:len(arrays)], arrays)
+
+    try:
+        strided_kernel = kernel._elwise_strided_variants[stride_pattern]
+    except KeyError:
+        strided_kernel, _ = get_elwise_kernel_and_types(
+                context, arguments, operation, name=name, options=options,
+                preamble=preamble, use_range=use_range,
+                stride_pattern=stride_pattern, **kwargs)
+        kernel._elwise_strided_variants[stride_pattern] = strided_kernel
+
+    return strided_kernel, extra_args
+
+
 def get_elwise_kernel(context, arguments, operation,
         name="elwise_kernel", options=[], **kwargs):
     """Return a L{pyopencl.Kernel} that performs the same scalar operation
@@ -248,25 +372,14 @@ class ElementwiseKernel:
         capture_as = kwargs.pop("capture_as", None)
 
         use_range = range_ is not None or slice_ is not None
-        kernel, arg_descrs = self.get_kernel(use_range)
+        kernel, _ = self.get_kernel(use_range)
 
         # {{{ assemble arg array
 
-        invocation_args = []
-        for arg, arg_descr in zip(args, arg_descrs):
-            if isinstance(arg_descr, VectorArg):
-                if not arg.flags.forc:
-                    raise RuntimeError("ElementwiseKernel cannot "
-                            "deal with non-contiguous arrays")
-
-                if repr_vec is None:
-                    repr_vec = arg
-
-                invocation_args.append(arg.base_data)
-                if arg_descr.with_offset:
-                    invocation_args.append(arg.offset)
-            else:
-                invocation_args.append(arg)
+        kernel, invocation_args, vectors = get_elwise_invocation_args(
+                kernel, args)
+        if vectors:
+            repr_vec = vectors[0]
 
         # }}}
 
@@ -286,10 +399,6 @@ class ElementwiseKernel:
 
             range_ = slice(*slice_.indices(repr_vec.size))
 
-        max_wg_size = kernel.get_work_group_info(
-                cl.kernel_work_group_info.WORK_GROUP_SIZE,
-                queue.device)
-
         if range_ is not None:
             start = range_.start
             if start is None:
@@ -303,13 +412,20 @@ class ElementwiseKernel:
 
             invocation_args.append(step)
 
-            from pyopencl.array import splay
-            gs, ls = splay(queue,
-                    abs(range_.stop - start)//step,
-                    max_wg_size)
+            n = abs(range_.stop - start)//step
         else:
             invocation_args.append(repr_vec.size)
-            gs, ls = repr_vec.get_sizes(queue, max_wg_size)
+            n = repr_vec.size
+
+        from pyopencl.tools import can_index_flat
+        if not can_index_flat(vectors):
+            kernel, extra_args = get_strided_elwise_kernel_and_args(
+                    kernel, vectors)
+            invocation_args.extend(extra_args)
+
+        from pyopencl.array import get_launch_config_cache
+        gs, ls, trial = get_launch_config_cache().get_launch_config(
+                queue, kernel, n)
 
         if capture_as is not None:
             kernel.set_args(*invocation_args)
@@ -317,9 +433,10 @@ class ElementwiseKernel:
                     capture_as, queue,
                     gs, ls, *invocation_args, wait_for=wait_for)
 
-        kernel.set_args(*invocation_args)
-        return cl.enqueue_nd_range_kernel(queue, kernel,
-                gs, ls, wait_for=wait_for)
+        evt = kernel(queue, gs, ls, *invocation_args, wait_for=wait_for)
+        if trial is not None:
+            trial.record(evt)
+        return evt
 
 # }}}
 
@@ -1040,6 +1157,24 @@ def get_if_positive_kernel(context, crit_dtype, dtype):
             "result[i] = crit[i] > 0 ? then_[i] : else_[i]",
             name="if_positive")
 
+
+@context_dependent_memoize
+def get_minmaximum_kernel(context, minmax, dtype):
+    if minmax == "max":
+        operation = "result[i] = a[i] > b[i] ? a[i] : b[i]"
+    elif minmax == "min":
+        operation = "result[i] = a[i] > b[i] ? b[i] : a[i]"
+    else:
+        raise ValueError("invalid value for minmax: %s" % minmax)
+
+    return get_elwise_kernel(context, [
+            VectorArg(dtype, "result", with_offset=True),
+            VectorArg(dtype, "a", with_offset=True),
+            VectorArg(dtype, "b", with_offset=True),
+            ],
+            operation,
+            name="%simum" % minmax)
+
 # }}}
 
 # vim: fdm=marker:filetype=pyopencl
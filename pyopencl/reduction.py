@@ -33,6 +33,8 @@ None of the original source code remains.
 """
 
 
+import weakref
+
 import pyopencl as cl
 from pyopencl.tools import (
         context_dependent_memoize,
@@ -55,6 +57,13 @@ KERNEL = r"""//CL//
         #define PYOPENCL_DEFINE_CDOUBLE
     % endif
 
+    % if single_pass:
+        #if __OPENCL_VERSION__ < 110
+        #pragma OPENCL EXTENSION cl_khr_global_int32_base_atomics: enable
+        #define atomic_inc atom_inc
+        #endif
+    % endif
+
     #include <pyopencl-complex.h>
 
     ${preamble}
@@ -63,18 +72,51 @@ KERNEL = r"""//CL//
 
     __kernel void ${name}(
       __global pcl_out_type *pcl_out__base, long pcl_out__offset,
+    % if single_pass:
+      __global pcl_out_type *pcl_partials,
+      volatile __global unsigned *pcl_done_count,
+    % endif
       ${arguments}
+    % if segmented and segment_starts_type:
+      __global const ${segment_starts_type} *pcl_segment_starts__base,
+      long pcl_segment_starts__offset)
+    % elif segmented:
+      long pcl_segment_size)
+    % else:
       long pcl_start, long pcl_step, long pcl_stop,
       unsigned int pcl_seq_count, long n)
+    % endif
     {
         __global pcl_out_type *pcl_out = (__global pcl_out_type *) (
             (__global char *) pcl_out__base + pcl_out__offset);
         ${arg_prep}
 
         __local pcl_out_type pcl_ldata[PCL_GROUP_SIZE];
+    % if single_pass:
+        __local int pcl_is_last_group;
+    % endif
 
         unsigned int pcl_lid = get_local_id(0);
 
+    % if segmented:
+        // each group reduces one segment
+        const long pcl_segment = get_group_id(0);
+      % if segment_starts_type:
+        __global const ${segment_starts_type} *pcl_segment_starts =
+          (__global const ${segment_starts_type} *) (
+            (__global const char *) pcl_segment_starts__base
+            + pcl_segment_starts__offset);
+        const long pcl_stop = pcl_segment_starts[pcl_segment + 1];
+        long i = pcl_segment_starts[pcl_segment] + pcl_lid;
+      % else:
+        const long pcl_stop = (pcl_segment + 1) * pcl_segment_size;
+        long i = pcl_segment * pcl_segment_size + pcl_lid;
+      % endif
+
+        pcl_out_type pcl_acc = ${neutral};
+        for (; i < pcl_stop; i += PCL_GROUP_SIZE)
+          pcl_acc = PCL_REDUCE(pcl_acc, PCL_READ_AND_MAP(i));
+    % else:
         const long pcl_base_idx =
             get_group_id(0)*PCL_GROUP_SIZE*pcl_seq_count + pcl_lid;
         long i = pcl_start + pcl_base_idx * pcl_step;
@@ -88,9 +130,52 @@ KERNEL = r"""//CL//
 
           i += PCL_GROUP_SIZE*pcl_step;
         }
+    % endif
 
         pcl_ldata[pcl_lid] = pcl_acc;
 
+        ${reduce_local_data()}
+
+    % if single_pass:
+        // Publish this group's result. The group that finishes last
+        // combines all of them, so that no second launch is needed.
+        if (pcl_lid == 0)
+        {
+            pcl_partials[get_group_id(0)] = pcl_ldata[0];
+            mem_fence(CLK_GLOBAL_MEM_FENCE);
+            pcl_is_last_group =
+                atomic_inc(pcl_done_count) == get_num_groups(0) - 1;
+        }
+
+        barrier(CLK_LOCAL_MEM_FENCE);
+
+        if (pcl_is_last_group)
+        {
+            volatile __global pcl_out_type *pcl_vpartials = pcl_partials;
+
+            pcl_acc = ${neutral};
+            for (long pcl_g = pcl_lid; pcl_g < get_num_groups(0);
+                pcl_g += PCL_GROUP_SIZE)
+              pcl_acc = PCL_REDUCE(pcl_acc, pcl_vpartials[pcl_g]);
+
+            pcl_ldata[pcl_lid] = pcl_acc;
+
+            ${reduce_local_data()}
+
+            if (pcl_lid == 0)
+            {
+                pcl_out[0] = pcl_ldata[0];
+
+                // reset for the next launch
+                *pcl_done_count = 0;
+            }
+        }
+    % else:
+        if (pcl_lid == 0) pcl_out[get_group_id(0)] = pcl_ldata[0];
+    % endif
+    }
+
+    <%def name="reduce_local_data()">
         <%
           cur_size = group_size
         %>
@@ -113,9 +198,7 @@ KERNEL = r"""//CL//
             <% cur_size = new_size %>
 
         % endwhile
-
-        if (pcl_lid == 0) pcl_out[get_group_id(0)] = pcl_ldata[0];
-    }
+    </%def>
     """
 
 # }}}
@@ -127,7 +210,8 @@ def _get_reduction_source(
         ctx, out_type, out_type_size,
         neutral, reduce_expr, map_expr, parsed_args,
         name="reduce_kernel", preamble="", arg_prep="",
-        device=None, max_group_size=None):
+        device=None, max_group_size=None, segmented=False,
+        single_pass=False, segment_starts_type=None):
 
     if device is not None:
         devices = [device]
@@ -176,6 +260,9 @@ def _get_reduction_source(
         name=name,
         preamble=preamble,
         arg_prep=arg_prep,
+        segmented=segmented,
+        segment_starts_type=segment_starts_type,
+        single_pass=single_pass,
         double_support=all(has_double_support(dev) for dev in devices),
         ))
 
@@ -194,7 +281,9 @@ def get_reduction_kernel(stage,
          ctx, dtype_out,
          neutral, reduce_expr, map_expr=None, arguments=None,
          name="reduce_kernel", preamble="",
-         device=None, options=[], max_group_size=None):
+         device=None, options=[], max_group_size=None,
+         stride_pattern=None, segmented=False, single_pass=False,
+         segment_starts_dtype=None):
 
     if map_expr is None:
         if stage == 2:
@@ -211,6 +300,26 @@ def get_reduction_kernel(stage,
         arguments = parse_arg_list(arguments, with_offset=True)
         arg_prep = get_arg_offset_adjuster_code(arguments)
 
+    if segmented or single_pass:
+        assert stage == 1
+        assert not (segmented and single_pass)
+
+    if segment_starts_dtype is not None:
+        assert segmented
+        segment_starts_type = dtype_to_ctype(segment_starts_dtype)
+    else:
+        segment_starts_type = None
+
+    if stride_pattern is not None:
+        assert stage == 1
+
+        from pyopencl.tools import (
+                get_strided_access_args, get_strided_access_code)
+        arguments = arguments + get_strided_access_args(stride_pattern)
+        strided_preamble, map_expr = get_strided_access_code(
+                stride_pattern, map_expr)
+        preamble = preamble + "\n" + strided_preamble
+
     if stage == 2 and arguments is not None:
         arguments = parse_arg_list(arguments)
         arguments = (
@@ -220,7 +329,8 @@ def get_reduction_kernel(stage,
     inf = _get_reduction_source(
             ctx, dtype_to_ctype(dtype_out), dtype_out.itemsize,
             neutral, reduce_expr, map_expr, arguments,
-            name, preamble, arg_prep, device, max_group_size)
+            name, preamble, arg_prep, device, max_group_size, segmented,
+            single_pass, segment_starts_type)
 
     inf.program = cl.Program(ctx, inf.source)
     inf.program.build(options)
@@ -228,29 +338,140 @@ def get_reduction_kernel(stage,
 
     inf.arg_types = arguments
 
+    if segmented and segment_starts_dtype is not None:
+        size_arg_dtypes = [None, np.int64]
+    elif segmented:
+        size_arg_dtypes = [np.int64]
+    else:
+        size_arg_dtypes = [np.int64]*3 + [np.uint32, np.int64]
+
+    if single_pass:
+        workspace_arg_dtypes = [None, None]
+    else:
+        workspace_arg_dtypes = []
+
     inf.kernel.set_scalar_arg_dtypes(
             [None, np.int64]
+            + workspace_arg_dtypes
             + get_arg_list_scalar_arg_dtypes(inf.arg_types)
-            + [np.int64]*3 + [np.uint32, np.int64]
+            + size_arg_dtypes
             )
 
     return inf
 
+
+def _get_multi_output_reduction(ctx, outputs):
+    """Combine the reductions described by the tuples
+    *(dtype_out, neutral, reduce_expr, map_expr)* in *outputs* into a single
+    reduction over a struct type with one field per output.
+
+    :returns: a tuple *(dtype_out, neutral, reduce_expr, map_expr, preamble)*
+        for the combined reduction.
+    """
+    outputs = [(np.dtype(dtype), neutral, reduce_expr, map_expr)
+            for dtype, neutral, reduce_expr, map_expr in outputs]
+    if not outputs:
+        raise ValueError("must specify at least one output")
+
+    dtype_out = np.dtype([
+        ("pcl_out%d" % iout, dtype)
+        for iout, (dtype, _, _, _) in enumerate(outputs)])
+
+    from hashlib import sha1
+    type_name = "pcl_multi_out_%s" % (
+            sha1(repr(dtype_out.descr).encode()).hexdigest()[:12])
+
+    from pyopencl.tools import match_dtype_to_c_struct, get_or_register_dtype
+    dtype_out, c_decl = match_dtype_to_c_struct(
+            ctx.devices[0], type_name, dtype_out, context=ctx)
+    dtype_out = get_or_register_dtype(type_name, dtype_out)
+
+    make_args = []
+    make_assignments = []
+    reduce_assignments = []
+    neutrals = []
+    map_exprs = []
+    for iout, (dtype, neutral, reduce_expr, map_expr) in enumerate(outputs):
+        ctype = dtype_to_ctype(dtype)
+        make_args.append("%s v%d" % (ctype, iout))
+        make_assignments.append("result.pcl_out%d = v%d;" % (iout, iout))
+        reduce_assignments.append(
+                "{ %(ctype)s a = pcl_a.pcl_out%(iout)d, "
+                "b = pcl_b.pcl_out%(iout)d; "
+                "result.pcl_out%(iout)d = (%(reduce_expr)s); }" % {
+                    "ctype": ctype, "iout": iout,
+                    "reduce_expr": _process_code_for_macro(reduce_expr)})
+        neutrals.append("(%s)" % neutral)
+        if map_expr is None:
+            map_expr = "in[i]"
+        map_exprs.append("(%s)" % map_expr)
+
+    preamble = "\n".join([
+        c_decl,
+        "%(tp)s %(tp)s_make(%(args)s)" % {
+            "tp": type_name, "args": ", ".join(make_args)},
+        "{",
+        "  %s result;" % type_name,
+        "  " + "\n  ".join(make_assignments),
+        "  return result;",
+        "}",
+        "%(tp)s %(tp)s_reduce(%(tp)s pcl_a, %(tp)s pcl_b)" % {
+            "tp": type_name},
+        "{",
+        "  %s result;" % type_name,
+        "  " + "\n  ".join(reduce_assignments),
+        "  return result;",
+        "}",
+        ])
+
+    return (dtype_out,
+            "%s_make(%s)" % (type_name, ", ".join(neutrals)),
+            "%s_reduce(a, b)" % type_name,
+            "%s_make(%s)" % (type_name, ", ".join(map_exprs)),
+            preamble)
+
 # }}}
 
 
 # {{{ main reduction kernel
 
 class ReductionKernel:
-    def __init__(self, ctx, dtype_out,
-            neutral, reduce_expr, map_expr=None, arguments=None,
-            name="reduce_kernel", options=[], preamble=""):
+    def __init__(self, ctx, dtype_out=None,
+            neutral=None, reduce_expr=None, map_expr=None, arguments=None,
+            name="reduce_kernel", options=[], preamble="", outputs=None):
+
+        self._output_dtypes = None
+        if outputs is not None:
+            if not (dtype_out is None and neutral is None
+                    and reduce_expr is None and map_expr is None):
+                raise TypeError("may not specify dtype_out, neutral, "
+                        "reduce_expr or map_expr together with outputs")
+
+            outputs = list(outputs)
+            self._output_dtypes = [np.dtype(output[0]) for output in outputs]
+
+            (dtype_out, neutral, reduce_expr, map_expr, multi_preamble) = \
+                    _get_multi_output_reduction(ctx, outputs)
+            preamble = preamble + "\n" + multi_preamble
+            self._split_kernel = None
+            self._split_preamble = preamble
+
+        elif dtype_out is None or neutral is None or reduce_expr is None:
+            raise TypeError("must specify dtype_out, neutral and reduce_expr "
+                    "(or outputs)")
 
         dtype_out = self.dtype_out = np.dtype(dtype_out)
 
         max_group_size = None
         trip_count = 0
 
+        self._stage_1_params = (ctx, dtype_out, neutral, reduce_expr, map_expr,
+                arguments, name+"_stage1", options, preamble)
+        self._strided_stage_1_infs = {}
+        self._segmented_infs = {}
+        self._single_pass_infs = {}
+        self._single_pass_workspaces = weakref.WeakKeyDictionary()
+
         while True:
             self.stage_1_inf = get_reduction_kernel(1, ctx,
                     dtype_out,
@@ -270,12 +491,332 @@ class ReductionKernel:
             trip_count += 1
             assert trip_count <= 2
 
+        self._max_group_size = max_group_size
+
         self.stage_2_inf = get_reduction_kernel(2, ctx,
                 dtype_out,
                 neutral, reduce_expr, arguments=arguments,
                 name=name+"_stage2", options=options, preamble=preamble,
                 max_group_size=max_group_size)
 
+    def _get_strided_stage_1_inf(self, stride_pattern):
+        try:
+            return self._strided_stage_1_infs[stride_pattern]
+        except KeyError:
+            pass
+
+        (ctx, dtype_out, neutral, reduce_expr, map_expr, arguments, name,
+                options, preamble) = self._stage_1_params
+
+        # The group size of the contiguous version is known to fit the
+        # device's work group size limits for this kernel.
+        inf = get_reduction_kernel(1, ctx,
+                dtype_out,
+                neutral, reduce_expr, map_expr, arguments,
+                name=name, options=options, preamble=preamble,
+                max_group_size=self.stage_1_inf.group_size,
+                stride_pattern=stride_pattern)
+
+        self._strided_stage_1_infs[stride_pattern] = inf
+        return inf
+
+    def _get_segmented_inf(self, stride_pattern, group_size,
+            segment_starts_dtype=None):
+        key = (stride_pattern, group_size, segment_starts_dtype)
+        try:
+            return self._segmented_infs[key]
+        except KeyError:
+            pass
+
+        (ctx, dtype_out, neutral, reduce_expr, map_expr, arguments, name,
+                options, preamble) = self._stage_1_params
+
+        inf = get_reduction_kernel(1, ctx,
+                dtype_out,
+                neutral, reduce_expr, map_expr, arguments,
+                name=name, options=options, preamble=preamble,
+                max_group_size=group_size,
+                stride_pattern=stride_pattern, segmented=True,
+                segment_starts_dtype=segment_starts_dtype)
+
+        self._segmented_infs[key] = inf
+        return inf
+
+    def _get_single_pass_inf(self, queue, stride_pattern, group_size):
+        """Return the single-launch variant of the stage-1 kernel, or *None*
+        if it cannot be used on *queue*, in which case the two-stage
+        reduction should be used.
+        """
+        from pyopencl.characterize import has_global_int32_atomics
+        if not has_global_int32_atomics(queue.device):
+            return None
+
+        # The last group to finish relies on no other launch of this kernel
+        # touching the shared workspace at the same time.
+        if (queue.properties
+                & cl.command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE):
+            return None
+
+        key = (queue.device, stride_pattern, group_size)
+        try:
+            return self._single_pass_infs[key]
+        except KeyError:
+            pass
+
+        (ctx, dtype_out, neutral, reduce_expr, map_expr, arguments, name,
+                options, preamble) = self._stage_1_params
+
+        inf = get_reduction_kernel(1, ctx,
+                dtype_out,
+                neutral, reduce_expr, map_expr, arguments,
+                name=name, options=options, preamble=preamble,
+                max_group_size=group_size,
+                stride_pattern=stride_pattern, single_pass=True)
+
+        kernel_max_wg_size = inf.kernel.get_work_group_info(
+                cl.kernel_work_group_info.WORK_GROUP_SIZE,
+                queue.device)
+        if inf.group_size != group_size or group_size > kernel_max_wg_size:
+            inf = None
+
+        self._single_pass_infs[key] = inf
+        return inf
+
+    def _get_single_pass_workspace(self, queue, max_group_count):
+        """Return a tuple *(partials, done_count)* of buffers for use by the
+        single-launch kernel on *queue*. *done_count* is zero between launches.
+        """
+        try:
+            return self._single_pass_workspaces[queue]
+        except KeyError:
+            pass
+
+        mf = cl.mem_flags
+        partials = cl.Buffer(queue.context, mf.READ_WRITE,
+                max_group_count*self.dtype_out.itemsize)
+        done_count = cl.Buffer(queue.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
+                hostbuf=np.zeros(1, np.uint32))
+
+        result = self._single_pass_workspaces[queue] = (partials, done_count)
+        return result
+
+    def _reduce_along_axes(self, args, axis, queue, allocator, wait_for,
+            return_event, out):
+        """Reduce the vector arguments *args* along *axis* in a single
+        kernel launch, using one work group per entry of the result.
+        """
+        from pyopencl.tools import VectorArg
+
+        vectors = [arg for arg, arg_tp in zip(args, self.stage_1_inf.arg_types)
+                if isinstance(arg_tp, VectorArg)]
+        if not vectors:
+            raise TypeError("must have vector argument when axis is specified")
+
+        shape = vectors[0].shape
+        ndim = len(shape)
+
+        if isinstance(axis, (int, np.integer)):
+            axis = (axis,)
+
+        axes = set()
+        for iaxis in axis:
+            if not -ndim <= iaxis < ndim:
+                raise ValueError("axis %d is out of bounds for array of "
+                        "dimension %d" % (iaxis, ndim))
+            axes.add(iaxis % ndim)
+        axes = sorted(axes)
+
+        for vec in vectors:
+            if vec.shape != shape:
+                raise ValueError("all vector arguments must have the same "
+                        "shape when reducing along an axis")
+
+        # Move the reduced axes to the end. Entry *j* of segment *k* of the
+        # resulting views is then found at flat index k*segment_size + j.
+        kept_axes = [iaxis for iaxis in range(ndim) if iaxis not in axes]
+        out_shape = tuple(shape[iaxis] for iaxis in kept_axes)
+
+        segment_size = 1
+        for iaxis in axes:
+            segment_size *= shape[iaxis]
+
+        views = {}
+        for vec in vectors:
+            views[id(vec)] = vec.transpose(kept_axes + axes)
+
+        args = [
+                views[id(arg)] if isinstance(arg_tp, VectorArg) else arg
+                for arg, arg_tp in zip(args, self.stage_1_inf.arg_types)]
+
+        return self._run_segmented(args, out_shape, segment_size, None,
+                queue, allocator, wait_for, return_event, out)
+
+    def _reduce_segments(self, args, segment_starts, queue, allocator,
+            wait_for, return_event, out):
+        """Reduce each segment ``segment_starts[k]:segment_starts[k+1]`` of
+        the index range of the vector arguments *args* in a single kernel
+        launch, using one work group per segment.
+        """
+        from pyopencl.tools import VectorArg
+
+        if segment_starts.ndim != 1 or not segment_starts.size:
+            raise ValueError("segment_starts must be a one-dimensional "
+                    "array with at least one entry")
+        if segment_starts.dtype.kind not in "iu":
+            raise TypeError("segment_starts must have an integer dtype")
+
+        segment_count = segment_starts.size - 1
+
+        vectors = [arg for arg, arg_tp in zip(args, self.stage_1_inf.arg_types)
+                if isinstance(arg_tp, VectorArg)]
+        if not vectors:
+            raise TypeError("must have vector argument when segment_starts "
+                    "is specified")
+
+        # The segment lengths are not known on the host. Use their average
+        # to guess a suitable work group size.
+        mean_segment_size = vectors[0].size // max(segment_count, 1)
+
+        return self._run_segmented(args, (segment_count,), mean_segment_size,
+                segment_starts, queue, allocator, wait_for, return_event, out)
+
+    def _run_segmented(self, args, out_shape, segment_size, segment_starts,
+            queue, allocator, wait_for, return_event, out):
+        """Run the segmented stage-1 kernel with one work group per entry of
+        the result of shape *out_shape*. If *segment_starts* is *None*, the
+        segments consist of *segment_size* consecutive entries each.
+        Otherwise, they are delimited by *segment_starts*, and *segment_size*
+        is only used to choose the work group size.
+        """
+        from pyopencl.tools import VectorArg
+        from pyopencl.array import empty
+
+        invocation_args = []
+        vectors = []
+        vector_names = []
+        for arg, arg_tp in zip(args, self.stage_1_inf.arg_types):
+            if isinstance(arg_tp, VectorArg):
+                vectors.append(arg)
+                vector_names.append(arg_tp.name)
+                invocation_args.append(arg.base_data)
+                if arg_tp.with_offset:
+                    invocation_args.append(arg.offset)
+            else:
+                invocation_args.append(arg)
+
+        if all(vec.flags.c_contiguous for vec in vectors):
+            stride_pattern = None
+        else:
+            from pyopencl.tools import get_strided_access_info
+            stride_pattern, extra_args = get_strided_access_info(
+                    vector_names, vectors)
+            invocation_args.extend(extra_args)
+
+        segment_count = 1
+        for dim in out_shape:
+            segment_count *= dim
+
+        # Short segments do not need all work items of a full-size group.
+        group_size = self.stage_1_inf.group_size
+        while group_size > 32 and group_size // 2 >= segment_size:
+            group_size //= 2
+
+        repr_vec = vectors[0]
+        use_queue = queue or repr_vec.queue
+        if allocator is None:
+            allocator = repr_vec.allocator
+
+        if out is not None:
+            if out.shape != out_shape or out.dtype != self.dtype_out:
+                raise ValueError("'out' must have shape %s and dtype %s"
+                        % (out_shape, self.dtype_out))
+            if not out.flags.c_contiguous:
+                raise ValueError("'out' must be contiguous")
+            result = out
+        else:
+            result = empty(use_queue, out_shape, self.dtype_out,
+                    allocator=allocator)
+
+        if segment_starts is None:
+            segment_args = [segment_size]
+            starts_dtype = None
+        else:
+            segment_args = [segment_starts.base_data, segment_starts.offset]
+            starts_dtype = segment_starts.dtype
+
+        if not segment_count:
+            last_evt = cl.enqueue_marker(use_queue, wait_for=wait_for)
+        else:
+            stage_inf = self._get_segmented_inf(
+                    stride_pattern, group_size, starts_dtype)
+            last_evt = stage_inf.kernel(
+                    use_queue,
+                    (segment_count*stage_inf.group_size,),
+                    (stage_inf.group_size,),
+                    *([result.base_data, result.offset]
+                        + invocation_args + segment_args),
+                    **dict(wait_for=wait_for))
+
+        if return_event:
+            return result, last_evt
+        else:
+            return result
+
+    def _get_split_kernel(self):
+        if self._split_kernel is None:
+            from pyopencl.elementwise import ElementwiseKernel
+            from pyopencl.tools import VectorArg
+
+            ctx = self._stage_1_params[0]
+            nout = len(self._output_dtypes)
+            self._split_kernel = ElementwiseKernel(ctx,
+                    [VectorArg(dtype, "out%d" % iout)
+                        for iout, dtype in enumerate(self._output_dtypes)]
+                    + [VectorArg(self.dtype_out, "in")],
+                    "\n".join("out%d[i] = in[i].pcl_out%d;" % (iout, iout)
+                        for iout in range(nout)),
+                    name="split_reduction_outputs",
+                    preamble=self._split_preamble)
+
+        return self._split_kernel
+
+    def _split_outputs(self, result, out, queue, allocator, evt):
+        """Turn the struct-typed *result* of a reduction with multiple outputs
+        into a tuple of arrays.
+        """
+        nout = len(self._output_dtypes)
+
+        if out is None and result.shape == ():
+            # Views of the struct fields cost nothing and are contiguous.
+            return tuple(
+                    result._new_with_changes(result.base_data,
+                        result.offset + self.dtype_out.fields[
+                            "pcl_out%d" % iout][1],
+                        dtype=dtype, strides=())
+                    for iout, dtype in enumerate(self._output_dtypes)), evt
+
+        from pyopencl.array import empty
+        if out is None:
+            out = tuple(
+                    empty(queue or result.queue, result.shape, dtype,
+                        allocator=allocator or result.allocator)
+                    for dtype in self._output_dtypes)
+        else:
+            out = tuple(out)
+            if len(out) != nout:
+                raise ValueError("'out' must be a tuple of %d arrays" % nout)
+            for out_ary, dtype in zip(out, self._output_dtypes):
+                if out_ary.shape != result.shape or out_ary.dtype != dtype:
+                    raise ValueError("'out' arrays must have shape %s and "
+                            "dtypes %s" % (result.shape, self._output_dtypes))
+
+        evt = self._get_split_kernel()(*(out + (result,)),
+                **dict(queue=queue, wait_for=[evt]))
+        for out_ary in out:
+            out_ary.add_event(evt)
+
+        return out, evt
+
     def __call__(self, *args, **kwargs):
         """
         :arg range: A :class:`slice` object. Specifies the range of indices on which
@@ -286,11 +827,40 @@ class ReductionKernel:
             executed, relative to the first vector-like argument.
             May not be given at the same time as *range*.
         :arg allocator:
+        :arg axis: An integer or a tuple of integers. If given, reduce only
+            along these axes of the vector arguments, which must all have
+            the same shape, and return an array of the remaining axes.
+            May not be given at the same time as *range* or *slice*.
+        :arg segment_starts: A one-dimensional integer
+            :class:`pyopencl.array.Array` with *n+1* entries. If given,
+            reduce each index range ``segment_starts[k]:segment_starts[k+1]``
+            separately and return an array of the *n* results. May not be
+            given at the same time as *range*, *slice* or *axis*.
 
         .. versionchanged:: 2016.2
 
             *range_* and *slice_* added.
+
+        .. versionchanged:: 2017.1
+
+            *axis* and *segment_starts* added.
         """
+        if self._output_dtypes is None:
+            return self._call(*args, **kwargs)
+
+        out = kwargs.pop("out", None)
+        return_event = kwargs.pop("return_event", False)
+
+        result, evt = self._call(*args, return_event=True, **kwargs)
+        result, evt = self._split_outputs(result, out,
+                kwargs.get("queue"), kwargs.get("allocator"), evt)
+
+        if return_event:
+            return result, evt
+        else:
+            return result
+
+    def _call(self, *args, **kwargs):
         MAX_GROUP_COUNT = 1024  # noqa
         SMALL_SEQ_COUNT = 4  # noqa
 
@@ -306,30 +876,56 @@ class ReductionKernel:
 
         range_ = kwargs.pop("range", None)
         slice_ = kwargs.pop("slice", None)
+        axis = kwargs.pop("axis", None)
+        segment_starts = kwargs.pop("segment_starts", None)
 
         if kwargs:
             raise TypeError("invalid keyword argument to reduction kernel")
 
+        if axis is not None or segment_starts is not None:
+            if range_ is not None or slice_ is not None:
+                raise TypeError("may not specify axis or segment_starts "
+                        "together with range or slice keyword arguments")
+
+            if segment_starts is not None:
+                if axis is not None:
+                    raise TypeError("may not specify both axis and "
+                            "segment_starts keyword arguments")
+
+                return self._reduce_segments(args, segment_starts, queue,
+                        allocator, wait_for, return_event, out)
+
+            return self._reduce_along_axes(args, axis, queue, allocator,
+                    wait_for, return_event, out)
+
         stage1_args = args
 
         while True:
             invocation_args = []
             vectors = []
+            vector_names = []
 
             from pyopencl.tools import VectorArg
             for arg, arg_tp in zip(args, stage_inf.arg_types):
                 if isinstance(arg_tp, VectorArg):
-                    if not arg.flags.forc:
-                        raise RuntimeError("ReductionKernel cannot "
-                                "deal with non-contiguous arrays")
-
                     vectors.append(arg)
+                    vector_names.append(arg_tp.name)
                     invocation_args.append(arg.base_data)
                     if arg_tp.with_offset:
                         invocation_args.append(arg.offset)
                 else:
                     invocation_args.append(arg)
 
+            stride_pattern = None
+
+            from pyopencl.tools import can_index_flat
+            if stage_inf is self.stage_1_inf and not can_index_flat(vectors):
+                from pyopencl.tools import get_strided_access_info
+                stride_pattern, extra_args = get_strided_access_info(
+                        vector_names, vectors)
+                stage_inf = self._get_strided_stage_1_inf(stride_pattern)
+                invocation_args.extend(extra_args)
+
             if vectors:
                 repr_vec = vectors[0]
             else:
@@ -382,17 +978,56 @@ class ReductionKernel:
                 else:
                     allocator = repr_vec.allocator
 
+            trial = None
             if sz <= stage_inf.group_size*SMALL_SEQ_COUNT*MAX_GROUP_COUNT:
                 total_group_size = SMALL_SEQ_COUNT*stage_inf.group_size
                 group_count = (sz + total_group_size - 1) // total_group_size
                 seq_count = SMALL_SEQ_COUNT
             else:
-                group_count = MAX_GROUP_COUNT
+                from pyopencl.autotune import (
+                        get_launch_tuner, reduction_group_count_candidates)
+                group_count, trial = get_launch_tuner().choose(
+                        use_queue, stage_inf.kernel, "reduction", sz,
+                        MAX_GROUP_COUNT,
+                        lambda: reduction_group_count_candidates(
+                            use_queue.device, sz, stage_inf.group_size,
+                            MAX_GROUP_COUNT))
                 macrogroup_size = group_count*stage_inf.group_size
                 seq_count = (sz + macrogroup_size - 1) // macrogroup_size
 
             size_args = [start, step, range_.stop, seq_count, sz]
 
+            single_pass_inf = None
+            if group_count > 1 and stage_inf is not self.stage_2_inf:
+                single_pass_inf = self._get_single_pass_inf(
+                        use_queue, stride_pattern, stage_inf.group_size)
+
+            if single_pass_inf is not None:
+                if out is not None:
+                    result = out
+                else:
+                    result = empty(use_queue,
+                            (), self.dtype_out,
+                            allocator=allocator)
+
+                partials, done_count = self._get_single_pass_workspace(
+                        use_queue, MAX_GROUP_COUNT)
+
+                last_evt = single_pass_inf.kernel(
+                        use_queue,
+                        (group_count*single_pass_inf.group_size,),
+                        (single_pass_inf.group_size,),
+                        *([result.base_data, result.offset, partials, done_count]
+                            + invocation_args + size_args),
+                        **dict(wait_for=wait_for))
+                if trial is not None:
+                    trial.record(last_evt)
+
+                if return_event:
+                    return result, last_evt
+                else:
+                    return result
+
             if group_count == 1 and out is not None:
                 result = out
             elif group_count == 1:
@@ -411,6 +1046,8 @@ class ReductionKernel:
                     *([result.base_data, result.offset]
                         + invocation_args + size_args),
                     **dict(wait_for=wait_for))
+            if trial is not None:
+                trial.record(last_evt)
             wait_for = [last_evt]
 
             if group_count == 1:
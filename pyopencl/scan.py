@@ -28,6 +28,8 @@ Derived from code within the Thrust project, https://github.com/thrust/thrust/
 
 """
 
+import weakref
+
 import numpy as np
 
 import pyopencl as cl
@@ -36,6 +38,7 @@ from pyopencl.tools import (dtype_to_ctype, bitlog2,
         KernelTemplateBase, _process_code_for_macro,
         get_arg_list_scalar_arg_dtypes,
         context_dependent_memoize)
+from pytools import memoize, memoize_method
 
 import pyopencl._mymako as mako
 from pyopencl._cluda import CLUDA_PREAMBLE
@@ -127,7 +130,8 @@ KERNEL
 REQD_WG_SIZE(WG_SIZE, 1, 1)
 void ${kernel_name}(
     ${argument_signature},
-    GLOBAL_MEM scan_type *restrict partial_scan_buffer,
+    GLOBAL_MEM scan_type *${"restrict" if restrict_partial_scan_buffer else ""}
+        partial_scan_buffer,
     const index_type N,
     const index_type interval_size
     %if is_first_level:
@@ -602,7 +606,8 @@ void ${name_prefix}_final_update(
     const index_type N,
     const index_type interval_size,
     GLOBAL_MEM scan_type *restrict interval_results,
-    GLOBAL_MEM scan_type *restrict partial_scan_buffer
+    GLOBAL_MEM scan_type *${"restrict" if restrict_partial_scan_buffer else ""}
+        partial_scan_buffer
     %if is_segmented:
         , GLOBAL_MEM index_type *restrict g_first_segment_start_in_interval
     %endif
@@ -730,6 +735,316 @@ void ${name_prefix}_final_update(
 # }}}
 
 
+# {{{ single-pass scan with decoupled look-back
+
+# Algorithm: Each work group handles one 'tile' of K*WG_SIZE items. Tiles
+# are numbered in the order in which work groups start, through an atomic
+# counter, so a tile only ever waits on tiles whose work groups are already
+# running. Each work item scans a run of K consecutive items, the runs are
+# then scanned across the work group. The tile publishes its sum (status
+# TILE_AGGREGATE) and then looks back at preceding tiles, combining their
+# sums until it finds one whose inclusive prefix is known (status
+# TILE_PREFIX) or that contains a segment start. It then publishes its own
+# inclusive prefix and writes its output.
+#
+# Status words carry an 'epoch' that changes with every scan, so the status
+# array need not be cleared between scans.
+
+LOOKBACK_SCAN_SOURCE = SHARED_PREAMBLE + r"""//CL//
+
+%if not per_row:
+#if __OPENCL_VERSION__ < 110
+#pragma OPENCL EXTENSION cl_khr_global_int32_base_atomics: enable
+#define atomic_inc atom_inc
+#endif
+%endif
+
+#define K ${k_group_size}
+
+#define TILE_AGGREGATE 1
+#define TILE_PREFIX 2
+#define TILE_HAS_SEG_START 4
+#define TILE_EPOCH_SHIFT 3
+
+KERNEL
+REQD_WG_SIZE(WG_SIZE, 1, 1)
+void ${kernel_name}(
+    ${argument_signature},
+    const index_type N
+    %if not per_row:
+        , GLOBAL_MEM volatile uint *tile_counter
+        , GLOBAL_MEM volatile uint *tile_status
+        , GLOBAL_MEM volatile scan_type *tile_aggregates
+        , GLOBAL_MEM volatile scan_type *tile_prefixes
+        , const uint epoch
+    %endif
+    )
+{
+    LOCAL_MEM scan_type ldata[K*WG_SIZE];
+    LOCAL_MEM scan_type l_run_sums[WG_SIZE];
+
+    %if is_segmented:
+        LOCAL_MEM char l_segment_start_flags[K*WG_SIZE];
+        LOCAL_MEM char l_run_seg_flags[WG_SIZE];
+    %endif
+
+    %if per_row:
+        // each work group scans one row, which is its tile
+        const index_type tile_base = ((index_type) GID_0) * row_length;
+        const index_type tile_end = tile_base + row_length;
+    %else:
+        LOCAL_MEM scan_type l_tile_prefix;
+        LOCAL_MEM uint l_tile_id;
+
+        if (LID_0 == 0)
+        {
+            l_tile_id = atomic_inc(tile_counter);
+            if (l_tile_id == GDIM_0 - 1)
+                // this is the last tile to start, reset for the next scan
+                *tile_counter = 0;
+        }
+
+        local_barrier();
+
+        const uint tile_id = l_tile_id;
+        const index_type tile_base = ((index_type) tile_id) * K * WG_SIZE;
+        const index_type tile_end = min(tile_base + K*WG_SIZE, N);
+    %endif
+
+    // {{{ read a tile's worth of data from global
+
+    for (index_type k = 0; k < K; k++)
+    {
+        const index_type offset = k*WG_SIZE + LID_0;
+        const index_type i = tile_base + offset;
+
+        if (i < tile_end)
+        {
+            %for name, arg_name, ife_offset in input_fetch_exprs:
+                ${arg_ctypes[arg_name]} ${name};
+                %if ife_offset < 0:
+                    if (i+${ife_offset} >= 0)
+                        ${name} = ${arg_name}[i+${ife_offset}];
+                %else:
+                    ${name} = ${arg_name}[i];
+                %endif
+            %endfor
+
+            scan_type my_val = INPUT_EXPR(i);
+            ldata[offset] = my_val;
+
+            %if is_segmented:
+                l_segment_start_flags[offset] = IS_SEG_START(i, my_val);
+            %endif
+        }
+    }
+
+    local_barrier();
+
+    // }}}
+
+    // {{{ scan each work item's run of K items
+
+    const index_type run_base = LID_0*K;
+
+    scan_type sum = ${neutral};
+    %if is_segmented:
+        bool run_has_seg_start = false;
+    %endif
+
+    for (index_type k = 0; k < K; k++)
+    {
+        if (tile_base + run_base + k < tile_end)
+        {
+            %if is_segmented:
+                bool is_seg_start = l_segment_start_flags[run_base + k];
+                run_has_seg_start = run_has_seg_start || is_seg_start;
+            %endif
+
+            sum = SCAN_EXPR(sum, ldata[run_base + k],
+                %if is_segmented:
+                    is_seg_start
+                %else:
+                    false
+                %endif
+                );
+            ldata[run_base + k] = sum;
+        }
+    }
+
+    l_run_sums[LID_0] = sum;
+    %if is_segmented:
+        l_run_seg_flags[LID_0] = run_has_seg_start;
+    %endif
+
+    local_barrier();
+
+    // }}}
+
+    // {{{ scan run sums across the work group
+
+    for (index_type hs_offset = 1; hs_offset < WG_SIZE; hs_offset *= 2)
+    {
+        scan_type pv;
+        %if is_segmented:
+            bool prev_seg;
+        %endif
+
+        if (LID_0 >= hs_offset)
+        {
+            pv = l_run_sums[LID_0 - hs_offset];
+            %if is_segmented:
+                prev_seg = l_run_seg_flags[LID_0 - hs_offset];
+            %endif
+        }
+
+        local_barrier();
+
+        if (LID_0 >= hs_offset)
+        {
+            sum = SCAN_EXPR(pv, sum,
+                %if is_segmented:
+                    run_has_seg_start
+                %else:
+                    false
+                %endif
+                );
+            l_run_sums[LID_0] = sum;
+
+            %if is_segmented:
+                run_has_seg_start = run_has_seg_start || prev_seg;
+                l_run_seg_flags[LID_0] = run_has_seg_start;
+            %endif
+        }
+
+        local_barrier();
+    }
+
+    // }}}
+
+    %if not per_row:
+    // {{{ publish tile sum, look back for prefix
+
+    if (LID_0 == 0)
+    {
+        const scan_type tile_sum = l_run_sums[WG_SIZE - 1];
+        scan_type prefix = ${neutral};
+
+        if (tile_id == 0)
+        {
+            tile_prefixes[0] = tile_sum;
+            mem_fence(CLK_GLOBAL_MEM_FENCE);
+            tile_status[0] = (epoch << TILE_EPOCH_SHIFT) | TILE_PREFIX;
+        }
+        else
+        {
+            %if is_segmented:
+                const bool tile_has_seg_start = l_run_seg_flags[WG_SIZE - 1];
+            %else:
+                const bool tile_has_seg_start = false;
+            %endif
+
+            tile_aggregates[tile_id] = tile_sum;
+            mem_fence(CLK_GLOBAL_MEM_FENCE);
+            tile_status[tile_id] = (epoch << TILE_EPOCH_SHIFT) | TILE_AGGREGATE
+                | (tile_has_seg_start ? TILE_HAS_SEG_START : 0);
+
+            uint look_id = tile_id - 1;
+            while (true)
+            {
+                uint status;
+                do
+                    status = tile_status[look_id];
+                while ((status >> TILE_EPOCH_SHIFT) != epoch);
+
+                mem_fence(CLK_GLOBAL_MEM_FENCE);
+
+                scan_type look_sum;
+                if (status & TILE_PREFIX)
+                    look_sum = tile_prefixes[look_id];
+                else
+                    look_sum = tile_aggregates[look_id];
+
+                // Once combined with a tile containing a segment start,
+                // nothing preceding it matters, so there is never a
+                // segment boundary to pass.
+                prefix = SCAN_EXPR(look_sum, prefix, false);
+
+                if (status & (TILE_PREFIX | TILE_HAS_SEG_START))
+                    break;
+
+                --look_id;
+            }
+
+            tile_prefixes[tile_id] = SCAN_EXPR(prefix, tile_sum, tile_has_seg_start);
+            mem_fence(CLK_GLOBAL_MEM_FENCE);
+            tile_status[tile_id] = (epoch << TILE_EPOCH_SHIFT) | TILE_PREFIX;
+        }
+
+        l_tile_prefix = prefix;
+    }
+
+    local_barrier();
+
+    // }}}
+    %endif
+
+    // {{{ write output
+
+    %if per_row:
+        scan_type carry = ${neutral};
+    %else:
+        scan_type carry = l_tile_prefix;
+    %endif
+    if (LID_0 != 0)
+        carry = SCAN_EXPR(carry, l_run_sums[LID_0 - 1],
+            %if is_segmented:
+                l_run_seg_flags[LID_0 - 1]
+            %else:
+                false
+            %endif
+            );
+
+    scan_type prev_item = carry;
+    %if is_segmented:
+        bool seg_in_run = false;
+    %endif
+
+    for (index_type k = 0; k < K; k++)
+    {
+        const index_type i = tile_base + run_base + k;
+
+        if (i < tile_end)
+        {
+            %if is_segmented:
+                if (l_segment_start_flags[run_base + k])
+                {
+                    seg_in_run = true;
+                    prev_item = ${neutral};
+                }
+            %endif
+
+            scan_type item = SCAN_EXPR(carry, ldata[run_base + k],
+                %if is_segmented:
+                    seg_in_run
+                %else:
+                    false
+                %endif
+                );
+
+            { ${output_statement}; }
+
+            prev_item = item;
+        }
+    }
+
+    // }}}
+}
+"""
+
+# }}}
+
+
 # {{{ driver
 
 # {{{ helpers
@@ -762,6 +1077,12 @@ _PREFIX_WORDS = set("""
         linear_scan_data_idx dest src store_base wrapped_scan_type
         dummy scan_tmp
 
+        TILE_AGGREGATE TILE_PREFIX TILE_HAS_SEG_START TILE_EPOCH_SHIFT
+        tile_counter tile_status tile_aggregates tile_prefixes epoch
+        l_run_sums l_run_seg_flags l_tile_prefix l_tile_id tile_id
+        tile_base tile_end run_base run_has_seg_start hs_offset prev_seg
+        tile_sum tile_has_seg_start look_id status look_sum prefix seg_in_run
+
         LID_2 LID_1 LID_0
         LDIM_0 LDIM_1 LDIM_2
         GDIM_0 GDIM_1 GDIM_2
@@ -784,8 +1105,11 @@ _IGNORED_WORDS = set("""
         get_local_size get_local_id cl_khr_fp64 reqd_work_group_size
         get_num_groups barrier get_group_id
         CL_VERSION_1_1 __OPENCL_C_VERSION__ 120
+        __OPENCL_VERSION__ 110 3 cl_khr_global_int32_base_atomics
+        atomic_inc atom_inc mem_fence CLK_GLOBAL_MEM_FENCE uint volatile
+        do break
 
-        _final_update _debug_scan kernel_name
+        _final_update _debug_scan kernel_name per_row row_length
 
         positions all padded integer its previous write based writes 0
         has local worth scan_expr to read cannot not X items False bank
@@ -801,6 +1125,8 @@ _IGNORED_WORDS = set("""
         A load B group perform shift tail see last OR
         this add fetched into are directly need
         gets them stenciled that undefined
+        tile run sums output reset next publish back preceding containing
+        combined Once nothing matters never pass start one row scans which
         there up any ones or name only relevant populated
         even wide we Prepare int seg Note re below place take variable must
         intra Therefore find code assumption
@@ -818,7 +1144,7 @@ _IGNORED_WORDS = set("""
         update_loop_lookbehind update_loop_plain update_loop
         use_lookbehind_update store_segment_start_flags
         update_loop first_seg scan_dtype dtype_to_ctype
-        is_gpu use_bank_conflict_avoidance
+        is_gpu use_bank_conflict_avoidance restrict_partial_scan_buffer
 
         a b prev_item i last_item prev_value
         N NO_SEG_BOUNDARY across_seg_boundary
@@ -850,6 +1176,31 @@ def _make_template(s):
 
     return mako.template.Template(s, strict_undefined=True)
 
+
+def _round_up_to_power_of_2(val):
+    result = 2**bitlog2(val)
+    if result < val:
+        result <<= 1
+
+    assert result >= val
+    return result
+
+
+# status words in the look-back scan keep the epoch above three flag bits
+_MAX_LOOKBACK_EPOCH = 2**29 - 1
+
+
+@memoize
+def _device_supports_lookback(dev):
+    """Return *True* if the single-pass look-back scan may be used on *dev*.
+
+    Work groups spin-wait on their predecessors in this scan. Tiles are
+    handed out in the order in which groups start, which suffices on GPUs,
+    where a running group keeps running until it finishes.
+    """
+    from pyopencl.characterize import has_global_int32_atomics
+    return bool(dev.type & cl.device_type.GPU) and has_global_int32_atomics(dev)
+
 from pytools import Record
 
 
@@ -859,6 +1210,81 @@ class _ScanKernelInfo(Record):
 # }}}
 
 
+# {{{ workspace
+
+class ScanWorkspace(object):
+    """Holds the temporary buffers needed by :class:`GenericScanKernel`
+    so that they can be reused across calls.
+
+    Buffers are kept per role and grown to the next power of two of
+    the requested size when needed, so that calls of similar size share
+    their storage. A workspace may be shared among different scan kernels,
+    but must not be used by calls that may execute concurrently, e.g. on
+    different or out-of-order queues.
+
+    :arg allocator: used to allocate the buffers. If *None*, plain
+        :class:`pyopencl.Buffer` instances are allocated.
+
+    .. versionadded:: 2017.1
+    """
+
+    def __init__(self, allocator=None):
+        self.allocator = allocator
+        self._buffers = {}
+        self._lookback_state = None
+        self._lookback_epoch = 0
+
+    def _allocate(self, queue, nbytes):
+        if self.allocator is not None:
+            return self.allocator(nbytes)
+        else:
+            return cl.Buffer(queue.context, cl.mem_flags.READ_WRITE, nbytes)
+
+    def _get_buffer(self, queue, role, nbytes):
+        try:
+            size, buf = self._buffers[role]
+        except KeyError:
+            pass
+        else:
+            if size >= nbytes:
+                return buf
+
+        size = _round_up_to_power_of_2(max(nbytes, 1))
+        buf = self._allocate(queue, size)
+
+        self._buffers[role] = (size, buf)
+        return buf
+
+    def _get_lookback_state(self, queue, num_tiles):
+        """Return a tuple *(tile_counter, tile_status, epoch)* for a
+        single-pass scan over *num_tiles* tiles. The status entries of
+        all tiles are guaranteed to not carry *epoch*.
+        """
+        if (self._lookback_state is None
+                or self._lookback_state[0] < num_tiles
+                or self._lookback_epoch >= _MAX_LOOKBACK_EPOCH):
+            capacity = _round_up_to_power_of_2(num_tiles)
+            tile_counter = self._allocate(queue, 4)
+            tile_status = self._allocate(queue, 4*capacity)
+
+            cl.enqueue_copy(queue, tile_counter, np.zeros(1, np.uint32))
+            cl.enqueue_copy(queue, tile_status, np.zeros(capacity, np.uint32))
+
+            self._lookback_state = (capacity, tile_counter, tile_status)
+            self._lookback_epoch = 0
+
+        self._lookback_epoch += 1
+        _, tile_counter, tile_status = self._lookback_state
+        return tile_counter, tile_status, self._lookback_epoch
+
+    def clear(self):
+        """Release all buffers held by this workspace."""
+        self._buffers.clear()
+        self._lookback_state = None
+
+# }}}
+
+
 class ScanPerformanceWarning(UserWarning):
     pass
 
@@ -870,7 +1296,8 @@ class _GenericScanKernelBase(object):
             arguments, input_expr, scan_expr, neutral, output_statement,
             is_segment_start_expr=None, input_fetch_exprs=[],
             index_dtype=np.int32,
-            name_prefix="scan", options=[], preamble="", devices=None):
+            name_prefix="scan", options=[], preamble="", devices=None,
+            use_lookback=None):
         """
         :arg ctx: a :class:`pyopencl.Context` within which the code
             for this scan kernel will be generated.
@@ -943,6 +1370,15 @@ class _GenericScanKernelBase(object):
             `OFFSET` is allowed to be 0 or -1, and `ARG_NAME_TYPE` is the type
             of `ARG_NAME`.
         :arg preamble: |preamble|
+        :arg use_lookback: whether to carry out the scan in a single pass
+            with decoupled look-back, where each work group obtains the sum
+            of the preceding data from the work groups before it. *None*
+            (the default) uses this on devices where it is known to work.
+            Independently of this, scans whose *output_statement* uses
+            `last_item` or writes to arrays read by *input_expr* use the
+            multi-pass algorithm.
+
+            .. versionadded:: 2017.1
 
         The first array in the argument list determines the size of the index
         space over which the scan is carried out, and thus the values over
@@ -1004,6 +1440,7 @@ class _GenericScanKernelBase(object):
 
         self.options = options
         self.name_prefix = name_prefix
+        self.use_lookback = use_lookback
 
         # {{{ set up shared code dict
 
@@ -1054,6 +1491,13 @@ class GenericScanKernel(_GenericScanKernelBase):
     """
 
     def finish_setup(self):
+        self._find_scratch_output_arg()
+
+        # If the output array may double as the partial scan buffer, the
+        # kernels see that buffer through two pointers, so these must not be
+        # declared 'restrict'.
+        restrict_partial_scan_buffer = self.scratch_output_arg_idx is None
+
         use_lookbehind_update = "prev_item" in self.output_statement
         self.store_segment_start_flags = self.is_segmented and use_lookbehind_update
 
@@ -1122,7 +1566,8 @@ class GenericScanKernel(_GenericScanKernelBase):
                     is_first_level=True,
                     store_segment_start_flags=self.store_segment_start_flags,
                     k_group_size=k_group_size,
-                    use_bank_conflict_avoidance=use_bank_conflict_avoidance)
+                    use_bank_conflict_avoidance=use_bank_conflict_avoidance,
+                    restrict_partial_scan_buffer=restrict_partial_scan_buffer)
 
             # Will this device actually let us execute this kernel
             # at the desired work group size? Building it is the
@@ -1195,6 +1640,7 @@ class GenericScanKernel(_GenericScanKernelBase):
             is_segment_start_expr=self.is_segment_start_expr,
             input_expr=_process_code_for_macro(self.input_expr),
             use_lookbehind_update=use_lookbehind_update,
+            restrict_partial_scan_buffer=restrict_partial_scan_buffer,
             **self.code_variables))
 
         final_update_prg = cl.Program(
@@ -1214,6 +1660,277 @@ class GenericScanKernel(_GenericScanKernelBase):
 
         # }}}
 
+        self._find_lookback_hazards()
+        self._workspaces = weakref.WeakKeyDictionary()
+
+    # {{{ temporary storage
+
+    def _find_scratch_output_arg(self):
+        """Find out whether the output array may double as the
+        partial scan buffer, which is the case if *output_statement*
+        just stores *item* or *prev_item* into an array of the scan type
+        that is not otherwise read by the scan.
+
+        Each entry of the partial scan buffer is only ever read by the
+        work item that writes the corresponding output entry, and always
+        before that write.
+        """
+        self.scratch_output_arg_idx = None
+        self.scratch_alias_arg_idx = None
+
+        import re
+        match = re.match(r"^\s*(\w+)\s*\[\s*i\s*\]\s*=\s*(item|prev_item)\s*;?\s*$",
+                self.output_statement)
+        if match is None:
+            return
+
+        from pyopencl.tools import VectorArg
+        out_name = match.group(1)
+        for idx, arg in enumerate(self.parsed_args):
+            if arg.name == out_name:
+                break
+        else:
+            return
+
+        if not isinstance(arg, VectorArg) or arg.dtype != self.dtype:
+            return
+
+        out_name_re = re.compile(r"\b%s\b" % out_name)
+        if out_name_re.search(self.input_expr):
+            return
+        if (self.is_segmented
+                and out_name_re.search(self.is_segment_start_expr)):
+            return
+        for _, arg_name, _ in self.input_fetch_exprs:
+            if arg_name == out_name:
+                return
+
+        self.scratch_output_arg_idx = idx
+
+        # The first level scan reads a whole unit of its input into local
+        # memory before writing it back, so an in-place scan of the form
+        # 'out[i] = f(in[i])' with 'in' and 'out' in the same buffer is safe.
+        if not self.is_segmented and not self.input_fetch_exprs:
+            for alias_idx, arg in enumerate(self.parsed_args):
+                if (isinstance(arg, VectorArg)
+                        and re.match(r"^\s*%s\s*\[\s*i\s*\]\s*$" % arg.name,
+                            self.input_expr)):
+                    self.scratch_alias_arg_idx = alias_idx
+
+    def _get_workspace(self, queue):
+        """Return the workspace used by default on *queue*, or *None* if
+        calls on *queue* may overlap.
+        """
+        if (queue.properties
+                & cl.command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE):
+            return None
+
+        try:
+            return self._workspaces[queue]
+        except KeyError:
+            result = self._workspaces[queue] = ScanWorkspace()
+            return result
+
+    def _get_partial_scan_buffer(self, data_args):
+        """Return the output argument's buffer if it may serve as the
+        partial scan buffer for this call, else *None*.
+        """
+        idx = self.scratch_output_arg_idx
+        if idx is None:
+            return None
+
+        from pyopencl.tools import VectorArg
+        scratch = data_args[idx]
+        for other_idx, (arg_descr, arg_val) in enumerate(
+                zip(self.parsed_args, data_args)):
+            if (other_idx != idx
+                    and other_idx != self.scratch_alias_arg_idx
+                    and isinstance(arg_descr, VectorArg)
+                    and arg_val == scratch):
+                return None
+
+        return scratch
+
+    # }}}
+
+    # {{{ single-pass scan
+
+    def _find_lookback_hazards(self):
+        """Find out whether the single-pass scan may be used. Unlike in the
+        multi-pass scan, a work group there writes its output while work
+        groups for later data may not have read their input yet. So no array
+        written by *output_statement* may be read by the input side of the
+        scan, unless it is read and written only at index *i*.
+        """
+        import re
+        from pyopencl.tools import VectorArg
+
+        self.lookback_ok = not re.search(r"\blast_item\b", self.output_statement)
+
+        read_code = [self.input_expr]
+        if self.is_segmented:
+            read_code.append(self.is_segment_start_expr)
+        read_names = set(arg_name for _, arg_name, _ in self.input_fetch_exprs)
+
+        written_names = set()
+
+        for arg in self.parsed_args:
+            if not isinstance(arg, VectorArg):
+                continue
+
+            name_re = re.compile(r"\b%s\b" % arg.name)
+            if any(name_re.search(code) for code in read_code):
+                read_names.add(arg.name)
+
+            # Remove all accesses that are clearly just reads, anything
+            # left over may be a write.
+            not_read = re.sub(
+                    r"(?<![&+-])\b%s\s*\[[^\[\]]*\]"
+                    r"(?!\s*((<<|>>|[-+*/%%&|^])?=(?!=)|\+\+|--))" % arg.name,
+                    "", self.output_statement)
+            if name_re.search(not_read):
+                written_names.add(arg.name)
+
+        hazard_names = read_names & written_names
+
+        if len(hazard_names) == 1 and not self.input_fetch_exprs:
+            name, = hazard_names
+            at_i = r"\s*%s\s*\[\s*i\s*\]\s*" % name
+            if (not self.is_segmented
+                    and re.match("^%s$" % at_i, self.input_expr)
+                    and re.match(r"^%s=\s*(item|prev_item)\s*;?\s*$" % at_i,
+                        self.output_statement)):
+                hazard_names = set()
+
+        if hazard_names:
+            self.lookback_ok = False
+
+        self.lookback_read_arg_idxs = [
+                i for i, arg in enumerate(self.parsed_args)
+                if arg.name in read_names]
+        self.lookback_written_arg_idxs = [
+                i for i, arg in enumerate(self.parsed_args)
+                if arg.name in written_names]
+
+    def build_tile_scan_kernel(self, wg_size, k_group_size, per_row,
+            is_segment_start_expr):
+        """Build a kernel in which each work group scans a tile of
+        *wg_size* times *k_group_size* items, either as part of a single-pass
+        scan, or, if *per_row* is true, one row of at most that many items.
+        Return *None* if it cannot be run with *wg_size*.
+        """
+        kernel_name = self.name_prefix
+        if per_row:
+            kernel_name += "_row_scan"
+        else:
+            kernel_name += "_lookback_scan"
+
+        code_variables = self.code_variables.copy()
+        code_variables["is_segmented"] = is_segment_start_expr is not None
+
+        scan_tpl = _make_template(LOOKBACK_SCAN_SOURCE)
+        scan_src = str(scan_tpl.render(
+            wg_size=wg_size,
+            k_group_size=k_group_size,
+            per_row=per_row,
+            kernel_name=kernel_name,
+            output_statement=self.output_statement,
+            argument_signature=", ".join(
+                arg.declarator() for arg in self.parsed_args),
+            is_segment_start_expr=is_segment_start_expr,
+            input_expr=_process_code_for_macro(self.input_expr),
+            input_fetch_exprs=self.input_fetch_exprs,
+            **code_variables))
+
+        prg = cl.Program(self.context, scan_src).build(self.options)
+        knl = getattr(prg, kernel_name)
+
+        kernel_max_wg_size = min(
+                knl.get_work_group_info(
+                    cl.kernel_work_group_info.WORK_GROUP_SIZE, dev)
+                for dev in self.devices)
+        if kernel_max_wg_size < wg_size:
+            return None
+
+        scalar_arg_dtypes = (
+                get_arg_list_scalar_arg_dtypes(self.parsed_args)
+                + [self.index_dtype])
+        if not per_row:
+            scalar_arg_dtypes.extend([None, None, None, None, np.uint32])
+        knl.set_scalar_arg_dtypes(scalar_arg_dtypes)
+
+        return _ScanKernelInfo(
+                kernel=knl, wg_size=wg_size, k_group_size=k_group_size)
+
+    @memoize_method
+    def _get_lookback_scan_info(self):
+        """Build the single-pass scan kernel, using the work group size of
+        the multi-pass scan.
+        """
+        l1_info = self.first_level_scan_info
+        return self.build_tile_scan_kernel(
+                l1_info.wg_size, l1_info.k_group_size, per_row=False,
+                is_segment_start_expr=self.is_segment_start_expr)
+
+    def _has_tile_scan_hazards(self, data_args):
+        """Return *True* if a kernel from :meth:`build_tile_scan_kernel`
+        may not be used for a call with *data_args*, because a work group
+        could overwrite data that another one has not read yet.
+        """
+        if not self.lookback_ok:
+            return True
+
+        for written_idx in self.lookback_written_arg_idxs:
+            for read_idx in self.lookback_read_arg_idxs:
+                if (written_idx != read_idx
+                        and data_args[written_idx] == data_args[read_idx]
+                        and (written_idx, read_idx) != (
+                            self.scratch_output_arg_idx,
+                            self.scratch_alias_arg_idx)):
+                    return True
+
+        return False
+
+    def _get_lookback_scan_info_for_call(self, queue, data_args):
+        """Return the single-pass kernel info if it may be used for a call
+        with *data_args* on *queue*, else *None*.
+        """
+        if self.use_lookback is False:
+            return None
+
+        if self.use_lookback is None and not _device_supports_lookback(
+                queue.device):
+            return None
+
+        if self._has_tile_scan_hazards(data_args):
+            return None
+
+        return self._get_lookback_scan_info()
+
+    def _run_lookback_scan(self, info, queue, data_args, n, workspace,
+            wait_for):
+        tile_size = info.wg_size * info.k_group_size
+        num_tiles = (n + tile_size - 1) // tile_size
+
+        if workspace is None:
+            workspace = ScanWorkspace()
+
+        tile_counter, tile_status, epoch = \
+                workspace._get_lookback_state(queue, num_tiles)
+        tile_aggregates = workspace._get_buffer(
+                queue, "tile_aggregates", num_tiles*self.dtype.itemsize)
+        tile_prefixes = workspace._get_buffer(
+                queue, "tile_prefixes", num_tiles*self.dtype.itemsize)
+
+        return info.kernel(
+                queue, (num_tiles,), (info.wg_size,),
+                *(data_args + [
+                    n, tile_counter, tile_status, tile_aggregates, tile_prefixes,
+                    epoch]),
+                **dict(g_times_l=True, wait_for=wait_for))
+
+    # }}}
+
     # {{{ scan kernel build/properties
 
     def get_local_mem_use(self, k_group_size, wg_size, use_bank_conflict_avoidance):
@@ -1247,7 +1964,7 @@ class GenericScanKernel(_GenericScanKernelBase):
     def build_scan_kernel(self, max_wg_size, arguments, input_expr,
             is_segment_start_expr, input_fetch_exprs, is_first_level,
             store_segment_start_flags, k_group_size,
-            use_bank_conflict_avoidance):
+            use_bank_conflict_avoidance, restrict_partial_scan_buffer=True):
         scalar_arg_dtypes = get_arg_list_scalar_arg_dtypes(arguments)
 
         # Empirically found on Nv hardware: no need to be bigger than this size
@@ -1271,6 +1988,7 @@ class GenericScanKernel(_GenericScanKernelBase):
             is_first_level=is_first_level,
             store_segment_start_flags=store_segment_start_flags,
             use_bank_conflict_avoidance=use_bank_conflict_avoidance,
+            restrict_partial_scan_buffer=restrict_partial_scan_buffer,
             kernel_name=kernel_name,
             **self.code_variables))
 
@@ -1300,6 +2018,8 @@ class GenericScanKernel(_GenericScanKernelBase):
         queue = kwargs.get("queue")
         n = kwargs.get("size")
         wait_for = kwargs.get("wait_for")
+        workspace = kwargs.get("workspace")
+        explicit_workspace = workspace is not None
 
         if len(args) != len(self.parsed_args):
             raise TypeError("expected %d arguments, got %d" %
@@ -1337,37 +2057,65 @@ class GenericScanKernel(_GenericScanKernelBase):
         interval_size, num_intervals = uniform_interval_splitting(
                 n, unit_size, max_intervals)
 
-        # {{{ allocate some buffers
+        if workspace is None:
+            workspace = self._get_workspace(queue)
 
-        interval_results = cl.array.empty(queue,
-                num_intervals, dtype=self.dtype,
-                allocator=allocator)
+        lookback_info = self._get_lookback_scan_info_for_call(queue, data_args)
+        if lookback_info is not None:
+            return self._run_lookback_scan(
+                    lookback_info, queue, data_args, n, workspace, wait_for)
 
-        partial_scan_buffer = cl.array.empty(
-                queue, n, dtype=self.dtype,
-                allocator=allocator)
+        # {{{ allocate some buffers
+
+        if workspace is not None:
+            def get_buffer(role, nbytes):
+                return workspace._get_buffer(queue, role, nbytes)
+        else:
+            def get_buffer(role, nbytes):
+                if allocator is not None:
+                    return allocator(nbytes)
+                else:
+                    return cl.Buffer(queue.context, cl.mem_flags.READ_WRITE,
+                            nbytes)
+
+        interval_results = get_buffer(
+                "interval_results", num_intervals*self.dtype.itemsize)
+
+        partial_scan_buffer = self._get_partial_scan_buffer(data_args)
+        if partial_scan_buffer is None:
+            # The workspace given by default retains only small buffers.
+            if explicit_workspace:
+                partial_scan_buffer = get_buffer(
+                        "partial_scan_buffer", n*self.dtype.itemsize)
+            else:
+                partial_scan_buffer = cl.array.empty(
+                        queue, n, dtype=self.dtype,
+                        allocator=allocator).data
 
         if self.store_segment_start_flags:
-            segment_start_flags = cl.array.empty(
-                    queue, n, dtype=np.bool,
-                    allocator=allocator)
+            if explicit_workspace:
+                segment_start_flags = get_buffer("segment_start_flags", n)
+            else:
+                segment_start_flags = cl.array.empty(
+                        queue, n, dtype=np.bool,
+                        allocator=allocator).data
 
         # }}}
 
         # {{{ first level scan of interval (one interval per block)
 
         scan1_args = data_args + [
-                partial_scan_buffer.data, n, interval_size, interval_results.data,
+                partial_scan_buffer, n, interval_size, interval_results,
                 ]
 
         if self.is_segmented:
-            first_segment_start_in_interval = cl.array.empty(queue,
-                    num_intervals, dtype=self.index_dtype,
-                    allocator=allocator)
-            scan1_args.append(first_segment_start_in_interval.data)
+            first_segment_start_in_interval = get_buffer(
+                    "first_segment_start_in_interval",
+                    num_intervals*self.index_dtype.itemsize)
+            scan1_args.append(first_segment_start_in_interval)
 
         if self.store_segment_start_flags:
-            scan1_args.append(segment_start_flags.data)
+            scan1_args.append(segment_start_flags)
 
         l1_evt = l1_info.kernel(
                 queue, (num_intervals,), (l1_info.wg_size,),
@@ -1381,12 +2129,12 @@ class GenericScanKernel(_GenericScanKernelBase):
         assert interval_size >= num_intervals
 
         scan2_args = data_args + [
-                interval_results.data,  # interval_sums
+                interval_results,  # interval_sums
                 ]
         if self.is_segmented:
-            scan2_args.append(first_segment_start_in_interval.data)
+            scan2_args.append(first_segment_start_in_interval)
         scan2_args = scan2_args + [
-                interval_results.data,  # partial_scan_buffer
+                interval_results,  # partial_scan_buffer
                 num_intervals, interval_size]
 
         l2_evt = l2_info.kernel(
@@ -1398,11 +2146,11 @@ class GenericScanKernel(_GenericScanKernelBase):
         # {{{ update intervals with result of interval scan
 
         upd_args = data_args + [
-                n, interval_size, interval_results.data, partial_scan_buffer.data]
+                n, interval_size, interval_results, partial_scan_buffer]
         if self.is_segmented:
-            upd_args.append(first_segment_start_in_interval.data)
+            upd_args.append(first_segment_start_in_interval)
         if self.store_segment_start_flags:
-            upd_args.append(segment_start_flags.data)
+            upd_args.append(segment_start_flags)
 
         return self.final_update_knl(
                 queue, (num_intervals,), (self.update_wg_size,),
@@ -1412,6 +2160,162 @@ class GenericScanKernel(_GenericScanKernelBase):
 
 # }}}
 
+# {{{ row scan
+
+# rows shorter than this are scanned by the segmented multi-pass scan,
+# which packs several of them into one work group
+_MIN_ROW_SCAN_WG_SIZE = 32
+
+
+class GenericRowScanKernel(GenericScanKernel):
+    """Performs the same scan as :class:`GenericScanKernel` on each of many
+    independent, equally long rows, which lie one after the other in the
+    index space of the scan. This is the case e.g. for the rows of a
+    C-contiguous two-dimensional array.
+
+    The constructor arguments are the same as for :class:`GenericScanKernel`.
+    Code fragments continue to see the index *i* across all rows, and may
+    use the row length as `row_length`. As for a segmented scan, *scan_expr*
+    must honor `across_seg_boundary`, which is true when crossing into a
+    new row. *is_segment_start_expr* may further divide each row into
+    segments. `last_item` is not available.
+
+    Rows that fit into a single work group are scanned by one work group
+    each. Longer rows are scanned by the multi-pass (or single-pass) scan
+    with a segment starting at every row. So are short rows if
+    *output_statement* may overwrite data that other rows have yet to read,
+    the same condition that rules out the single-pass scan.
+
+    Usage example::
+
+        from pyopencl.scan import GenericRowScanKernel
+        knl = GenericRowScanKernel(
+                context, np.int32,
+                arguments="__global int *ary, __global int *out",
+                input_expr="ary[i]",
+                scan_expr="across_seg_boundary ? b : (a+b)", neutral="0",
+                output_statement="out[i] = item;")
+
+        a = cl.array.arange(queue, 1000*300, dtype=np.int32).reshape(1000, 300)
+        out = cl.array.empty_like(a)
+        knl(a, out, row_length=300)
+
+    .. versionadded:: 2017.1
+    """
+
+    def __init__(self, ctx, dtype,
+            arguments, input_expr, scan_expr, neutral, output_statement,
+            is_segment_start_expr=None, input_fetch_exprs=[],
+            index_dtype=np.int32,
+            name_prefix="row_scan", options=[], preamble="", devices=None,
+            use_lookback=None):
+        from pyopencl.tools import parse_arg_list, ScalarArg
+        arguments = (parse_arg_list(arguments)
+                + [ScalarArg(index_dtype, "row_length")])
+
+        row_start_expr = "(i % row_length == 0)"
+        if is_segment_start_expr is not None:
+            is_segment_start_expr = _process_code_for_macro(
+                    is_segment_start_expr)
+            row_start_expr = "%s || (%s)" % (
+                    row_start_expr, is_segment_start_expr)
+
+        self.row_segment_start_expr = is_segment_start_expr
+
+        GenericScanKernel.__init__(self, ctx, dtype,
+                arguments, input_expr, scan_expr, neutral, output_statement,
+                is_segment_start_expr=row_start_expr,
+                input_fetch_exprs=input_fetch_exprs,
+                index_dtype=index_dtype, name_prefix=name_prefix,
+                options=options, preamble=preamble, devices=devices,
+                use_lookback=use_lookback)
+
+    @memoize_method
+    def _get_row_scan_variant(self, wg_size, k_group_size):
+        return self.build_tile_scan_kernel(
+                wg_size, k_group_size, per_row=True,
+                is_segment_start_expr=self.row_segment_start_expr)
+
+    def _get_row_scan_info(self, row_length):
+        """Return the kernel info for scanning rows of *row_length* items
+        with one work group each, or *None* if these rows are too short or
+        too long for that.
+        """
+        l1_info = self.first_level_scan_info
+        if (row_length < _MIN_ROW_SCAN_WG_SIZE
+                or row_length > l1_info.wg_size*l1_info.k_group_size):
+            return None
+
+        wg_size = min(l1_info.wg_size, _round_up_to_power_of_2(row_length))
+        k_group_size = _round_up_to_power_of_2(
+                (row_length + wg_size - 1) // wg_size)
+        return self._get_row_scan_variant(wg_size, k_group_size)
+
+    def __call__(self, *args, **kwargs):
+        """
+        :arg row_length: the number of items in each row. Must divide the
+            size of the scan.
+
+        The other arguments are the same as for
+        :meth:`GenericScanKernel.__call__`, except that *size*, if not
+        given, is the total size of the first array argument.
+        """
+        # {{{ argument processing
+
+        row_length = kwargs.pop("row_length", None)
+        queue = kwargs.get("queue")
+        n = kwargs.get("size")
+        wait_for = kwargs.get("wait_for")
+
+        if row_length is None:
+            raise TypeError("must specify row_length")
+
+        if len(args) != len(self.parsed_args) - 1:
+            raise TypeError("expected %d arguments, got %d" %
+                    (len(self.parsed_args) - 1, len(args)))
+
+        first_array = args[self.first_array_idx]
+        queue = queue or first_array.queue
+
+        if n is None:
+            n = first_array.size
+
+        if n == 0:
+            # We're done here. (But pretend to return an event.)
+            return cl.enqueue_marker(queue, wait_for=wait_for)
+
+        if row_length <= 0 or n % row_length:
+            raise ValueError("size of the scan (%d) is not a multiple of "
+                    "row_length (%d)" % (n, row_length))
+
+        args = args + (row_length,)
+
+        # }}}
+
+        data_args = []
+        from pyopencl.tools import VectorArg
+        for arg_descr, arg_val in zip(self.parsed_args, args):
+            if isinstance(arg_descr, VectorArg):
+                data_args.append(arg_val.data)
+            else:
+                data_args.append(arg_val)
+
+        row_scan_info = None
+        if not self._has_tile_scan_hazards(data_args):
+            row_scan_info = self._get_row_scan_info(row_length)
+
+        if row_scan_info is None:
+            kwargs["size"] = n
+            return GenericScanKernel.__call__(self, *args, **kwargs)
+
+        return row_scan_info.kernel(
+                queue, (n // row_length,), (row_scan_info.wg_size,),
+                *(data_args + [n]),
+                **dict(g_times_l=True, wait_for=wait_for))
+
+# }}}
+
+
 # {{{ debug kernel
 
 DEBUG_SCAN_TEMPLATE = SHARED_PREAMBLE + r"""//CL//
@@ -1552,7 +2456,8 @@ class _LegacyScanKernelBase(GenericScanKernel):
                 output_statement=self.ary_output_statement,
                 options=options, preamble=preamble, devices=devices)
 
-    def __call__(self, input_ary, output_ary=None, allocator=None, queue=None):
+    def __call__(self, input_ary, output_ary=None, allocator=None, queue=None,
+            workspace=None):
         allocator = allocator or input_ary.allocator
         queue = queue or input_ary.queue or output_ary.queue
 
@@ -1575,7 +2480,8 @@ class _LegacyScanKernelBase(GenericScanKernel):
             return output_ary
 
         GenericScanKernel.__call__(self,
-                input_ary, output_ary, allocator=allocator, queue=queue)
+                input_ary, output_ary, allocator=allocator, queue=queue,
+                workspace=workspace)
 
         return output_ary
 
@@ -1653,6 +2559,22 @@ def get_cumsum_kernel(context, input_dtype, output_dtype):
             output[i] = item;
             """)
 
+
+@context_dependent_memoize
+def get_row_cumsum_kernel(context, input_dtype, output_dtype):
+    from pyopencl.tools import VectorArg
+    return GenericRowScanKernel(
+        context, output_dtype,
+        arguments=[
+            VectorArg(input_dtype, "input"),
+            VectorArg(output_dtype, "output"),
+            ],
+        input_expr="input[i]",
+        scan_expr="across_seg_boundary ? b : (a+b)", neutral="0",
+        output_statement="""
+            output[i] = item;
+            """)
+
 # }}}
 
 # vim: filetype=pyopencl:fdm=marker
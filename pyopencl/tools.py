@@ -395,6 +395,138 @@ def get_arg_offset_adjuster_code(arg_types):
 # }}}
 
 
+# {{{ strided array access
+
+def can_index_flat(arrays):
+    """Return *True* if all of *arrays* may be indexed by the same flat
+    index, i.e. if they are either all C-contiguous or all Fortran-contiguous.
+    """
+    return (all(ary.flags.c_contiguous for ary in arrays)
+            or all(ary.flags.f_contiguous for ary in arrays))
+
+
+def collapse_strided_dims(shape, strides_list):
+    """Remove length-1 axes from *shape* and merge adjacent axes along which
+    all arrays described by the element strides in *strides_list* are
+    contiguous.
+
+    :returns: a tuple *(shape, strides_list)* with fewer or equally many axes.
+    """
+    axes = [iaxis for iaxis, dim in enumerate(shape) if dim != 1]
+    new_shape = [shape[iaxis] for iaxis in axes]
+    new_strides_list = [[strides[iaxis] for iaxis in axes]
+            for strides in strides_list]
+
+    iaxis = len(new_shape) - 2
+    while iaxis >= 0:
+        inner_dim = new_shape[iaxis+1]
+        if all(strides[iaxis] == strides[iaxis+1]*inner_dim
+                for strides in new_strides_list):
+            new_shape[iaxis] *= inner_dim
+            del new_shape[iaxis+1]
+            for strides in new_strides_list:
+                strides[iaxis] = strides[iaxis+1]
+                del strides[iaxis+1]
+        iaxis -= 1
+
+    return (tuple(new_shape),
+            [tuple(strides) for strides in new_strides_list])
+
+
+def get_strided_access_info(arg_names, arrays):
+    """Determine how the :class:`pyopencl.array.Array` instances *arrays*,
+    passed for the vector arguments named *arg_names*, must be indexed
+    when at least one of them is not contiguous.
+
+    :returns: a tuple *(stride_pattern, extra_args)*. *stride_pattern*
+        is a tuple *(ndim, strided_names)* on which the generated code
+        depends, suitable for :func:`get_strided_access_code`.
+        *extra_args* are the values of the arguments returned by
+        :func:`get_strided_access_args`, in order.
+    """
+    shape = arrays[0].shape
+    strides_list = []
+    for ary in arrays:
+        if ary.shape != shape:
+            raise ValueError("non-contiguous arrays can only be operated "
+                    "on together with arrays of the same shape")
+
+        itemsize = ary.dtype.itemsize
+        if any(stride % itemsize for stride in ary.strides):
+            raise NotImplementedError("array strides must be a multiple "
+                    "of the item size")
+        strides_list.append([stride // itemsize for stride in ary.strides])
+
+    shape, strides_list = collapse_strided_dims(shape, strides_list)
+
+    from pyopencl.compyte.array import c_contiguous_strides
+    flat_strides = tuple(c_contiguous_strides(1, shape))
+
+    strided_names = []
+    extra_args = list(shape)
+    for name, strides in zip(arg_names, strides_list):
+        if strides != flat_strides:
+            strided_names.append(name)
+            extra_args.extend(strides)
+
+    return (len(shape), tuple(strided_names)), extra_args
+
+
+def get_strided_access_args(stride_pattern):
+    """Return a list of :class:`ScalarArg` instances that the code from
+    :func:`get_strided_access_code` relies on being kernel arguments.
+    """
+    ndim, strided_names = stride_pattern
+
+    result = [ScalarArg(np.int64, "pyopencl_dim%d" % iaxis)
+            for iaxis in range(ndim)]
+    for name in strided_names:
+        result.extend(ScalarArg(np.int64, "%s__stride%d" % (name, iaxis))
+            for iaxis in range(ndim))
+
+    return result
+
+
+def get_strided_access_code(stride_pattern, code):
+    """Rewrite accesses ``name[i]`` in *code* for each strided argument
+    *name* to use the strides passed in the arguments returned by
+    :func:`get_strided_access_args`.
+
+    :returns: a tuple *(preamble, code)*, where *preamble* contains
+        macro definitions used by the rewritten *code*.
+    """
+    ndim, strided_names = stride_pattern
+
+    preamble = []
+    for name in strided_names:
+        terms = []
+        divisor = []
+        for iaxis in range(ndim-1, -1, -1):
+            index = "(i)"
+            if divisor:
+                index = "((i) / (%s))" % "*".join(divisor)
+            if iaxis:
+                index = "(%s %% pyopencl_dim%d)" % (index, iaxis)
+            terms.append("%s*%s__stride%d" % (index, name, iaxis))
+            divisor.append("pyopencl_dim%d" % iaxis)
+
+        preamble.append("#define PYOPENCL_STRIDED_INDEX_%s(i) (%s)"
+                % (name, " + ".join(terms) or "0"))
+
+        code = re.sub(r"\b%s\s*\[\s*i\s*\]" % name,
+                "%s[PYOPENCL_STRIDED_INDEX_%s(i)]" % (name, name),
+                code)
+
+        if re.search(r"\b%s\s*\[(?!PYOPENCL_STRIDED_INDEX_)" % name, code):
+            raise NotImplementedError("non-contiguous array passed for "
+                    "argument '%s', which is indexed by something other "
+                    "than 'i'" % name)
+
+    return "\n".join(preamble), code
+
+# }}}
+
+
 def get_gl_sharing_context_properties():
     ctx_props = cl.context_properties
 
@@ -4,6 +4,7 @@
 #include "pyhelper.h"
 
 #include <atomic>
+#include <unordered_set>
 
 template class clobj<cl_event>;
 template void print_arg<cl_event>(std::ostream&, const cl_event&, bool);
@@ -270,6 +271,77 @@ enqueue_wait_for_events(clobj_t _queue, const clobj_t *_wait_for,
         });
 }
 
+// Event list
+
+error*
+event_list__copy(clobj_t *dest, const clobj_t *src, uint32_t num)
+{
+    uint32_t i = 0;
+    auto err = c_handle_error([&] {
+            for (;i < num;i++) {
+                dest[i] = new event(static_cast<event*>(src[i])->data(), true);
+            }
+        });
+    if (err) {
+        event_list__release(dest, i);
+    }
+    return err;
+}
+
+void
+event_list__release(clobj_t *events, uint32_t num)
+{
+    for (uint32_t i = 0;i < num;i++) {
+        delete static_cast<event*>(events[i]);
+        events[i] = nullptr;
+    }
+}
+
+uint32_t
+event_list__dedup(clobj_t *events, uint32_t num)
+{
+    std::unordered_set<cl_event> seen;
+    uint32_t kept = 0;
+    for (uint32_t i = 0;i < num;i++) {
+        auto evt = static_cast<event*>(events[i]);
+        if (seen.insert(evt->data()).second) {
+            events[kept++] = evt;
+        } else {
+            delete evt;
+        }
+    }
+    return kept;
+}
+
+error*
+event_list__prune(clobj_t *events, uint32_t *num)
+{
+    uint32_t kept = 0;
+    uint32_t i = 0;
+    auto err = c_handle_error([&] {
+            for (;i < *num;i++) {
+                auto evt = static_cast<event*>(events[i]);
+                cl_int status = 0;
+                pyopencl_call_guarded(clGetEventInfo, evt,
+                                      CL_EVENT_COMMAND_EXECUTION_STATUS,
+                                      size_arg(status), nullptr);
+                // Keep events that terminated abnormally, so that waiting
+                // for them still reports the error.
+                if (status == CL_COMPLETE) {
+                    delete evt;
+                } else {
+                    events[kept++] = evt;
+                }
+            }
+        });
+    // on error, keep the remaining (unchecked) events
+    for (;i < *num;i++) {
+        events[kept++] = events[i];
+    }
+    *num = kept;
+    return err;
+}
+
 #if PYOPENCL_CL_VERSION >= 0x1010
 
 error*
@@ -199,6 +199,83 @@ enqueue_nd_range_kernel(clobj_t *evt, clobj_t _queue, clobj_t _knl,
         });
 }
 
+static void
+kernel_set_batch_arg(kernel *knl, cl_uint arg_index,
+                     const kernel_batch_arg &arg)
+{
+    switch (arg.type) {
+    case KERNEL_ARG_NULL: {
+        const cl_mem m = 0;
+        pyopencl_call_guarded(clSetKernelArg, knl, arg_index, size_arg(m));
+        break;
+    }
+    case KERNEL_ARG_BUF:
+        pyopencl_call_guarded(clSetKernelArg, knl, arg_index,
+                              size_arg(arg.buffer, arg.size));
+        break;
+    case KERNEL_ARG_MEM:
+        pyopencl_call_guarded(
+            clSetKernelArg, knl, arg_index,
+            size_arg(static_cast<memory_object*>(arg.obj)->data()));
+        break;
+    case KERNEL_ARG_SAMPLER:
+        pyopencl_call_guarded(
+            clSetKernelArg, knl, arg_index,
+            size_arg(static_cast<sampler*>(arg.obj)->data()));
+        break;
+    case KERNEL_ARG_SVM_POINTER:
+#if PYOPENCL_CL_VERSION >= 0x2000
+        pyopencl_call_guarded(clSetKernelArgSVMPointer, knl, arg_index,
+                              const_cast<void*>(arg.buffer));
+        break;
+#else
+        throw clerror("clSetKernelArgSVMPointer", CL_INVALID_VALUE,
+                      "not available before CL 2.0");
+#endif
+    default:
+        throw clerror("clSetKernelArg", CL_INVALID_VALUE,
+                      "unknown kernel batch argument type");
+    }
+}
+
+error*
+enqueue_nd_range_kernel_batch(clobj_t *evts, clobj_t _queue,
+                              const kernel_batch_launch *launches,
+                              uint32_t num_launches,
+                              const clobj_t *_wait_for, uint32_t num_wait_for,
+                              int all_events)
+{
+    auto queue = static_cast<command_queue*>(_queue);
+    const auto wait_for = buf_from_class<event>(_wait_for, num_wait_for);
+    return c_handle_error([&] {
+            for (uint32_t i = 0;i < num_launches;i++) {
+                const kernel_batch_launch &launch = launches[i];
+                auto knl = static_cast<kernel*>(launch.kernel);
+                for (cl_uint j = 0;j < launch.num_args;j++) {
+                    kernel_set_batch_arg(knl, j, launch.args[j]);
+                }
+                // Retry each launch on its own so that an out-of-memory
+                // retry never enqueues an earlier launch a second time.
+                retry_mem_error([&] {
+                        if (all_events || i + 1 == num_launches) {
+                            pyopencl_call_guarded(
+                                clEnqueueNDRangeKernel, queue, knl,
+                                launch.work_dim, launch.global_work_offset,
+                                launch.global_work_size,
+                                launch.local_work_size, wait_for,
+                                event_out(evts + i));
+                        } else {
+                            pyopencl_call_guarded(
+                                clEnqueueNDRangeKernel, queue, knl,
+                                launch.work_dim, launch.global_work_offset,
+                                launch.global_work_size,
+                                launch.local_work_size, wait_for, nullptr);
+                        }
+                    });
+            }
+        });
+}
+
 error*
 enqueue_task(clobj_t *evt, clobj_t _queue, clobj_t _knl,
              const clobj_t *_wait_for, uint32_t num_wait_for)
@@ -47,6 +47,31 @@ typedef struct {
     int dontfree;
 } generic_info;
 
+typedef enum {
+    KERNEL_ARG_NULL,
+    KERNEL_ARG_BUF,
+    KERNEL_ARG_MEM,
+    KERNEL_ARG_SAMPLER,
+    KERNEL_ARG_SVM_POINTER
+} kernel_arg_type;
+
+typedef struct {
+    kernel_arg_type type;
+    clobj_t obj;
+    const void *buffer;
+    size_t size;
+} kernel_batch_arg;
+
+typedef struct {
+    clobj_t kernel;
+    cl_uint work_dim;
+    const size_t *global_work_offset;
+    const size_t *global_work_size;
+    const size_t *local_work_size;
+    const kernel_batch_arg *args;
+    uint32_t num_args;
+} kernel_batch_launch;
+
 // }}}
 
 // {{{ generic functions
@@ -247,6 +272,15 @@ error *wait_for_events(const clobj_t *_wait_for, uint32_t num_wait_for);
 
 // }}}
 
+// {{{ event list
+
+error *event_list__copy(clobj_t *dest, const clobj_t *src, uint32_t num);
+void event_list__release(clobj_t *events, uint32_t num);
+uint32_t event_list__dedup(clobj_t *events, uint32_t num);
+error *event_list__prune(clobj_t *events, uint32_t *num);
+
+// }}}
+
 // {{{ nanny event
 
 void *nanny_event__get_ward(clobj_t evt);
@@ -267,6 +301,11 @@ error *enqueue_nd_range_kernel(clobj_t *event, clobj_t queue,
                                const size_t *global_work_size,
                                const size_t *local_work_size,
                                const clobj_t *wait_for, uint32_t num_wait_for);
+error *enqueue_nd_range_kernel_batch(clobj_t *events, clobj_t queue,
+                                     const kernel_batch_launch *launches,
+                                     uint32_t num_launches,
+                                     const clobj_t *wait_for,
+                                     uint32_t num_wait_for, int all_events);
 error *enqueue_task(clobj_t *_evt, clobj_t _queue, clobj_t _knl,
                     const clobj_t *_wait_for, uint32_t num_wait_for);
 
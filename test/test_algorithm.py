@@ -277,6 +277,104 @@ def test_sum_without_data(ctx_factory):
     assert result_dev == result_ref
 
 
+def test_single_pass_reduction(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.reduction import ReductionKernel
+    red = ReductionKernel(context, np.int64,
+            neutral="0",
+            reduce_expr="a+b", map_expr="in[i]",
+            arguments="__global const int *in")
+
+    # sizes that need anything from one to the maximum number of groups,
+    # each reduced several times in a row to check that the kernel leaves
+    # its workspace ready for the next launch
+    for n in [1, 1000, 5000, 100000, 3000000]:
+        a = np.random.randint(-1000, 1000, n).astype(np.int32)
+        a_gpu = cl_array.to_device(queue, a)
+        for i in range(3):
+            assert red(a_gpu).get() == np.sum(a, dtype=np.int64)
+
+    from pyopencl.characterize import has_global_int32_atomics
+    if has_global_int32_atomics(queue.device):
+        assert red._single_pass_infs
+
+
+def test_multi_output_reduction(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.reduction import ReductionKernel
+    krnl = ReductionKernel(context, outputs=[
+                (np.float32, "0", "a+b", "x[i]"),
+                (np.float32, "0", "a+b", "x[i]*x[i]"),
+                (np.float32, "INFINITY", "fmin(a, b)", "x[i]"),
+                (np.int32, "0", "a+b", "x[i] > 0.5f"),
+                ],
+            arguments="__global const float *x")
+
+    from pyopencl.clrandom import rand as clrand
+    x_gpu = clrand(queue, (200000,), dtype=np.float32)
+    x = x_gpu.get()
+
+    x_sum, x_sq_sum, x_min, x_count = krnl(x_gpu)
+    assert x_count.dtype == np.int32
+    assert np.allclose(x_sum.get(), np.sum(x), rtol=1e-4)
+    assert np.allclose(x_sq_sum.get(), np.sum(x*x), rtol=1e-4)
+    assert x_min.get() == np.min(x)
+    assert x_count.get() == np.sum(x > 0.5)
+
+    # along an axis, into given output arrays
+    x2_gpu = x_gpu.reshape(400, 500)
+    out = tuple(cl_array.empty(queue, (400,), dtype)
+            for dtype in [np.float32, np.float32, np.float32, np.int32])
+    krnl(x2_gpu, axis=1, out=out)
+    x2 = x.reshape(400, 500)
+    assert np.allclose(out[0].get(), np.sum(x2, axis=1), rtol=1e-4)
+    assert np.array_equal(out[2].get(), np.min(x2, axis=1))
+    assert np.array_equal(out[3].get(), np.sum(x2 > 0.5, axis=1))
+
+
+def test_segmented_reduction(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    lengths = np.random.randint(0, 300, 2000)
+    lengths[::17] = 0
+    lengths[5] = 5000
+    starts = np.zeros(len(lengths)+1, np.int32)
+    starts[1:] = np.cumsum(lengths)
+
+    from pyopencl.clrandom import rand as clrand
+    values_gpu = clrand(queue, (int(starts[-1]),), dtype=np.float32)
+    values = values_gpu.get()
+    starts_gpu = cl_array.to_device(queue, starts)
+
+    from pyopencl.reduction import get_sum_kernel, get_minmax_kernel
+    sums = get_sum_kernel(context, None, values_gpu.dtype)(
+            values_gpu, segment_starts=starts_gpu).get()
+    maxes = get_minmax_kernel(context, "max", values_gpu.dtype)(
+            values_gpu, segment_starts=starts_gpu).get()
+
+    for iseg in range(len(lengths)):
+        seg = values[starts[iseg]:starts[iseg+1]]
+        assert abs(sums[iseg] - np.sum(seg)) <= 1e-4 * max(1, np.sum(seg))
+        if len(seg):
+            assert maxes[iseg] == np.max(seg)
+        else:
+            assert maxes[iseg] == -np.inf
+
+
 def test_minmax(ctx_factory):
     from pytest import importorskip
     importorskip("mako")
@@ -566,6 +664,162 @@ def test_scan(ctx_factory, dtype, scan_cls):
         collect()
 
 
+def test_scan_workspace(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.scan import GenericScanKernel, ScanWorkspace
+
+    # output doubles as scratch
+    copy_knl = GenericScanKernel(
+            context, np.int32,
+            arguments="__global int *ary, __global int *out",
+            input_expr="ary[i]",
+            scan_expr="a+b", neutral="0",
+            output_statement="out[i] = item;")
+    assert copy_knl.scratch_output_arg_idx == 1
+
+    # output is not a plain store, needs a partial buffer
+    twice_knl = GenericScanKernel(
+            context, np.int32,
+            arguments="__global int *ary, __global int *out",
+            input_expr="ary[i]",
+            scan_expr="a+b", neutral="0",
+            output_statement="out[i] = 2*item;")
+    assert twice_knl.scratch_output_arg_idx is None
+
+    workspace = ScanWorkspace()
+
+    for n in [1, 2 ** 10 + 5, 2 ** 20 + 1, 2 ** 12]:
+        host_data = np.random.randint(0, 10, n).astype(np.int32)
+        dev_data = cl_array.to_device(queue, host_data)
+        desired_result = np.cumsum(host_data, axis=0)
+
+        for ws in [None, workspace]:
+            out = cl_array.empty_like(dev_data)
+            copy_knl(dev_data, out, workspace=ws)
+            assert (out.get() == desired_result).all()
+
+            twice_knl(dev_data, out, workspace=ws)
+            assert (out.get() == 2*desired_result).all()
+
+        # in-place, input and output share the scratch buffer
+        copy_knl(dev_data, dev_data, workspace=workspace)
+        assert (dev_data.get() == desired_result).all()
+
+    workspace.clear()
+
+
+@pytest.mark.parametrize("is_exclusive", [False, True])
+@pytest.mark.parametrize("is_segmented", [False, True])
+def test_lookback_scan(ctx_factory, is_exclusive, is_segmented):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.scan import GenericScanKernel, _device_supports_lookback
+    if not _device_supports_lookback(queue.device):
+        pytest.skip("single-pass scan not supported on '%s'" % queue.device)
+
+    if is_exclusive:
+        output_statement = "out[i] = prev_item"
+    else:
+        output_statement = "out[i] = item"
+
+    if is_segmented:
+        is_segment_start_expr = "segflags[i]"
+    else:
+        is_segment_start_expr = None
+
+    knl = GenericScanKernel(context, np.int32,
+            arguments="__global int *ary, __global char *segflags, "
+                "__global int *out",
+            input_expr="ary[i] + ((i > 0) ? ary_im1 : 0)",
+            input_fetch_exprs=[("ary_im1", "ary", -1)],
+            scan_expr="across_seg_boundary ? b : (a+b)", neutral="0",
+            is_segment_start_expr=is_segment_start_expr,
+            output_statement=output_statement,
+            use_lookback=True)
+    assert knl.lookback_ok
+
+    from pyopencl.clrandom import rand as clrand
+    for n in scan_test_counts:
+        a_dev = clrand(queue, (n,), dtype=np.int32, a=0, b=10)
+        a = a_dev.get()
+        values = a.copy()
+        values[1:] += a[:-1]
+
+        seg_flags = (np.random.rand(n) < 0.001).astype(np.uint8)
+        seg_flags[0] = 1
+        if not is_segmented:
+            seg_flags[1:] = 0
+        seg_flags_dev = cl_array.to_device(queue, seg_flags)
+
+        result_host = np.empty_like(values)
+        seg_starts = list(np.nonzero(seg_flags)[0]) + [n]
+        for seg_start, seg_end in zip(seg_starts[:-1], seg_starts[1:]):
+            seg_sums = np.cumsum(values[seg_start:seg_end])
+            if is_exclusive:
+                seg_sums -= values[seg_start:seg_end]
+            result_host[seg_start:seg_end] = seg_sums
+
+        out_dev = cl_array.empty_like(a_dev)
+        knl(a_dev, seg_flags_dev, out_dev)
+
+        assert (out_dev.get() == result_host).all()
+
+
+def test_row_scan(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.scan import GenericRowScanKernel
+    knl = GenericRowScanKernel(context, np.int32,
+            arguments="__global int *ary, __global int *out",
+            input_expr="ary[i]",
+            scan_expr="across_seg_boundary ? b : (a+b)", neutral="0",
+            output_statement="out[i] = prev_item")
+
+    from pyopencl.clrandom import rand as clrand
+    for nrows, row_length in [
+            (1000, 1), (1000, 5), (300, 32), (300, 33), (100, 300),
+            (20, 2**12), (20, 2**12 + 5), (3, 2**20 + 1)]:
+        a_dev = clrand(queue, (nrows, row_length), dtype=np.int32, a=0, b=10)
+        a = a_dev.get()
+
+        out_dev = cl_array.empty_like(a_dev)
+        knl(a_dev, out_dev, row_length=row_length)
+
+        assert (out_dev.get() == np.cumsum(a, axis=1) - a).all()
+
+
+def test_cumsum_axis(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.clrandom import rand as clrand
+    a_dev = clrand(queue, (37, 300, 5), dtype=np.int32, a=0, b=10)
+    a = a_dev.get()
+
+    for axis in [None, 0, 1, 2, -1]:
+        result = cl_array.cumsum(a_dev, axis=axis)
+        assert (result.get() == np.cumsum(a, axis=axis)).all()
+
+    result = cl_array.cumsum(a_dev.transpose((2, 0, 1)), axis=1)
+    assert (result.get() == np.cumsum(a.transpose((2, 0, 1)), axis=1)).all()
+
+
 def test_copy_if(ctx_factory):
     from pytest import importorskip
     importorskip("mako")
@@ -644,6 +898,70 @@ def test_unique(ctx_factory):
         collect()
 
 
+def test_reduce_by_key(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.algorithm import reduce_by_key
+
+    for n in scan_test_counts:
+        keys = np.sort(np.random.randint(0, 1000, n).astype(np.int32))
+        values = np.random.randint(-100, 100, n).astype(np.int32)
+
+        keys_dev = cl_array.to_device(queue, keys)
+        values_dev = cl_array.to_device(queue, values)
+
+        unique_keys, starts = np.unique(keys, return_index=True)
+
+        for reduce_expr, neutral, np_func in [
+                ("a+b", "0", np.add),
+                ("max(a, b)", "INT_MIN", np.maximum),
+                ]:
+            out_keys_dev, out_values_dev, count_dev, evt = reduce_by_key(
+                    keys_dev, values_dev, reduce_expr, neutral)
+
+            count = count_dev.get()
+            assert count == len(unique_keys)
+            assert (out_keys_dev.get()[:count] == unique_keys).all()
+            assert (out_values_dev.get()[:count]
+                    == np_func.reduceat(values, starts)).all()
+
+        from gc import collect
+        collect()
+
+
+def test_run_length_encode(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.algorithm import run_length_encode
+
+    for n in scan_test_counts:
+        # unsorted, with runs of random lengths
+        ary = np.random.randint(0, 4, n).astype(np.int32)
+        ary_dev = cl_array.to_device(queue, ary)
+
+        run_starts = np.concatenate(
+                ([0], np.flatnonzero(ary[1:] != ary[:-1]) + 1))
+        run_lengths = np.diff(np.concatenate((run_starts, [n])))
+
+        out_dev, lengths_dev, count_dev, evt = run_length_encode(ary_dev)
+
+        count = count_dev.get()
+        assert count == len(run_starts)
+        assert (out_dev.get()[:count] == ary[run_starts]).all()
+        assert (lengths_dev.get()[:count] == run_lengths).all()
+
+        from gc import collect
+        collect()
+
+
 def test_index_preservation(ctx_factory):
     from pytest import importorskip
     importorskip("mako")
@@ -820,6 +1138,168 @@ def test_sort(ctx_factory, scan_kernel):
         assert (a_dev_sorted.get() == a_sorted).all()
 
 
+def test_sort_auto_key_bits(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.algorithm import RadixSort
+    sort = RadixSort(context, "int *ary, int *idx", key_expr="ary[i]",
+            sort_arg_names=["ary", "idx"])
+
+    n = 10000
+    a = np.random.randint(-300, 700, n).astype(np.int32)
+    a_dev = cl_array.to_device(queue, a)
+    idx_dev = cl_array.arange(queue, n, dtype=np.int32)
+
+    (a_dev_sorted, idx_dev_sorted), evt = sort(
+            a_dev, idx_dev, key_bits="auto", queue=queue)
+
+    assert (a_dev_sorted.get() == np.sort(a)).all()
+    assert (idx_dev_sorted.get() == np.argsort(a, kind="mergesort")).all()
+
+    # constant keys
+    (a_dev_sorted, idx_dev_sorted), evt = sort(
+            cl_array.zeros(queue, n, np.int32), idx_dev,
+            key_bits="auto", queue=queue)
+    assert (idx_dev_sorted.get() == np.arange(n)).all()
+
+
+@pytest.mark.parametrize("dtype", [np.int32, np.int64, np.uint32,
+    np.float32, np.float64])
+@pytest.mark.parametrize("descending", [False, True])
+def test_sort_key_types(ctx_factory, dtype, descending):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    dtype = np.dtype(dtype)
+    if dtype == np.float64:
+        from pyopencl.characterize import has_double_support
+        if not has_double_support(context.devices[0]):
+            pytest.skip("double precision not supported on %s"
+                    % context.devices[0])
+
+    from pyopencl.algorithm import sort, argsort
+
+    for n in [0, 1, 2**10, 10000]:
+        if dtype.kind == "f":
+            a = (np.random.randn(n)*1e5).astype(dtype)
+        elif dtype.kind == "i":
+            a = np.random.randint(-2**20, 2**20, n).astype(dtype)
+        else:
+            a = np.random.randint(0, 2**20, n).astype(dtype)
+
+        if n:
+            # include ties
+            a[::7] = a[0]
+        a_dev = cl_array.to_device(queue, a)
+
+        if descending:
+            ref_idx = np.argsort(-a.astype(np.float64), kind="mergesort")
+        else:
+            ref_idx = np.argsort(a, kind="mergesort")
+
+        sorted_dev, evt = sort(a_dev, descending=descending)
+        assert (sorted_dev.get() == a[ref_idx]).all()
+
+        idx_dev, evt = argsort(a_dev, descending=descending)
+        idx = idx_dev.get()
+        assert (a[idx] == a[ref_idx]).all()
+        assert (np.sort(idx) == np.arange(n)).all()
+
+
+@pytest.mark.parametrize("dtype", [np.int32, np.float32])
+@pytest.mark.parametrize("largest", [False, True])
+@pytest.mark.parametrize("shape", [(100000,), (50, 2000)])
+def test_top_k(ctx_factory, dtype, largest, shape):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.algorithm import top_k
+
+    if np.dtype(dtype).kind == "f":
+        a = np.random.randn(*shape).astype(dtype)
+    else:
+        a = np.random.randint(-1000, 1000, shape).astype(dtype)
+    a_dev = cl_array.to_device(queue, a)
+
+    for k in [0, 1, 37, shape[-1]]:
+        values_dev, indices_dev, evt = top_k(a_dev, k, largest=largest)
+
+        keys = -a.astype(np.float64) if largest else a
+        ref_idx = np.argsort(keys, axis=-1, kind="mergesort")[..., :k]
+        if len(shape) == 1:
+            ref_values = a[ref_idx]
+        else:
+            ref_values = a[np.arange(shape[0])[:, np.newaxis], ref_idx]
+
+        assert values_dev.shape == shape[:-1] + (k,)
+        assert (values_dev.get() == ref_values).all()
+        assert (indices_dev.get() == ref_idx).all()
+
+
+def test_bincount(ctx_factory):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.algorithm import bincount
+
+    for nbins in [1, 17, 300, 100000]:
+        idx = np.random.randint(0, nbins, 10**5).astype(np.int32)
+        idx_dev = cl_array.to_device(queue, idx)
+
+        counts, evt = bincount(idx_dev, minlength=nbins+5)
+        assert (counts.get() == np.bincount(idx, minlength=nbins+5)).all()
+
+        weights = np.random.rand(idx.size).astype(np.float32)
+        sums, evt = bincount(idx_dev, cl_array.to_device(queue, weights))
+        assert np.allclose(sums.get(), np.bincount(idx, weights),
+                rtol=1e-4, atol=1e-3)
+
+    with pytest.raises(ValueError):
+        bincount(cl_array.to_device(queue, np.array([1, -1], np.int32)))
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.int32])
+def test_histogram(ctx_factory, dtype):
+    from pytest import importorskip
+    importorskip("mako")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.algorithm import histogram
+
+    a = (np.random.rand(1000, 100)*1000 - 300).astype(dtype)
+    a_dev = cl_array.to_device(queue, a)
+
+    if dtype == np.float32:
+        bins_and_ranges = [(10, None), (50, (0, 500))]
+    else:
+        # keep integers that lie on bin edges exactly representable
+        bins_and_ranges = [(64, (0, 512)), (8, (-256, 768))]
+
+    for bins, range_ in bins_and_ranges:
+        hist, edges, evt = histogram(a_dev, bins, range_)
+        ref_hist, ref_edges = np.histogram(a, bins, range_)
+
+        assert np.allclose(edges, ref_edges)
+        # floating point values right at a bin edge may be rounded
+        # either way
+        assert np.abs(hist.get() - ref_hist).sum() <= 2
+
+
 def test_list_builder(ctx_factory):
     from pytest import importorskip
     importorskip("mako")
@@ -884,7 +1364,10 @@ def test_key_value_sorter(ctx_factory):
 @pytest.mark.parametrize("size", [
     512,
     4,
-    16
+    16,
+    1,
+    37,
+    1000,
     ])
 @pytest.mark.parametrize("dtype", [
     np.int32,
@@ -918,6 +1401,8 @@ def test_bitonic_sort(ctx_factory, size, dtype):
     4,
     2**14,
     2**18,
+    1000,
+    2**18 + 3,
     ])
 @pytest.mark.parametrize("dtype", [
     np.int32,
@@ -963,6 +1448,33 @@ def test_bitonic_argsort(ctx_factory, size, dtype):
     # Check values by indices
     assert np.array_equal(m.get()[np.argsort(m.get())], m.get()[index.get()])
 
+
+@pytest.mark.parametrize("row_length", [3, 64, 100])
+@pytest.mark.bitonic
+def test_bitonic_sort_rows(ctx_factory, row_length):
+    ctx = cl.create_some_context()
+    queue = cl.CommandQueue(ctx)
+
+    dev = ctx.devices[0]
+    if (dev.platform.name == "Apple" and dev.type & cl.device_type.CPU):
+        pytest.xfail("Bitonic sort won't work on Apple CPU: no workgroup "
+            "parallelism")
+
+    from pyopencl.bitonic_sort import BitonicSort
+
+    nrows = 1001
+    a = np.random.randint(0, 50, (nrows, row_length)).astype(np.int32)
+    a_dev = cl_array.to_device(queue, a)
+    index = cl_array.to_device(queue,
+            np.tile(np.arange(row_length, dtype=np.int32), (nrows, 1)))
+
+    sorter = BitonicSort(ctx)
+    a_sorted, evt = sorter(a_dev, idx=index, axis=1)
+
+    assert np.array_equal(np.sort(a, axis=1), a_sorted.get())
+    assert np.array_equal(
+            a[np.arange(nrows)[:, np.newaxis], index.get()], a_sorted.get())
+
 # }}}
 
 
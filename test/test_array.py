@@ -1004,6 +1004,317 @@ def test_squeeze(ctx_factory):
     #assert np.all(a_gpu_slice.get().ravel() == a_gpu_squeezed_slice.get().ravel())
 
 
+def test_launch_autotune(ctx_factory, tmpdir, monkeypatch):
+    import pyopencl.autotune as autotune
+    if autotune._DISABLED:
+        pytest.skip("autotuning disabled")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context,
+            properties=cl.command_queue_properties.PROFILING_ENABLE)
+
+    tuner = autotune.LaunchTuner(cache_dir=str(tmpdir))
+    monkeypatch.setattr(autotune, "_launch_tuner", tuner)
+
+    n = 100000
+    a = np.random.rand(n).astype(np.float32)
+    a_dev = cl_array.to_device(queue, a)
+
+    for i in range(200):
+        b_dev = 2*a_dev
+        queue.finish()
+        assert (b_dev.get() == 2*a).all()
+
+    assert tuner._winners[autotune._get_device_key(queue)]
+
+    # winners are reloaded from disk, even without profiling
+    queue_noprof = cl.CommandQueue(context)
+    new_tuner = autotune.LaunchTuner(cache_dir=str(tmpdir))
+    monkeypatch.setattr(autotune, "_launch_tuner", new_tuner)
+
+    a_dev = cl_array.to_device(queue_noprof, a)
+    assert ((2*a_dev).get() == 2*a).all()
+    assert (new_tuner._winners[autotune._get_device_key(queue_noprof)]
+            == tuner._winners[autotune._get_device_key(queue)])
+
+
+def test_launch_config_cache(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    a = np.random.rand(1000).astype(np.float32)
+    a_dev = cl_array.to_device(queue, a)
+    b_dev = cl_array.to_device(queue, a)
+
+    lcc = cl_array.get_launch_config_cache()
+    lcc.clear()
+
+    (a_dev + b_dev).get()
+
+    hits, misses = lcc.hits, lcc.misses
+    flags_hits = lcc.flags_hits
+
+    for i in range(3):
+        c_dev = a_dev + b_dev
+    assert (c_dev.get() == 2*a).all()
+
+    assert lcc.misses == misses
+    assert lcc.hits == hits + 3
+    assert lcc.flags_hits > flags_hits
+
+    # a different size is a miss
+    a_dev[:500] + b_dev[:500]
+    assert lcc.misses == misses + 1
+
+
+def test_lazy_evaluation(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    n = 10000
+    a, b, c, d, e = [np.random.rand(n).astype(np.float32) for i in range(5)]
+    a_dev, b_dev, c_dev, d_dev, e_dev = [
+            cl_array.to_device(queue, x) for x in [a, b, c, d, e]]
+
+    with cl_array.lazy_evaluation():
+        x_dev = a_dev * b_dev + c_dev * d_dev - e_dev
+        y_dev = -(2*a_dev - 1) / (b_dev + 3)
+        z_dev = a_dev + 1
+
+        # inputs are not overwritten before pending results are computed
+        a_dev.fill(0)
+
+        w_dev = b_dev.copy()
+        w_dev += c_dev * 2
+
+    assert la.norm(x_dev.get() - (a*b + c*d - e)) < 1e-5 * la.norm(a*b)
+    assert la.norm(y_dev.get() - (-(2*a - 1) / (b + 3))) < 1e-5 * la.norm(a)
+    assert la.norm(z_dev.get() - (a + 1)) < 1e-5 * la.norm(a)
+    assert la.norm(w_dev.get() - (b + c*2)) < 1e-5 * la.norm(b)
+
+    # explicit evaluation, and passing to a non-fused operation
+    with cl_array.lazy_evaluation():
+        x_dev = b_dev * c_dev
+        cl_array.evaluate(x_dev)
+        assert la.norm(x_dev.get() - b*c) < 1e-5 * la.norm(b*c)
+
+        s = cl_array.sum(b_dev - c_dev).get()
+        assert abs(s - np.sum(b - c)) < 1e-3 * n
+
+
+def test_out_arguments(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    a = np.random.rand(1000).astype(np.float32)
+    b = np.random.rand(1000).astype(np.float32)
+    a_dev = cl_array.to_device(queue, a)
+    b_dev = cl_array.to_device(queue, b)
+    out = cl_array.empty_like(a_dev)
+
+    for func, ref in [
+            (cl_array.add, np.add),
+            (cl_array.subtract, np.subtract),
+            (cl_array.multiply, np.multiply),
+            (cl_array.divide, np.divide),
+            (cl_array.maximum, np.maximum),
+            (cl_array.minimum, np.minimum),
+            ]:
+        assert func(a_dev, b_dev, out=out) is out
+        assert np.allclose(out.get(), ref(a, b), rtol=1e-6)
+
+    assert cl_array.add(a_dev, 0, out=out) is out
+    assert (out.get() == a).all()
+
+    assert cl_array.subtract(2, a_dev, out=out) is out
+    assert np.allclose(out.get(), 2 - a, rtol=1e-6)
+
+    assert a_dev.mul_add(2, b_dev, 3, out=out) is out
+    assert np.allclose(out.get(), 2*a + 3*b, rtol=1e-6)
+
+    assert a_dev.reverse(out=out) is out
+    assert (out.get() == a[::-1]).all()
+
+    a_rev_dev = a_dev.copy()
+    assert a_rev_dev.reverse(out=a_rev_dev) is a_rev_dev
+    assert (a_rev_dev.get() == a[::-1]).all()
+
+    int_out = cl_array.empty(queue, a.shape, np.int32)
+    assert a_dev.astype(np.int32, out=int_out) is int_out
+    assert (int_out.get() == a.astype(np.int32)).all()
+
+    cmp_out = cl_array.empty(queue, a.shape, np.int8)
+    assert cl_array.less(a_dev, b_dev, out=cmp_out) is cmp_out
+    assert (cmp_out.get() == (a < b)).all()
+    assert cl_array.less(0.5, a_dev, out=cmp_out) is cmp_out
+    assert (cmp_out.get() == (0.5 < a)).all()
+
+    with pytest.raises(TypeError):
+        cl_array.add(a_dev, b_dev, out=int_out)
+    with pytest.raises(ValueError):
+        cl_array.add(a_dev, b_dev, out=out[:10])
+
+
+def test_noncontiguous_elementwise(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.clrandom import rand as clrand
+
+    a_gpu = clrand(queue, (10, 20, 30), dtype=np.float32)
+    b_gpu = clrand(queue, (10, 20, 30), dtype=np.float32)
+    a = a_gpu.get()
+    b = b_gpu.get()
+
+    # sliced views
+    result = a_gpu[:, 3:15, ::2] + 2*b_gpu[:, 3:15, ::2]
+    assert np.allclose(result.get(), a[:, 3:15, ::2] + 2*b[:, 3:15, ::2])
+
+    # transposed views, mixed with contiguous arrays
+    at = a.transpose((1, 2, 0))
+    bt = b.transpose((1, 2, 0)).copy()
+    result = a_gpu.transpose((1, 2, 0)) * cl_array.to_device(queue, bt)
+    assert np.allclose(result.get(), at*bt)
+
+    # clmath
+    import pyopencl.clmath as clmath
+    result = clmath.sqrt(a_gpu[::-1, 5])
+    assert np.allclose(result.get(), np.sqrt(a[::-1, 5]))
+
+    # in-place on a view
+    a_view = a_gpu[2:5, :, 7]
+    a_view += 1
+    a[2:5, :, 7] += 1
+    assert np.allclose(a_gpu.get(), a)
+
+    # reductions
+    assert np.allclose(
+            cl_array.sum(a_gpu[:, ::3, 1:]).get(), np.sum(a[:, ::3, 1:]),
+            rtol=1e-4)
+    assert np.allclose(
+            cl_array.dot(a_gpu[:, 1, :], b_gpu[:, 2, :]).get(),
+            np.sum(a[:, 1, :] * b[:, 2, :]), rtol=1e-4)
+
+
+def test_broadcasting(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.clrandom import rand as clrand
+
+    a_gpu = clrand(queue, (50, 40), dtype=np.float32)
+    row_gpu = clrand(queue, (40,), dtype=np.float32)
+    col_gpu = clrand(queue, (50, 1), dtype=np.float32)
+    a = a_gpu.get()
+    row = row_gpu.get()
+    col = col_gpu.get()
+
+    assert np.allclose((a_gpu + row_gpu).get(), a + row)
+    assert np.allclose((row_gpu - a_gpu).get(), row - a)
+    assert np.allclose((a_gpu * col_gpu).get(), a * col)
+    assert np.allclose((a_gpu / col_gpu).get(), a / col)
+    assert np.allclose((col_gpu + row_gpu).get(), col + row)
+    assert ((a_gpu > row_gpu).get() == (a > row)).all()
+    assert np.allclose(
+            cl_array.maximum(a_gpu, row_gpu).get(), np.maximum(a, row))
+
+    # in-place, and on a non-contiguous view
+    a_gpu += row_gpu
+    a += row
+    assert np.allclose(a_gpu.get(), a)
+
+    result = a_gpu[:, ::2] * row_gpu[::2]
+    assert np.allclose(result.get(), a[:, ::2] * row[::2])
+
+    with pytest.raises(ValueError):
+        a_gpu + col_gpu[:40, 0]
+
+    with pytest.raises(ValueError):
+        row_gpu += a_gpu
+
+
+def test_axis_reductions(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.clrandom import rand as clrand
+
+    a_gpu = clrand(queue, (300, 70, 5), dtype=np.float32)
+    v_gpu = clrand(queue, (70,), dtype=np.float32)
+    a = a_gpu.get()
+    v = v_gpu.get()
+
+    for axis in [0, 1, 2, -1, (0, 2), (0, 1, 2)]:
+        result = cl_array.sum(a_gpu, axis=axis)
+        assert result.shape == np.sum(a, axis=axis).shape
+        assert np.allclose(result.get(), np.sum(a, axis=axis), rtol=1e-4)
+
+        assert np.array_equal(
+                cl_array.max(a_gpu, axis=axis).get(), np.max(a, axis=axis))
+        assert np.array_equal(
+                cl_array.min(a_gpu, axis=axis).get(), np.min(a, axis=axis))
+
+    # non-contiguous input
+    result = cl_array.sum(a_gpu[:, ::2, 3], axis=0)
+    assert np.allclose(result.get(), np.sum(a[:, ::2, 3], axis=0), rtol=1e-4)
+
+    # matrix-vector product
+    m_gpu = a_gpu[:, :, 0].copy()
+    result = cl_array.dot(m_gpu, v_gpu, axis=1)
+    assert np.allclose(result.get(), np.dot(a[:, :, 0], v), rtol=1e-4)
+
+    out = cl_array.empty(queue, (70, 5), np.float32)
+    from pyopencl.reduction import get_sum_kernel
+    krnl = get_sum_kernel(context, None, a_gpu.dtype)
+    krnl(a_gpu, axis=0, out=out)
+    assert np.allclose(out.get(), np.sum(a, axis=0), rtol=1e-4)
+
+    with pytest.raises(ValueError):
+        cl_array.sum(a_gpu, axis=3)
+
+
+def test_device_scalars(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    from pyopencl.clrandom import rand as clrand
+
+    a_gpu = clrand(queue, (1000,), dtype=np.float32)
+    b_gpu = clrand(queue, (1000,), dtype=np.float32)
+    a = a_gpu.get()
+    b = b_gpu.get()
+
+    s_gpu = cl_array.dot(a_gpu, b_gpu)
+    s = np.dot(a, b)
+    assert s_gpu.shape == ()
+
+    # arithmetic with arrays and with other device scalars
+    assert np.allclose((s_gpu*a_gpu).get(), s*a, rtol=1e-4)
+    assert np.allclose((a_gpu/s_gpu - 1).get(), a/s - 1, rtol=1e-4)
+    assert np.allclose((s_gpu / cl_array.sum(a_gpu)).get(), s/np.sum(a),
+            rtol=1e-4)
+
+    # as scalar kernel arguments
+    result = a_gpu.mul_add(s_gpu, b_gpu, 2)
+    assert np.allclose(result.get(), s*a + 2*b, rtol=1e-4)
+
+    from pyopencl.elementwise import ElementwiseKernel
+    knl = ElementwiseKernel(context,
+            "float *z, float *x, float alpha",
+            "z[i] = alpha*x[i]")
+    result = cl_array.empty_like(a_gpu)
+    knl(result, a_gpu, s_gpu)
+    assert np.allclose(result.get(), s*a, rtol=1e-4)
+
+    knl(result[::2], a_gpu[::2], s_gpu)
+    assert np.allclose(result.get()[::2], s*a[::2], rtol=1e-4)
+
+    # conversion to Python scalars
+    assert abs(float(s_gpu) - s) < 1e-4 * abs(s)
+    assert int(cl_array.sum(cl_array.arange(queue, 10, dtype=np.int32))) == 45
+    assert bool(s_gpu > 0)
+
+
 if __name__ == "__main__":
     # make sure that import failures get reported, instead of skipping the
     # tests.
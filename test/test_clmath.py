@@ -447,6 +447,33 @@ def test_hankel_01_complex(ctx_factory, ref_src):
         pt.show()
 
 
+def test_clmath_out(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    a = cl_array.arange(queue, 1000, dtype=np.float32)/100
+    out = cl_array.empty_like(a)
+
+    result = clmath.sin(a, out=out)
+    assert result is out
+    assert np.allclose(out.get(), np.sin(a.get()), rtol=1e-5)
+
+    result = clmath.atan2(a, a + 1, out=out)
+    assert result is out
+    assert np.allclose(out.get(), np.arctan2(a.get(), a.get() + 1), rtol=1e-5)
+
+    expt = cl_array.empty(queue, a.shape, np.int32)
+    sig, expt_result = clmath.frexp(a, out=(out, expt))
+    assert sig is out and expt_result is expt
+    assert np.allclose(
+            out.get() * 2.0**expt.get(), a.get(), rtol=1e-6)
+
+    with pytest.raises(TypeError):
+        clmath.sin(a, out=expt)
+    with pytest.raises(ValueError):
+        clmath.sin(a, out=out[:10])
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1:
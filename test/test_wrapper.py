@@ -1026,6 +1026,261 @@ def test_fine_grain_svm(ctx_factory):
     assert np.array_equal(orig_ary*2, ary)
 
 
+def test_program_kernel_cache(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    prg = cl.Program(context, """
+        __kernel void mult(__global float *a, float b)
+        { a[get_global_id(0)] *= b; }
+        __kernel void add(__global float *a, float b)
+        { a[get_global_id(0)] += b; }
+        """).build()
+
+    # attribute lookup hands out the same kernel within a thread
+    assert prg.mult is prg.mult
+    assert prg.mult is not prg.add
+
+    # ...and separate kernels in other threads
+    from threading import Thread
+    other_thread_knl = []
+    thr = Thread(target=lambda: other_thread_knl.append(prg.mult))
+    thr.start()
+    thr.join()
+    assert other_thread_knl[0] is not prg.mult
+
+    # explicitly constructed kernels are never cached
+    assert cl.Kernel(prg, "mult") is not prg.mult
+
+    # generated argument setters are shared among same-signature kernels
+    prg.mult.set_scalar_arg_dtypes([None, np.float32])
+    prg.add.set_scalar_arg_dtypes([None, np.float32])
+    assert prg.mult._enqueue is prg.add._enqueue
+
+    n = 100
+    a = np.random.rand(n).astype(np.float32)
+    mf = cl.mem_flags
+    a_buf = cl.Buffer(context, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=a)
+
+    for i in range(10):
+        prg.mult(queue, a.shape, None, a_buf, 2)
+        prg.add(queue, a.shape, None, a_buf, 1)
+
+    a_2 = np.empty_like(a)
+    cl.enqueue_copy(queue, a_2, a_buf)
+
+    ref = a.copy()
+    for i in range(10):
+        ref = ref*2 + 1
+
+    assert np.allclose(a_2, ref)
+
+
+def test_enqueue_batch(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    prg = cl.Program(context, """
+        __kernel void mult(__global float *a, float b)
+        { a[get_global_id(0)] *= b; }
+        __kernel void add(__global float *a, __global const float *b)
+        { a[get_global_id(0)] += b[get_global_id(0)]; }
+        """).build()
+
+    mult = prg.mult
+    mult.set_scalar_arg_dtypes([None, np.float32])
+    add = prg.add
+
+    n = 1000
+    a = np.random.rand(n).astype(np.float32)
+    b = np.random.rand(n).astype(np.float32)
+    mf = cl.mem_flags
+    a_buf = cl.Buffer(context, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=a)
+    b_buf = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=b)
+
+    launches = []
+    for i in range(20):
+        launches.append((mult, a.shape, None, (a_buf, 2)))
+        launches.append((add, a.shape, None, (a_buf, b_buf)))
+
+    evt = cl.enqueue_batch(queue, launches)
+    assert isinstance(evt, cl.Event)
+
+    evts = cl.enqueue_batch(queue, launches[:3], wait_for=[evt],
+            return_all_events=True)
+    assert len(evts) == 3
+
+    a_2 = np.empty_like(a)
+    cl.enqueue_copy(queue, a_2, a_buf, wait_for=evts)
+
+    ref = a.copy()
+    for i in range(21):
+        ref = ref*2 + b
+    ref = ref*2
+
+    assert np.allclose(a_2, ref)
+
+    with pytest.raises(cl.LogicError):
+        cl.enqueue_batch(queue, [(add, a.shape, None, (a_buf,))])
+
+
+def test_command_graph(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    prg = cl.Program(context, """
+        __kernel void mult(__global float *a, float b)
+        { a[get_global_id(0)] *= b; }
+        __kernel void add(__global float *a, __global const float *b)
+        { a[get_global_id(0)] += b[get_global_id(0)]; }
+        """).build()
+
+    mult = cl.Kernel(prg, "mult")
+    mult.set_scalar_arg_dtypes([None, np.float32])
+    add = prg.add
+
+    n = 1000
+    a = np.random.rand(n).astype(np.float32)
+    b = np.random.rand(n).astype(np.float32)
+    mf = cl.mem_flags
+    a_buf = cl.Buffer(context, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=a)
+    b_buf = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=b)
+    c_buf = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=2*b)
+
+    result = np.empty_like(a)
+
+    with queue.capture() as graph:
+        mult_evt = mult(queue, a.shape, None, a_buf, 2)
+        add(queue, a.shape, None, a_buf, b_buf, wait_for=[mult_evt])
+        cl.enqueue_copy(queue, result, a_buf)
+
+    assert len(graph) == 3
+
+    # recording also executes
+    ref = a*2 + b
+    assert np.allclose(result, ref)
+
+    graph.replay().wait()
+    ref = ref*2 + b
+    assert np.allclose(result, ref)
+
+    graph.set_kernel_arg(mult_evt, 1, 3)
+    graph.rebind(b_buf, c_buf)
+    graph.replay().wait()
+    ref = ref*3 + 2*b
+    assert np.allclose(result, ref)
+
+    # launches after set_args keep the arguments they were recorded with
+    with queue.capture() as graph:
+        mult.set_args(a_buf, 2)
+        cl.enqueue_nd_range_kernel(queue, mult, a.shape, None)
+        mult.set_args(a_buf, 3)
+        cl.enqueue_nd_range_kernel(queue, mult, a.shape, None)
+        cl.enqueue_copy(queue, result, a_buf)
+
+    ref = ref*6
+    assert np.allclose(result, ref)
+
+    graph.replay().wait()
+    ref = ref*6
+    assert np.allclose(result, ref)
+
+    # ... including when the arguments were last set by a batched launch
+    mult.set_args(a_buf, 2)
+    cl.enqueue_batch(queue, [(mult, a.shape, None, (a_buf, 3))])
+    with queue.capture() as graph:
+        cl.enqueue_nd_range_kernel(queue, mult, a.shape, None)
+        cl.enqueue_copy(queue, result, a_buf)
+
+    ref = ref*9
+    assert np.allclose(result, ref)
+
+    graph.replay().wait()
+    ref = ref*3
+    assert np.allclose(result, ref)
+
+
+def test_event_asyncio(ctx_factory):
+    asyncio = pytest.importorskip("asyncio")
+
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    prg = cl.Program(context, """
+        __kernel void twice(__global float *a)
+        { a[get_global_id(0)] *= 2; }
+        """).build()
+
+    n = 1000
+    a = np.random.rand(n).astype(np.float32)
+    a_dev = cl_array.to_device(queue, a)
+
+    loop = asyncio.new_event_loop()
+    try:
+        evt = prg.twice(queue, a.shape, None, a_dev.data)
+        assert loop.run_until_complete(evt.as_future(loop)) is evt
+        assert (evt.command_execution_status
+                == cl.command_execution_status.COMPLETE)
+
+        a_dev.add_event(prg.twice(queue, a.shape, None, a_dev.data))
+        result = loop.run_until_complete(a_dev.get_async(loop=loop))
+        assert np.array_equal(result, 4*a)
+
+        result = np.empty_like(a)
+        loop.run_until_complete(
+                cl.enqueue_copy_async(queue, result, a_dev.data, loop=loop))
+        assert np.array_equal(result, 4*a)
+
+        prg.twice(queue, a.shape, None, a_dev.data)
+        loop.run_until_complete(queue.finish_async(loop))
+        assert np.array_equal(a_dev.get(), 8*a)
+    finally:
+        loop.close()
+
+
+def test_event_list(ctx_factory):
+    context = ctx_factory()
+    queue = cl.CommandQueue(context)
+
+    prg = cl.Program(context, """
+        __kernel void twice(__global float *a)
+        { a[get_global_id(0)] *= 2; }
+        """).build()
+
+    n = 1000
+    a = np.random.rand(n).astype(np.float32)
+    mf = cl.mem_flags
+    a_buf = cl.Buffer(context, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=a)
+
+    evts = cl.EventList()
+    for i in range(5):
+        evts.append(prg.twice(queue, a.shape, None, a_buf, wait_for=evts))
+
+    assert len(evts) == 5
+    assert evts[-1] == list(evts)[-1]
+
+    evts.extend(evts[:2])
+    assert len(evts) == 7
+    evts.dedup()
+    assert len(evts) == 5
+
+    combined = [cl.enqueue_marker(queue)] + evts
+    assert isinstance(combined, cl.EventList)
+    assert len(combined) == 6
+
+    del evts[:2]
+    assert len(evts) == 3
+
+    cl.wait_for_events(combined)
+    evts.prune()
+    assert len(evts) == 0
+    assert not evts
+
+    a_2 = np.empty_like(a)
+    cl.enqueue_copy(queue, a_2, a_buf, wait_for=combined)
+    assert np.array_equal(a_2, 32*a)
+
+
 if __name__ == "__main__":
     # make sure that import failures get reported, instead of skipping the tests.
     import pyopencl  # noqa